@@ -1,6 +1,7 @@
-from typing import Generator, Optional
+import hmac
+from typing import Generator, NamedTuple, Optional
 
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Query, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import jwt
 from jose.exceptions import JWTError
@@ -11,15 +12,15 @@ from app import models, schemas
 from app.core import security
 from app.core.config import settings
 from app.db.session import get_db
+from app.services import user_cache
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl=f"{settings.API_V1_STR}/auth/login")
+optional_oauth2_scheme = OAuth2PasswordBearer(tokenUrl=f"{settings.API_V1_STR}/auth/login", auto_error=False)
 
 
-def get_current_user(
-    db: Session = Depends(get_db), token: str = Depends(oauth2_scheme)
-) -> models.User:
+def _decode_token(token: str, scope: Optional[str] = None) -> schemas.TokenPayload:
     """
-    从JWT token中验证并获取当前用户
+    校验token并检查scope（媒体令牌不能当作访问令牌使用，反之亦然）
     """
     try:
         payload = jwt.decode(
@@ -31,12 +32,35 @@ def get_current_user(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="无法验证凭据",
         )
-    user = db.query(models.User).filter(models.User.id == token_data.sub).first()
+    if token_data.scope != scope:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="无法验证凭据",
+        )
+    return token_data
+
+
+def _get_user_from_token(db: Session, token: str) -> models.User:
+    return _get_user(db, _decode_token(token))
+
+
+def _get_user(db: Session, token_data: schemas.TokenPayload) -> models.User:
+    # 用户信息在本进程和Redis中缓存，用户被修改后缓存立即失效
+    user = user_cache.get_user_principal(db, token_data.sub)
     if not user:
         raise HTTPException(status_code=404, detail="用户不存在")
     return user
 
 
+def get_current_user(
+    db: Session = Depends(get_db), token: str = Depends(oauth2_scheme)
+) -> models.User:
+    """
+    从JWT token中验证并获取当前用户
+    """
+    return _get_user_from_token(db, token)
+
+
 def get_current_active_user(
     current_user: models.User = Depends(get_current_user),
 ) -> models.User:
@@ -48,15 +72,104 @@ def get_current_active_user(
     return current_user
 
 
+class MediaAccess(NamedTuple):
+    """
+    媒体请求的访问凭据：当前用户，以及媒体令牌限定的视频（通过 Authorization 头访问时为None）
+    """
+    user: models.User
+    video_id: Optional[str]
+
+
+def get_media_access(
+    db: Session = Depends(get_db),
+    token: Optional[str] = Depends(optional_oauth2_scheme),
+    media_token: Optional[str] = Query(None, alias="token"),
+) -> MediaAccess:
+    """
+    获取媒体请求的当前活跃用户
+
+    <video> 标签无法携带 Authorization 头，因此也接受通过 token 查询参数传递的媒体令牌；
+    媒体令牌只能访问签发时指定的视频，且有效期较短，访问令牌不能放在地址中
+    """
+    return resolve_access(db, token, media_token)
+
+
+def resolve_access(db: Session, token: Optional[str], media_token: Optional[str] = None) -> MediaAccess:
+    """
+    按 Authorization 头中的访问令牌或查询参数中的媒体令牌确定当前活跃用户（不经过依赖注入时使用）
+    """
+    if token:
+        user, video_id = _get_user_from_token(db, token), None
+    elif media_token:
+        token_data = _decode_token(media_token, security.MEDIA_TOKEN_SCOPE)
+        user, video_id = _get_user(db, token_data), token_data.video_id
+    else:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="未提供凭据",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    if not user.is_active:
+        raise HTTPException(status_code=400, detail="账号未激活")
+    return MediaAccess(user, video_id)
+
+
 def get_current_active_superuser(
     current_user: models.User = Depends(get_current_user),
 ) -> models.User:
     """
     获取当前活跃的超级用户
     """
+    if not current_user.is_active:
+        raise HTTPException(status_code=400, detail="账号未激活")
     if not current_user.is_superuser:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN, 
             detail="权限不足"
         )
     return current_user
+
+
+def check_metrics_access(
+    db: Session = Depends(get_db),
+    token: Optional[str] = Depends(optional_oauth2_scheme),
+) -> None:
+    """
+    指标接口的访问控制：接受配置的 METRICS_TOKEN（供Prometheus抓取），或超级用户的访问令牌
+    """
+    if token and settings.METRICS_TOKEN and hmac.compare_digest(token.encode(), settings.METRICS_TOKEN.encode()):
+        return
+    get_current_active_superuser(resolve_access(db, token).user)
+
+
+def get_accessible_media_video(db: Session, video_id: str, access: MediaAccess) -> models.Video:
+    """
+    获取媒体请求要播放的视频，并检查媒体令牌是否签发给该视频
+    """
+    if access.video_id is not None and access.video_id != video_id:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="媒体令牌不能访问此视频"
+        )
+    return get_accessible_video(db, video_id, access.user)
+
+
+def get_accessible_video(db: Session, video_id: str, current_user: models.User) -> models.Video:
+    """
+    获取视频并检查当前用户是否有权访问
+    """
+    video = db.query(models.Video).filter(
+        models.Video.id == video_id,
+        models.Video.deleted_at.is_(None)
+    ).first()
+
+    if not video:
+        raise HTTPException(status_code=404, detail="视频不存在")
+
+    # 检查权限
+    if video.owner_id != current_user.id and not current_user.is_superuser:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="没有足够的权限访问此视频"
+        )
+    return video
@@ -8,10 +8,11 @@ from sqlalchemy.orm import Session
 
 from app import schemas, models
 from app.api import deps
+from app.api.profiling import ProfiledRoute
 from app.core import security
 from app.core.config import settings
 
-router = APIRouter()
+router = APIRouter(route_class=ProfiledRoute)
 
 
 @router.post("/login", response_model=schemas.Token)
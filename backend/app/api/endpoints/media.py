@@ -0,0 +1,147 @@
+import os
+import mimetypes
+from typing import Any, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Header, Response, status
+from fastapi.responses import FileResponse, RedirectResponse
+from sqlalchemy.orm import Session
+
+from app import models, schemas
+from app.api import deps
+from app.api.caching import etag_matches
+from app.api.profiling import ProfiledRoute
+from app.core import security
+from app.core.config import settings
+from app.services import storage
+
+router = APIRouter(route_class=ProfiledRoute)
+
+
+def _file_etag(path: str) -> str:
+    """
+    没有内容哈希的文件按大小和修改时间生成ETag（文件只会被原子替换，不会原地修改）
+    """
+    stat = os.stat(path)
+    return f'"{stat.st_size:x}-{stat.st_mtime_ns:x}"'
+
+
+def _media_response(path: str, etag: Optional[str], if_none_match: Optional[str]) -> Response:
+    """
+    返回媒体文件
+
+    配置了 MEDIA_ACCEL_REDIRECT_PREFIX 时只返回 X-Accel-Redirect 头，由前面的nginx用sendfile发送文件
+    并处理 Range 请求，文件数据不经过应用进程；否则由 FileResponse 按块读取并发送（不会把文件读入内存），
+    同样处理 Range 和 If-Range 请求，返回206部分内容。ETag为强校验值，If-Range 可以直接使用
+    """
+    if not path or not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="媒体文件不存在")
+
+    etag = etag or _file_etag(path)
+    headers = {"ETag": etag, "Cache-Control": "private, max-age=3600"}
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    media_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+    if settings.MEDIA_ACCEL_REDIRECT_PREFIX:
+        relative_path = os.path.relpath(path, settings.VIDEOS_STORAGE_PATH)
+        if not relative_path.startswith(".."):
+            headers["X-Accel-Redirect"] = f"{settings.MEDIA_ACCEL_REDIRECT_PREFIX.rstrip('/')}/{relative_path}"
+            return Response(media_type=media_type, headers=headers)
+
+    return FileResponse(
+        path,
+        media_type=media_type,
+        headers=headers,
+        content_disposition_type="inline",
+    )
+
+
+@router.post("/videos/{video_id}/token", response_model=schemas.MediaToken)
+def create_media_token(
+    *,
+    db: Session = Depends(deps.get_db),
+    video_id: str,
+    current_user: models.User = Depends(deps.get_current_active_user)
+) -> Any:
+    """
+    签发播放该视频（原始视频、片段和台词跳转）用的媒体令牌，以 token 查询参数附在播放地址上
+    """
+    deps.get_accessible_video(db, video_id, current_user)
+    return {
+        "token": security.create_media_token(current_user.id, video_id),
+        "expires_in": settings.MEDIA_TOKEN_EXPIRE_MINUTES * 60,
+    }
+
+
+@router.api_route("/videos/{video_id}", methods=["GET", "HEAD"])
+def stream_video(
+    *,
+    db: Session = Depends(deps.get_db),
+    video_id: str,
+    if_none_match: Optional[str] = Header(None),
+    access: deps.MediaAccess = Depends(deps.get_media_access)
+) -> Any:
+    """
+    播放原始视频，支持 Range 请求（拖动进度条时浏览器只请求需要的字节范围）
+
+    在地址后加上 #t=开始秒数,结束秒数 即可从某条台词开始播放
+    """
+    video = deps.get_accessible_media_video(db, video_id, access)
+
+    # 视频文件按内容寻址，内容哈希即是强ETag
+    etag = f'"{video.content_hash}"' if video.content_hash else None
+    return _media_response(video.file_path, etag, if_none_match)
+
+
+@router.api_route("/segments/{segment_id}", methods=["GET", "HEAD"])
+def stream_segment(
+    *,
+    db: Session = Depends(deps.get_db),
+    segment_id: str,
+    if_none_match: Optional[str] = Header(None),
+    access: deps.MediaAccess = Depends(deps.get_media_access)
+) -> Any:
+    """
+    播放切好的视频片段
+    """
+    segment = db.query(models.VideoSegment).filter(
+        models.VideoSegment.id == segment_id
+    ).first()
+
+    if not segment:
+        raise HTTPException(status_code=404, detail="片段不存在")
+
+    deps.get_accessible_media_video(db, segment.video_id, access)
+    return _media_response(segment.segment_path, None, if_none_match)
+
+
+@router.get("/transcripts/{transcript_id}")
+def play_transcript(
+    *,
+    db: Session = Depends(deps.get_db),
+    transcript_id: str,
+    access: deps.MediaAccess = Depends(deps.get_media_access)
+) -> Any:
+    """
+    跳转到原始视频中台词开始的位置播放，不依赖预先切好的片段
+
+    重定向地址带有媒体片段 #t=开始,结束，浏览器据此用 Range 请求直接读取对应位置附近的数据；
+    地址中附带新签发的该视频的媒体令牌
+    """
+    transcript = db.query(models.Transcript).filter(
+        models.Transcript.id == transcript_id
+    ).first()
+
+    if not transcript:
+        raise HTTPException(status_code=404, detail="台词不存在")
+
+    deps.get_accessible_media_video(db, transcript.video_id, access)
+
+    url = storage.get_media_url(
+        transcript.video_id,
+        transcript.start_time,
+        transcript.end_time,
+        token=security.create_media_token(access.user.id, transcript.video_id),
+    )
+    return RedirectResponse(url, status_code=status.HTTP_307_TEMPORARY_REDIRECT)
+
@@ -1,14 +1,20 @@
 import time
-from typing import Any, List
+from typing import Any, List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from sqlalchemy import tuple_
 from sqlalchemy.orm import Session
 
 from app import models, schemas
 from app.api import deps
+from app.api.pagination import decode_cursor, set_next_cursor
+from app.api.profiling import ProfiledRoute
+from app.core import security
+from app.core.metrics import SEARCH_STAGE_SECONDS
+from app.services.storage import get_media_url
 from app.services.vector_search import search_transcripts
 
-router = APIRouter()
+router = APIRouter(route_class=ProfiledRoute)
 
 
 @router.post("/", response_model=schemas.SearchResults)
@@ -29,34 +35,57 @@ def search(
         user_id=current_user.id,
         query_text=search_query.query,
         limit=search_query.limit,
-        min_confidence=search_query.min_confidence
+        min_confidence=search_query.min_confidence,
+        min_similarity=search_query.min_similarity,
+        video_ids=search_query.video_ids,
+        uploaded_after=search_query.uploaded_after,
+        uploaded_before=search_query.uploaded_before,
+        start_time=search_query.start_time,
+        end_time=search_query.end_time
     )
     
+    # 播放地址附带只能访问该视频的短期媒体令牌（每个视频签发一次）
+    media_tokens = {}
+    for result in results:
+        video_id = result["video"]["id"]
+        if video_id not in media_tokens:
+            media_tokens[video_id] = security.create_media_token(current_user.id, video_id)
+        result["media_url"] = get_media_url(video_id, result["start_time"], result["end_time"], media_tokens[video_id])
+    
     processing_time = time.time() - start_time
     
-    return {
-        "query": search_query.query,
-        "results": results,
-        "total": total,
-        "processing_time": processing_time
-    }
+    # 直接生成响应JSON（不再由FastAPI按response_model重复校验一遍），并记录序列化耗时
+    with SEARCH_STAGE_SECONDS.time(stage="serialize"):
+        body = schemas.SearchResults(
+            query=search_query.query,
+            results=results,
+            total=total,
+            processing_time=processing_time
+        ).model_dump_json()
+    
+    return Response(content=body, media_type="application/json")
 
 
 @router.get("/video/{video_id}/transcripts", response_model=List[schemas.Transcript])
 def get_video_transcripts(
     *,
     db: Session = Depends(deps.get_db),
+    response: Response,
     video_id: str,
     skip: int = 0,
     limit: int = 100,
+    cursor: Optional[str] = None,
     current_user: models.User = Depends(deps.get_current_active_user),
 ) -> Any:
     """
-    获取视频的所有台词
+    获取视频的所有台词（按开始时间排序）
+
+    下一页的游标通过 X-Next-Cursor 响应头返回，请求时传入 cursor 从上一页末尾继续
     """
     # 检查视频是否存在
     video = db.query(models.Video).filter(
-        models.Video.id == video_id
+        models.Video.id == video_id,
+        models.Video.deleted_at.is_(None)
     ).first()
     
     if not video:
@@ -67,8 +96,18 @@ def get_video_transcripts(
         raise HTTPException(status_code=403, detail="没有足够的权限访问此视频")
     
     # 获取台词
-    transcripts = db.query(models.Transcript).filter(
-        models.Transcript.video_id == video_id
-    ).order_by(models.Transcript.start_time).offset(skip).limit(limit).all()
-    
+    query = db.query(models.Transcript).filter(models.Transcript.video_id == video_id)
+
+    if cursor:
+        start_time, last_id = decode_cursor(cursor, ((int, float), str))
+        query = query.filter(
+            tuple_(models.Transcript.start_time, models.Transcript.id) > tuple_(start_time, last_id)
+        )
+    elif skip:
+        query = query.offset(skip)
+
+    # 按 (video_id, start_time, id) 索引顺序读取
+    transcripts = query.order_by(models.Transcript.start_time, models.Transcript.id).limit(limit).all()
+    set_next_cursor(response, transcripts, limit, lambda transcript: [transcript.start_time, transcript.id])
+
     return transcripts
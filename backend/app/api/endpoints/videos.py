@@ -1,112 +1,455 @@
 import os
 import uuid
+import hashlib
+from datetime import datetime
 from typing import Any, List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, BackgroundTasks, status, Response
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, status, Response, Request, Header
+from sqlalchemy import func, tuple_
 from sqlalchemy.orm import Session
 
 from app import models, schemas
 from app.api import deps
+from app.api.caching import etag_matches
+from app.api.pagination import decode_cursor, set_next_cursor
+from app.api.profiling import ProfiledRoute
 from app.core.config import settings
-from app.services.video_processing import process_video
+from app.services import storage, uploads
+from app.services.cleanup import schedule_cleanup
+from app.services.subtitles import SUPPORTED_SUBTITLE_EXTENSIONS
+from app.services.video_processing import enqueue_video_processing, index_cloned_video
+from app.services.vector_search import publish_video_removal
 
-router = APIRouter()
+router = APIRouter(route_class=ProfiledRoute)
 
 
 @router.get("/", response_model=List[schemas.Video])
 def get_videos(
+    response: Response,
     db: Session = Depends(deps.get_db),
     skip: int = 0,
     limit: int = 100,
+    cursor: Optional[str] = None,
     current_user: models.User = Depends(deps.get_current_active_user)
 ) -> Any:
     """
-    获取当前用户的所有视频
+    获取当前用户的所有视频（按上传时间从新到旧）
+
+    下一页的游标通过 X-Next-Cursor 响应头返回，请求时传入 cursor 即可从上一页末尾继续，
+    按 (owner_id, created_at, id) 索引定位，不需要扫描前面的行；skip 仅为兼容保留
     """
-    videos = db.query(models.Video).filter(
-        models.Video.owner_id == current_user.id
-    ).offset(skip).limit(limit).all()
-    
+    query = db.query(models.Video).filter(
+        models.Video.owner_id == current_user.id,
+        models.Video.deleted_at.is_(None)
+    )
+
+    if cursor:
+        created_at, last_id = decode_cursor(cursor, (str, str))
+        try:
+            created_at = datetime.fromisoformat(created_at)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="分页游标无效")
+        query = query.filter(tuple_(models.Video.created_at, models.Video.id) < tuple_(created_at, last_id))
+    elif skip:
+        query = query.offset(skip)
+
+    videos = query.order_by(models.Video.created_at.desc(), models.Video.id.desc()).limit(limit).all()
+    set_next_cursor(response, videos, limit, lambda video: [video.created_at.isoformat(), video.id])
+
     return videos
 
 
+def _register_video(
+    db: Session,
+    *,
+    video_id: str,
+    title: str,
+    description: Optional[str],
+    owner_id: str,
+    tmp_path: str,
+    content_hash: str,
+    file_size: int,
+    file_ext: str,
+    video_metadata: Optional[dict] = None,
+) -> models.Video:
+    """
+    将已写入临时文件的上传内容入库，创建视频记录并安排处理
+    """
+    file_path = storage.store_file(db, tmp_path, content_hash, file_ext)
+    
+    # 创建视频记录
+    video = models.Video(
+        id=video_id,
+        title=title,
+        description=description,
+        file_path=file_path,
+        content_hash=content_hash,
+        file_size=file_size,
+        owner_id=owner_id,
+        processing_status=models.ProcessingStatus.PENDING,
+        video_metadata=video_metadata
+    )
+    
+    db.add(video)
+    
+    # 相同内容的视频已处理完成时直接复用结果（指定了外挂字幕或强制语音识别时除外）
+    duplicate = None
+    if not video_metadata:
+        duplicate = storage.find_completed_duplicate(db, content_hash)
+    if duplicate:
+        storage.clone_processed_video(db, duplicate, video)
+    
+    db.commit()
+    
+    if duplicate is None:
+        # 将视频处理任务分发到Celery队列
+        enqueue_video_processing(video_id)
+    elif not index_cloned_video(db, duplicate.id, video_id):
+        # 无法复用已有视频的向量时重新向量化
+        enqueue_video_processing(video_id, models.ProcessingStage.TRANSCRIBED)
+    
+    db.refresh(video)
+    return video
+
+
+def _discard_subtitle(db: Session, video_id: str, video_metadata: Optional[dict]) -> None:
+    """
+    上传失败且视频记录未写入时删除已保存的外挂字幕，避免留下孤立的字幕文件
+    """
+    subtitle_path = (video_metadata or {}).get("sidecar_subtitle")
+    if not subtitle_path:
+        return
+    db.rollback()
+    if db.query(models.Video.id).filter(models.Video.id == video_id).first() is None and os.path.exists(subtitle_path):
+        os.remove(subtitle_path)
+
+
 @router.post("/", response_model=schemas.Video)
 def create_video(
     *,
     db: Session = Depends(deps.get_db),
-    background_tasks: BackgroundTasks,
     title: str = Form(...),
     description: Optional[str] = Form(None),
     video_file: UploadFile = File(...),
+    subtitle_file: Optional[UploadFile] = File(None),
+    force_asr: bool = Form(False),
     current_user: models.User = Depends(deps.get_current_active_user)
 ) -> Any:
     """
     上传新视频（单文件上传）
+
+    可同时上传外挂字幕（srt、vtt、ass），有字幕时直接使用字幕而跳过语音识别；
+    force_asr为true时忽略所有字幕，始终进行语音识别
     """
     # 检查扩展名
     file_ext = os.path.splitext(video_file.filename)[1].lower()
-    if file_ext not in ['.mp4', '.avi', '.mov', '.mkv', '.webm']:
+    if file_ext not in uploads.SUPPORTED_VIDEO_EXTENSIONS:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="不支持的视频格式，请上传 mp4, avi, mov, mkv 或 webm 格式的视频"
         )
     
+    subtitle_ext = None
+    if subtitle_file is not None and subtitle_file.filename:
+        subtitle_ext = os.path.splitext(subtitle_file.filename)[1].lower()
+        if subtitle_ext not in SUPPORTED_SUBTITLE_EXTENSIONS:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="不支持的字幕格式，请上传 srt, vtt 或 ass 格式的字幕"
+            )
+    
     # 创建上传目录
     os.makedirs(settings.VIDEOS_STORAGE_PATH, exist_ok=True)
     
     # 生成唯一ID
     video_id = str(uuid.uuid4())
-    file_name = f"{video_id}{file_ext}"
-    file_path = os.path.join(settings.VIDEOS_STORAGE_PATH, file_name)
     
-    # 保存文件
-    with open(file_path, "wb+") as file_object:
-        file_object.write(video_file.file.read())
+    video_metadata = {}
+    if force_asr:
+        video_metadata["force_asr"] = True
+    if subtitle_ext:
+        video_metadata["sidecar_subtitle"] = storage.save_subtitle(subtitle_file.file, video_id, subtitle_ext)
     
-    # 创建视频记录
-    video = models.Video(
-        id=video_id,
-        title=title,
-        description=description,
-        file_path=file_path,
-        owner_id=current_user.id,
-        processing_status=models.ProcessingStatus.PENDING
-    )
+    try:
+        # 分块保存文件，同时计算内容哈希
+        tmp_path, content_hash, file_size = storage.save_upload(video_file.file)
+        
+        return _register_video(
+            db,
+            video_id=video_id,
+            title=title,
+            description=description,
+            owner_id=current_user.id,
+            tmp_path=tmp_path,
+            content_hash=content_hash,
+            file_size=file_size,
+            file_ext=file_ext,
+            video_metadata=video_metadata or None,
+        )
+    except Exception:
+        _discard_subtitle(db, video_id, video_metadata)
+        raise
+
+
+@router.post("/uploads", response_model=schemas.VideoUploadInitResponse)
+def init_upload(
+    *,
+    upload_in: schemas.VideoUploadInit,
+    current_user: models.User = Depends(deps.get_current_active_user)
+) -> Any:
+    """
+    初始化分块上传，返回每一块的编号、偏移和大小
+    """
+    file_ext = uploads.normalize_file_ext(upload_in.file_type)
+    if not file_ext:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="不支持的视频格式，请上传 mp4, avi, mov, mkv 或 webm 格式的视频"
+        )
     
-    db.add(video)
-    db.commit()
-    db.refresh(video)
+    try:
+        manifest = uploads.create_upload_session(
+            owner_id=current_user.id,
+            title=upload_in.title,
+            description=upload_in.description,
+            file_size=upload_in.file_size,
+            file_ext=file_ext,
+            force_asr=bool(upload_in.force_asr),
+        )
+    except uploads.UploadError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    
+    return {
+        "upload_id": manifest["upload_id"],
+        "video_id": manifest["video_id"],
+        "parts": manifest["parts"]
+    }
+
+
+@router.get("/uploads/{upload_id}", response_model=schemas.VideoUploadStatus)
+def get_upload(
+    *,
+    upload_id: str,
+    current_user: models.User = Depends(deps.get_current_active_user)
+) -> Any:
+    """
+    查询分块上传进度，客户端据此只补传缺失的分块
+    """
+    try:
+        manifest = uploads.get_upload_session(upload_id, current_user.id)
+    except uploads.UploadError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    
+    return {
+        "upload_id": manifest["upload_id"],
+        "video_id": manifest["video_id"],
+        "parts": manifest["parts"],
+        "uploaded_parts": uploads.list_uploaded_parts(manifest)
+    }
+
+
+@router.put("/uploads/{upload_id}/parts/{part_number}", response_model=schemas.VideoUploadPart)
+async def upload_part(
+    *,
+    request: Request,
+    upload_id: str,
+    part_number: int,
+    part_sha256: Optional[str] = Header(None, alias="X-Part-SHA256"),
+    current_user: models.User = Depends(deps.get_current_active_user)
+) -> Any:
+    """
+    上传一个分块（请求体为分块的原始字节，可通过X-Part-SHA256头提交校验和）
+    """
+    try:
+        manifest = uploads.get_upload_session(upload_id, current_user.id)
+        return await uploads.write_part(manifest, part_number, request.stream(), part_sha256)
+    except uploads.UploadError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+
+
+@router.post("/uploads/complete", response_model=schemas.Video)
+def complete_upload(
+    *,
+    db: Session = Depends(deps.get_db),
+    upload_in: schemas.VideoUploadComplete,
+    current_user: models.User = Depends(deps.get_current_active_user)
+) -> Any:
+    """
+    完成分块上传：校验并合并所有分块，创建视频记录
+    """
+    try:
+        manifest = uploads.get_upload_session(upload_in.upload_id, current_user.id)
+        if manifest["video_id"] != upload_in.video_id:
+            raise uploads.UploadError("视频ID与上传会话不匹配")
+        tmp_path, content_hash, file_size = uploads.assemble_upload(manifest, upload_in.parts)
+    except uploads.UploadError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
     
-    # 将视频处理任务加入后台队列
-    background_tasks.add_task(process_video, video_id)
+    video_id = manifest["video_id"]
+    video_metadata = {}
+    if manifest.get("force_asr"):
+        video_metadata["force_asr"] = True
+    subtitle_path = uploads.get_session_subtitle(manifest)
+    if subtitle_path:
+        with open(subtitle_path, "rb") as subtitle_file:
+            video_metadata["sidecar_subtitle"] = storage.save_subtitle(
+                subtitle_file, video_id, os.path.splitext(subtitle_path)[1]
+            )
+    
+    try:
+        video = _register_video(
+            db,
+            video_id=video_id,
+            title=manifest["title"],
+            description=manifest["description"],
+            owner_id=current_user.id,
+            tmp_path=tmp_path,
+            content_hash=content_hash,
+            file_size=file_size,
+            file_ext=manifest["file_ext"],
+            video_metadata=video_metadata or None,
+        )
+    except Exception:
+        _discard_subtitle(db, video_id, video_metadata)
+        raise
+    
+    uploads.remove_upload_session(upload_in.upload_id)
     
     return video
 
 
+@router.put("/uploads/{upload_id}/subtitle", status_code=status.HTTP_204_NO_CONTENT)
+def upload_session_subtitle(
+    *,
+    upload_id: str,
+    subtitle_file: UploadFile = File(...),
+    current_user: models.User = Depends(deps.get_current_active_user)
+) -> None:
+    """
+    为分块上传会话附加外挂字幕（srt、vtt、ass），需在完成上传之前调用
+    """
+    subtitle_ext = os.path.splitext(subtitle_file.filename or "")[1].lower()
+    if subtitle_ext not in SUPPORTED_SUBTITLE_EXTENSIONS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="不支持的字幕格式，请上传 srt, vtt 或 ass 格式的字幕"
+        )
+    
+    try:
+        manifest = uploads.get_upload_session(upload_id, current_user.id)
+    except uploads.UploadError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    
+    uploads.save_session_subtitle(manifest, subtitle_file.file, subtitle_ext)
+
+
+@router.delete("/uploads/{upload_id}")
+def abort_upload(
+    *,
+    upload_id: str,
+    current_user: models.User = Depends(deps.get_current_active_user),
+    response: Response
+) -> Any:
+    """
+    取消分块上传并删除已上传的分块
+    """
+    try:
+        uploads.get_upload_session(upload_id, current_user.id)
+    except uploads.UploadError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    
+    uploads.remove_upload_session(upload_id)
+    
+    response.status_code = status.HTTP_204_NO_CONTENT
+
+
 @router.get("/{video_id}", response_model=schemas.VideoDetail)
 def get_video(
     *,
     db: Session = Depends(deps.get_db),
     video_id: str,
-    current_user: models.User = Depends(deps.get_current_active_user)
+    current_user: models.User = Depends(deps.get_current_active_user),
+    response: Response,
+    if_none_match: Optional[str] = Header(None)
 ) -> Any:
     """
     获取视频详情
+
+    片段只返回在数据库中统计的数量和总时长，片段列表通过 /{video_id}/segments 分页获取。
+    响应带有ETag，视频和片段均未变化时对带 If-None-Match 的请求返回304
     """
-    video = db.query(models.Video).filter(
-        models.Video.id == video_id
-    ).first()
+    video = deps.get_accessible_video(db, video_id, current_user)
+
+    # 片段只在处理阶段写入（或复制），写入后的阶段记录会更新updated_at，
+    # 因此ETag只取决于视频本身，命中时无需统计片段
+    version = f"{video.id}:{video.updated_at.isoformat() if video.updated_at else ''}"
+    etag = f'W/"{hashlib.sha1(version.encode()).hexdigest()}"'
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    count, total_duration = db.query(
+        func.count(models.VideoSegment.id),
+        func.coalesce(func.sum(models.VideoSegment.end_time - models.VideoSegment.start_time), 0.0)
+    ).filter(models.VideoSegment.video_id == video_id).one()
+
+    response.headers.update(headers)
+    detail = schemas.VideoDetail.model_validate(video)
+    detail.segment_summary = schemas.VideoSegmentSummary(count=count, total_duration=total_duration)
+    return detail
+
+
+@router.get("/{video_id}/segments", response_model=List[schemas.VideoSegment])
+def get_video_segments(
+    *,
+    db: Session = Depends(deps.get_db),
+    video_id: str,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    current_user: models.User = Depends(deps.get_current_active_user),
+    response: Response
+) -> Any:
+    """
+    分页获取视频的片段（按开始时间排序）
+
+    下一页的游标通过 X-Next-Cursor 响应头返回，请求时传入 cursor 从上一页末尾继续
+    """
+    deps.get_accessible_video(db, video_id, current_user)
+
+    query = db.query(models.VideoSegment).filter(models.VideoSegment.video_id == video_id)
+    if cursor:
+        start_time, last_id = decode_cursor(cursor, ((int, float), str))
+        query = query.filter(
+            tuple_(models.VideoSegment.start_time, models.VideoSegment.id) > tuple_(start_time, last_id)
+        )
+
+    segments = query.order_by(models.VideoSegment.start_time, models.VideoSegment.id).limit(limit).all()
+    set_next_cursor(response, segments, limit, lambda segment: [segment.start_time, segment.id])
+
+    return segments
+
+
+@router.post("/{video_id}/retry", response_model=schemas.Video)
+def retry_video(
+    *,
+    db: Session = Depends(deps.get_db),
+    video_id: str,
+    current_user: models.User = Depends(deps.get_current_active_user)
+) -> Any:
+    """
+    重新处理失败的视频，从最近完成的阶段继续
+    """
+    video = deps.get_accessible_video(db, video_id, current_user)
+    if video.processing_status != models.ProcessingStatus.FAILED:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="只能重新处理失败的视频")
     
-    if not video:
-        raise HTTPException(status_code=404, detail="视频不存在")
+    video.processing_status = models.ProcessingStatus.PENDING
+    db.commit()
     
-    # 检查权限
-    if video.owner_id != current_user.id and not current_user.is_superuser:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="没有足够的权限访问此视频"
-        )
+    enqueue_video_processing(video_id, video.processing_stage)
     
+    db.refresh(video)
     return video
 
 
@@ -120,9 +463,12 @@ def delete_video(
 ) -> Any:
     """
     删除视频
+
+    只将视频标记为已删除并立即从搜索结果中移除，文件、片段、向量分片和缓存由后台回收任务清理
     """
     video = db.query(models.Video).filter(
-        models.Video.id == video_id
+        models.Video.id == video_id,
+        models.Video.deleted_at.is_(None)
     ).first()
     
     if not video:
@@ -135,13 +481,14 @@ def delete_video(
             detail="没有足够的权限删除此视频"
         )
     
-    # 删除文件
-    if os.path.exists(video.file_path):
-        os.remove(video.file_path)
-    
-    # 删除数据库记录
-    db.delete(video)
+    video.deleted_at = datetime.utcnow()
     db.commit()
     
+    # 从搜索结果中移除
+    publish_video_removal(video_id)
+    
+    # 在后台回收视频占用的存储
+    schedule_cleanup()
+    
     # 设置204状态码但不返回响应体
     response.status_code = status.HTTP_204_NO_CONTENT
@@ -0,0 +1,52 @@
+import json
+import base64
+import binascii
+from typing import Any, List, Optional, Sequence
+
+from fastapi import HTTPException, Response
+
+# 返回下一页游标的响应头
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(values: List[Any]) -> str:
+    """
+    将当前页最后一行的排序键编码为不透明的游标
+    """
+    raw = json.dumps(values, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, types: Sequence[Any]) -> List[Any]:
+    """
+    解析客户端传回的游标，格式不正确时返回400
+
+    types 依次给出每个排序键允许的类型（与isinstance的参数相同），类型不符同样返回400，
+    不会把错误类型的值传给数据库查询
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw)
+    except (binascii.Error, ValueError):
+        raise HTTPException(status_code=400, detail="分页游标无效")
+
+    if not isinstance(values, list) or len(values) != len(types):
+        raise HTTPException(status_code=400, detail="分页游标无效")
+    for value, expected in zip(values, types):
+        # bool是int的子类，需要单独排除
+        if isinstance(value, bool) or not isinstance(value, expected):
+            raise HTTPException(status_code=400, detail="分页游标无效")
+    return values
+
+
+def set_next_cursor(response: Response, items: List[Any], limit: int, key) -> Optional[str]:
+    """
+    本页已取满时，用最后一行的排序键生成下一页的游标并写入响应头
+
+    key 为从一行中取出排序键列表的函数
+    """
+    if not items or len(items) < limit:
+        return None
+    cursor = encode_cursor(key(items[-1]))
+    response.headers[NEXT_CURSOR_HEADER] = cursor
+    return cursor
@@ -0,0 +1,186 @@
+import os
+import sys
+import time
+import uuid
+import inspect
+import logging
+import threading
+from functools import wraps
+from typing import Any, Callable, Optional
+from urllib.parse import parse_qs
+
+from fastapi import HTTPException
+from fastapi.concurrency import run_in_threadpool
+from fastapi.routing import APIRoute
+from starlette.datastructures import MutableHeaders
+from starlette.responses import JSONResponse, Response
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.api import deps
+from app.core.config import settings
+from app.core.profiling import StackSampler, active_sampler
+from app.db.session import SessionLocal
+
+# 配置日志
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# 请求性能分析的请求头（也可以使用同名的查询参数 ?profile=）：
+# return 返回分析结果代替原响应，其他非空值（如 1、store）保存为文件并在响应头中返回文件名
+PROFILE_HEADER = "X-Profile"
+PROFILE_FILE_HEADER = "X-Profile-File"
+
+_PROFILE_HEADER_KEY = PROFILE_HEADER.lower().encode()
+
+
+def profiled_endpoint(endpoint: Callable) -> Callable:
+    """
+    包装接口函数：请求要求性能分析时，把执行接口的线程登记到采样器
+
+    未要求分析时只多一次上下文变量读取
+    """
+    if inspect.iscoroutinefunction(endpoint):
+        @wraps(endpoint)
+        async def async_wrapper(*args, **kwargs):
+            sampler = active_sampler.get()
+            if sampler is None:
+                return await endpoint(*args, **kwargs)
+            # 异步接口在事件循环线程中执行，期间切换到的其他请求也会被采到
+            ident = threading.get_ident()
+            sampler.add_thread(ident, sys._getframe())
+            try:
+                return await endpoint(*args, **kwargs)
+            finally:
+                sampler.remove_thread(ident)
+        return async_wrapper
+
+    @wraps(endpoint)
+    def wrapper(*args, **kwargs):
+        sampler = active_sampler.get()
+        if sampler is None:
+            return endpoint(*args, **kwargs)
+        ident = threading.get_ident()
+        sampler.add_thread(ident, sys._getframe())
+        try:
+            return endpoint(*args, **kwargs)
+        finally:
+            sampler.remove_thread(ident)
+    return wrapper
+
+
+class ProfiledRoute(APIRoute):
+    """
+    支持按请求进行性能分析的路由
+    """
+
+    def __init__(self, path: str, endpoint: Callable[..., Any], **kwargs):
+        super().__init__(path, profiled_endpoint(endpoint), **kwargs)
+
+
+def _profile_mode(scope: Scope) -> Optional[str]:
+    """
+    读取请求要求的分析方式，未要求时返回None
+    """
+    for name, value in scope["headers"]:
+        if name == _PROFILE_HEADER_KEY:
+            mode = value.decode("latin-1").strip().lower()
+            return mode if mode not in ("", "0", "false") else None
+
+    query_string = scope.get("query_string", b"")
+    if b"profile=" not in query_string:
+        return None
+    mode = parse_qs(query_string.decode("latin-1")).get("profile", [""])[0].strip().lower()
+    return mode if mode not in ("", "0", "false") else None
+
+
+def _check_superuser(scope: Scope):
+    """
+    只有超级用户可以要求性能分析
+
+    与接口使用相同的身份验证：Authorization 头中的访问令牌，或媒体接口 token 查询参数中的媒体令牌
+    """
+    token = None
+    for name, value in scope["headers"]:
+        if name == b"authorization":
+            scheme, _, credentials = value.decode("latin-1").partition(" ")
+            if scheme.lower() == "bearer":
+                token = credentials.strip()
+    query_string = scope.get("query_string", b"").decode("latin-1")
+    media_token = parse_qs(query_string).get("token", [None])[0]
+
+    db = SessionLocal()
+    try:
+        deps.get_current_active_superuser(deps.resolve_access(db, token, media_token).user)
+    finally:
+        db.close()
+
+
+def _save_profile(name: str, folded: str):
+    os.makedirs(settings.PROFILE_DIR, exist_ok=True)
+    path = os.path.join(settings.PROFILE_DIR, name)
+    with open(f"{path}.tmp", "w") as f:
+        f.write(folded)
+    os.replace(f"{path}.tmp", path)
+
+
+class ProfilingMiddleware:
+    """
+    超级用户可以对单个请求进行采样式性能分析（覆盖向量化、FAISS检索和SQL查询等执行接口的全过程）
+
+    请求头 X-Profile 或查询参数 profile 为 return 时返回折叠栈格式的分析结果（原响应的状态码见
+    X-Profile-Status），为其他非空值时正常返回，分析结果保存到 PROFILE_DIR，文件名见 X-Profile-File。
+    没有要求分析的请求只检查一次请求头和查询字符串
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        mode = _profile_mode(scope) if scope["type"] == "http" else None
+        if mode is None:
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            await run_in_threadpool(_check_superuser, scope)
+        except HTTPException as e:
+            response = JSONResponse({"detail": e.detail}, status_code=e.status_code, headers=e.headers)
+            await response(scope, receive, send)
+            return
+
+        name = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}.folded"
+        status_code = 500
+
+        async def send_wrapper(message: Message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                if mode != "return":
+                    MutableHeaders(scope=message).append(PROFILE_FILE_HEADER, name)
+            if mode != "return":
+                await send(message)
+
+        sampler = StackSampler(settings.PROFILE_SAMPLE_INTERVAL_MS / 1000)
+        token = active_sampler.set(sampler)
+        sampler.start()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            sampler.stop()
+            active_sampler.reset(token)
+
+        logger.info(
+            f"请求性能分析 {scope['method']} {scope['path']}: "
+            f"{sampler.duration * 1000:.1f}ms，采样 {sampler.sample_count} 次"
+        )
+
+        folded = sampler.folded()
+        if mode == "return":
+            response = Response(
+                content=folded,
+                media_type="text/plain; charset=utf-8",
+                headers={"X-Profile-Status": str(status_code), "X-Profile-Samples": str(sampler.sample_count)},
+            )
+            await response(scope, receive, send)
+        else:
+            await run_in_threadpool(_save_profile, name, folded)
@@ -1,12 +1,26 @@
 from celery import Celery
+from celery.signals import celeryd_init
+from kombu import Queue
 
 from app.core.config import settings
 
+# 任务队列：CPU密集型阶段（转写、向量化）与I/O型阶段（探测、切片）分开，
+# 分别由不同的worker消费，互不阻塞
+INGEST_CPU_QUEUE = "ingest_cpu"
+INGEST_IO_QUEUE = "ingest_io"
+
+# 每个队列的worker并发上限
+QUEUE_CONCURRENCY = {
+    INGEST_CPU_QUEUE: settings.CELERY_CPU_CONCURRENCY,
+    INGEST_IO_QUEUE: settings.CELERY_IO_CONCURRENCY,
+}
+
 # 创建Celery实例
 celery_app = Celery(
     "video_search",
-    broker=settings.CELERY_BROKER_URL,
-    backend=settings.CELERY_RESULT_BACKEND,
+    broker="memory://" if settings.CELERY_TASK_ALWAYS_EAGER else settings.CELERY_BROKER_URL,
+    backend="cache+memory://" if settings.CELERY_TASK_ALWAYS_EAGER else settings.CELERY_RESULT_BACKEND,
+    include=["app.services.video_processing", "app.services.reindex", "app.services.cleanup"],  # worker启动时导入任务模块
 )
 
 # 配置Celery
@@ -18,7 +32,53 @@ celery_app.conf.update(
     enable_utc=False,
     worker_max_tasks_per_child=1000,  # 每个worker处理1000个任务后重启，防止内存泄漏
     task_acks_late=True,  # 任务执行完成后再确认
+    task_reject_on_worker_lost=True,  # worker异常退出时任务重新入队
+    worker_prefetch_multiplier=1,  # 任务耗时长，每个进程只预取一个任务，避免任务积压在忙碌的worker上
+    broker_transport_options={"visibility_timeout": 6 * 3600},  # 长任务未确认时不被Redis提前重新投递
+    task_always_eager=settings.CELERY_TASK_ALWAYS_EAGER,
+    task_eager_propagates=True,
+    task_queues=(Queue(INGEST_CPU_QUEUE), Queue(INGEST_IO_QUEUE)),
+    task_default_queue=INGEST_IO_QUEUE,
+    task_routes={
+        "app.services.video_processing.probe_video_task": {"queue": INGEST_IO_QUEUE},
+        "app.services.video_processing.transcribe_video_task": {"queue": INGEST_CPU_QUEUE},
+        "app.services.video_processing.embed_video_task": {"queue": INGEST_CPU_QUEUE},
+        "app.services.video_processing.cut_video_task": {"queue": INGEST_IO_QUEUE},
+        "app.services.video_processing.mark_video_failed_task": {"queue": INGEST_IO_QUEUE},
+        "app.services.video_processing.process_video_task": {"queue": INGEST_CPU_QUEUE},
+        "app.services.video_processing.sweep_stuck_videos_task": {"queue": INGEST_IO_QUEUE},
+        "app.services.reindex.reindex_vectors_task": {"queue": INGEST_CPU_QUEUE},
+        "app.services.cleanup.collect_deleted_videos_task": {"queue": INGEST_IO_QUEUE},
+    },
+    beat_schedule={
+        # 定期把卡在PROCESSING状态的视频重新入队，从最近完成的阶段继续
+        "sweep-stuck-videos": {
+            "task": "app.services.video_processing.sweep_stuck_videos_task",
+            "schedule": 600.0,
+        },
+        # 定期回收已删除的视频（删除时分发的任务失败时作为兜底）
+        "collect-deleted-videos": {
+            "task": "app.services.cleanup.collect_deleted_videos_task",
+            "schedule": float(settings.CLEANUP_INTERVAL_SECONDS),
+        },
+    },
 )
 
-# 包含任务模块
-celery_app.autodiscover_tasks(["app.services"])
+
+@celeryd_init.connect
+def configure_worker_concurrency(sender=None, conf=None, options=None, **kwargs):
+    """
+    未通过 -c 指定并发数时，按worker消费的队列设置并发上限
+    """
+    if not options or options.get("concurrency"):
+        return
+
+    queues = options.get("queues") or [INGEST_IO_QUEUE]
+    if isinstance(queues, str):
+        queues = queues.split(",")
+
+    limits = [QUEUE_CONCURRENCY[queue] for queue in queues if queue in QUEUE_CONCURRENCY]
+    if limits:
+        # 同时消费多个队列时取最小值，保证CPU队列的上限不被突破
+        conf.worker_concurrency = min(limits)
+
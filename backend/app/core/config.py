@@ -11,6 +11,8 @@ class Settings(BaseSettings):
     SECRET_KEY: str = secrets.token_urlsafe(32)
     # 60 minutes * 24 hours * 8 days = 8 days
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 60 * 24 * 8
+    MEDIA_TOKEN_EXPIRE_MINUTES: int = 120  # 播放地址中媒体令牌的有效期（只能访问一个视频）
+    METRICS_TOKEN: Optional[str] = None  # Prometheus抓取 /metrics 时使用的Bearer令牌；未设置时只有超级用户可以访问
     SERVER_NAME: str = "VideoSearch"
     SERVER_HOST: AnyHttpUrl = "http://localhost"
     
@@ -32,13 +34,20 @@ class Settings(BaseSettings):
     POSTGRES_USER: str = "postgres"
     POSTGRES_PASSWORD: str = "postgres"  # 使用默认密码
     POSTGRES_DB: str = "videosearch"
+    DATABASE_URL: Optional[str] = None  # 设置后直接使用该连接串（例如基准测试使用SQLite）
     
     @computed_field
     @property
     def SQLALCHEMY_DATABASE_URI(self) -> str:
+        if self.DATABASE_URL:
+            return self.DATABASE_URL
         # 使用标准的带密码连接串
         return f"postgresql://{self.POSTGRES_USER}:{self.POSTGRES_PASSWORD}@{self.POSTGRES_SERVER}/{self.POSTGRES_DB}"
     
+    # 批量写入配置
+    DB_BULK_BATCH_SIZE: int = 1000  # 每批写入的行数，限制单批占用的内存
+    DB_BULK_USE_COPY: bool = True  # PostgreSQL下使用COPY批量写入
+    
     # Redis 配置
     REDIS_HOST: str = "localhost"
     REDIS_PORT: int = 6379
@@ -47,20 +56,68 @@ class Settings(BaseSettings):
     # Celery 配置
     CELERY_BROKER_URL: str = f"redis://{REDIS_HOST}:{REDIS_PORT}/{REDIS_DB}"
     CELERY_RESULT_BACKEND: str = CELERY_BROKER_URL
+    CELERY_TASK_ALWAYS_EAGER: bool = False  # 测试时在当前进程内同步执行任务，无需broker
+    CELERY_CPU_CONCURRENCY: int = 1  # CPU密集型队列（转写、向量化）每个worker的并发数
+    CELERY_IO_CONCURRENCY: int = 4  # I/O型队列（探测、切片）每个worker的并发数
+    
+    # 认证用户缓存（按token中的用户ID缓存，多个进程通过Redis共享）
+    USER_CACHE_SIZE: int = 10000  # 每个进程最多缓存的用户数
+    USER_CACHE_TTL_SECONDS: int = 300  # Redis中的缓存时间
+    USER_CACHE_LOCAL_TTL_SECONDS: int = 30  # 本进程缓存时间（错过失效通知时的最长延迟）
     
     # 视频存储配置
     VIDEOS_STORAGE_PATH: str = "/tmp/videosearch/videos"
+    UPLOAD_PART_SIZE: int = 16 * 1024 * 1024  # 分块上传时每块的大小(字节)
+    UPLOAD_SESSION_TTL_HOURS: int = 24  # 分块上传会话超过该时间没有写入时由回收任务删除
+    KEEP_PROCESSING_ARTIFACTS: bool = False  # 是否保留中间产物（音频、识别结果）；管道提取音频时为true才把PCM写盘
+    MEDIA_ACCEL_REDIRECT_PREFIX: Optional[str] = None  # 设置后播放接口只返回 X-Accel-Redirect 头，由nginx以sendfile发送存储目录下的文件
+    PROCESSING_STUCK_TIMEOUT_MINUTES: int = 360  # 超过该时间仍处于PROCESSING的视频会被重新入队
+    CLEANUP_BATCH_SIZE: int = 100  # 回收已删除的视频时每批处理的视频数
+    CLEANUP_INTERVAL_SECONDS: int = 900  # 定期回收的间隔（删除视频时也会立即触发一次）
     
     # Whisper 模型配置
     WHISPER_MODEL: str = "base"  # 可选: "tiny", "base", "small", "medium", "large"
+    WHISPER_LANGUAGE: str = "zh"
+    WHISPER_BEAM_SIZE: int = 5
+    WHISPER_VAD_FILTER: bool = True
+    WHISPER_MAX_PROCESSES: int = 2  # 批量导入时最多同时加载Whisper模型的进程数（每个进程各在GPU上加载一份模型）
+    USE_SUBTITLES: bool = True  # 视频带有文本字幕（内嵌或外挂）时直接使用字幕，跳过语音识别
+    
+    # 语音识别结果缓存（按视频内容哈希和识别参数缓存，重新处理时跳过音频提取和ASR）
+    TRANSCRIPT_CACHE_DIR: str = "/tmp/videosearch/cache/transcripts"
+    TRANSCRIPT_CACHE_MAX_BYTES: int = 2 * 1024 * 1024 * 1024  # 超出后按最近使用时间淘汰
+    
+    # 音频提取配置
+    AUDIO_IN_MEMORY: bool = True  # 通过管道直接读取ffmpeg输出的PCM，不再写临时WAV文件
+    AUDIO_STREAM_CHUNK_SECONDS: int = 0  # 大于0时按块边提取边识别(秒)，0表示整段读入内存后识别
+    AUDIO_STREAM_OVERLAP_SECONDS: float = 2.0  # 分块识别时相邻块重叠的时长(秒)，避免块边界处的词被截断
+    AUDIO_STREAM_PREFETCH_CHUNKS: int = 2  # 识别当前块时后台预先读取的音频块数
     
     # 向量搜索配置
-    VECTOR_DIMENSION: int = 768  # Sentence-BERT 默认维度
+    VECTOR_DIMENSION: int = 512  # 与EMBEDDING_MODEL的输出维度一致（仅用于未分代的旧向量存储，新一代的维度取自模型）
     TOP_K_RESULTS: int = 10
+    SEARCH_MAX_CANDIDATES: int = 5000  # 过滤搜索时最多从索引中取回的候选数
+    SEARCH_GROWTH_FACTOR: int = 4  # 过滤后结果不足时候选数的增长倍数
+    SEARCH_SCOPED_EXACT_MAX: int = 200000  # 限定范围搜索时，范围内向量数不超过该值则只计算范围内的向量
+    EMBEDDING_MODEL: str = "distiluse-base-multilingual-cased-v1"  # 台词与查询使用同一个模型
+    EMBEDDING_BATCH_SIZE: int = 64
+    VECTOR_STORE_PATH: str = "/tmp/videosearch/vectors"  # 向量分片与向量日志，供各进程同步索引
+    VECTOR_STORE_DTYPE: str = "float16"  # 向量分片的存储精度，float16占用空间减半，索引中仍以float32计算
+    REINDEX_BATCH_SIZE: int = 2000  # 重建向量时每批从数据库读取并向量化的台词数
+    
+    # 请求性能分析配置（超级用户通过 X-Profile 请求头或 profile 查询参数触发）
+    PROFILE_DIR: str = "/tmp/videosearch/profiles"  # 分析结果（折叠栈格式）的保存目录
+    PROFILE_SAMPLE_INTERVAL_MS: float = 5.0  # 采样间隔(毫秒)
     
     # 静态文件配置
     STATIC_DIR: str = "static"
     
+    # 缩略图与关键帧精灵图配置
+    PREVIEW_TILE_WIDTH: int = 256
+    PREVIEW_TILE_HEIGHT: int = 144
+    SPRITE_COLUMNS: int = 10
+    SPRITE_TILES_PER_SHEET: int = 100  # 每张精灵图的帧数，片段很多时拆成多张，避免单张图片尺寸超限
+    
     class Config:
         case_sensitive = True
         env_file = ".env"
@@ -0,0 +1,310 @@
+import os
+import json
+import time
+import bisect
+import logging
+import resource
+import threading
+from contextlib import contextmanager
+from functools import wraps
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import redis
+
+from app.core.config import settings
+
+# 配置日志
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# 默认的耗时分桶(秒)，覆盖毫秒级的搜索阶段到分钟级的处理阶段
+DEFAULT_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+    1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0, 900.0, 3600.0,
+)
+
+_REDIS_KEY_PREFIX = "metrics:"
+
+_registry: Dict[str, "_Metric"] = {}
+_registry_lock = threading.Lock()
+
+_redis_client = None
+_redis_retry_at = 0.0
+
+
+def _get_redis() -> Optional[redis.Redis]:
+    """
+    共享指标使用的Redis连接；连接失败时一段时间内只记录本进程的数据
+    """
+    global _redis_client
+    if _redis_client is None and time.monotonic() >= _redis_retry_at:
+        _redis_client = redis.Redis(
+            host=settings.REDIS_HOST,
+            port=settings.REDIS_PORT,
+            db=settings.REDIS_DB,
+            socket_timeout=0.2,
+            socket_connect_timeout=0.2,
+        )
+    return _redis_client
+
+
+def _redis_failed(e: Exception):
+    global _redis_client, _redis_retry_at
+    logger.warning(f"共享指标无法访问Redis，暂时只记录本进程的数据: {e}")
+    _redis_client = None
+    _redis_retry_at = time.monotonic() + 30
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+class _Metric:
+    """
+    指标的公共部分：按标签值分组保存数据
+
+    shared=True 的指标同时累加到Redis中，/metrics 输出所有进程（API和Celery worker）的合计；
+    其余指标只统计本进程
+    """
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), shared: bool = False):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.shared = shared
+        self._lock = threading.Lock()
+        self._series: Dict[Tuple[str, ...], Any] = {}
+        with _registry_lock:
+            _registry[name] = self
+
+    def _key(self, labels: Dict[str, Any]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def _push(self, fields: Dict[str, float]):
+        client = _get_redis()
+        if client is None:
+            return
+        try:
+            pipeline = client.pipeline(transaction=False)
+            for field, amount in fields.items():
+                pipeline.hincrbyfloat(_REDIS_KEY_PREFIX + self.name, field, amount)
+            pipeline.execute()
+        except redis.RedisError as e:
+            _redis_failed(e)
+
+    def _load_shared(self) -> Optional[Dict[Tuple[str, ...], Dict[str, float]]]:
+        """
+        读取Redis中所有进程的合计：标签值 -> {字段: 值}
+        """
+        client = _get_redis()
+        if client is None:
+            return None
+        try:
+            raw = client.hgetall(_REDIS_KEY_PREFIX + self.name)
+        except redis.RedisError as e:
+            _redis_failed(e)
+            return None
+
+        series: Dict[Tuple[str, ...], Dict[str, float]] = {}
+        for field, value in raw.items():
+            labels, _, name = field.decode().rpartition("|")
+            series.setdefault(tuple(json.loads(labels)), {})[name] = float(value)
+        return series
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._series[key] = self._series.get(key, 0.0) + amount
+        if self.shared:
+            self._push({f"{json.dumps(key)}|value": amount})
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        shared = self._load_shared() if self.shared else None
+        if shared is not None:
+            series = {key: fields.get("value", 0.0) for key, fields in shared.items()}
+        else:
+            with self._lock:
+                series = dict(self._series)
+        for key, value in sorted(series.items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+        shared: bool = False,
+    ):
+        super().__init__(name, documentation, labelnames, shared)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        # 只记录所在的桶，输出时再累加，观测一次只需一次二分查找
+        bucket = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total = self._series.get(key, ([0] * (len(self.buckets) + 1), 0.0))
+            counts[bucket] += 1
+            self._series[key] = (counts, total + value)
+        if self.shared:
+            prefix = json.dumps(key)
+            self._push({f"{prefix}|{bucket}": 1, f"{prefix}|sum": value})
+
+    @contextmanager
+    def time(self, **labels):
+        """
+        记录代码块的耗时（出错时也记录）
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        shared = self._load_shared() if self.shared else None
+        if shared is not None:
+            series = {
+                key: ([int(fields.get(str(i), 0)) for i in range(len(self.buckets) + 1)], fields.get("sum", 0.0))
+                for key, fields in shared.items()
+            }
+        else:
+            with self._lock:
+                series = {key: (list(counts), total) for key, (counts, total) in self._series.items()}
+
+        for key, (counts, total) in sorted(series.items()):
+            cumulative = 0
+            for bound, count in zip((*self.buckets, float("inf")), counts):
+                cumulative += count
+                labels = _format_labels(self.labelnames, key, ("le", _format_value(bound)))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class Gauge(_Metric):
+    """
+    瞬时值：可以直接设置，也可以在输出时调用函数读取（例如索引大小、内存占用）
+    """
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._function: Optional[Callable[[], Any]] = None
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._series[self._key(labels)] = value
+
+    def set_function(self, function: Callable[[], Any]):
+        """
+        输出时调用function取值；有标签时function返回 {标签值元组: 值}
+        """
+        self._function = function
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        if self._function is not None:
+            try:
+                value = self._function()
+            except Exception as e:
+                logger.warning(f"读取指标 {self.name} 失败: {e}")
+                return lines
+            series = value if isinstance(value, dict) else {(): value}
+        else:
+            with self._lock:
+                series = dict(self._series)
+        for key, value in sorted(series.items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+def timed(histogram: Histogram, **labels):
+    """
+    装饰器：记录函数的耗时
+    """
+    def decorator(function):
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            with histogram.time(**labels):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def _resident_memory_bytes() -> float:
+    """
+    本进程当前的常驻内存；无法读取 /proc 时返回历史峰值
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def render_metrics() -> str:
+    """
+    以Prometheus文本格式输出所有指标
+    """
+    with _registry_lock:
+        metrics = list(_registry.values())
+    lines = []
+    for metric in metrics:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# 搜索各阶段（本进程）：embed=查询向量化，ann=FAISS检索，hydrate=从列存储组装结果，
+# sql=旧向量回退到数据库查询，serialize=生成响应JSON
+SEARCH_STAGE_SECONDS = Histogram("search_stage_seconds", "搜索各阶段的耗时(秒)", ["stage"])
+SEARCH_REQUESTS = Counter("search_requests_total", "搜索请求数", ["mode"])
+SEARCH_CANDIDATES = Histogram(
+    "search_candidates", "每次搜索从索引中取回的候选数", buckets=(10, 50, 100, 500, 1000, 5000, 20000, 100000)
+)
+EMBEDDING_MODEL_LOAD_SECONDS = Histogram("embedding_model_load_seconds", "加载向量化模型的耗时(秒)", ["model"])
+
+# 视频处理（在Celery worker中执行，累加到Redis）：stage为处理阶段，step为阶段内的步骤
+INGEST_STAGE_SECONDS = Histogram("ingest_stage_seconds", "视频处理各阶段的耗时(秒)", ["stage"], shared=True)
+INGEST_STAGE_RESULTS = Counter("ingest_stage_total", "视频处理各阶段的执行次数", ["stage", "status"], shared=True)
+INGEST_STEP_SECONDS = Histogram("ingest_step_seconds", "视频处理各步骤的耗时(秒)", ["step"], shared=True)
+INGEST_AUDIO_SECONDS = Counter("ingest_audio_seconds_total", "处理完成的视频总时长(秒)", shared=True)
+
+# 本进程的向量索引和列存储
+VECTOR_INDEX_VECTORS = Gauge("vector_index_vectors", "本进程索引中的向量数")
+VECTOR_INDEX_VIDEOS = Gauge("vector_index_videos", "本进程索引中的视频数")
+VECTOR_INDEX_BYTES = Gauge("vector_index_bytes", "本进程索引中向量占用的内存(字节)")
+COLUMN_STORE_BYTES = Gauge("column_store_bytes", "本进程列存储占用的内存(字节)")
+
+PROCESS_RESIDENT_MEMORY = Gauge("process_resident_memory_bytes", "本进程的常驻内存(字节)")
+PROCESS_RESIDENT_MEMORY.set_function(_resident_memory_bytes)
@@ -0,0 +1,91 @@
+import sys
+import time
+import logging
+import threading
+from collections import Counter
+from contextvars import ContextVar
+from types import FrameType
+from typing import Dict, Optional
+
+# 配置日志
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# 当前请求的采样器（只在请求要求性能分析时设置，会随上下文传递到执行同步接口的线程中）
+active_sampler: ContextVar[Optional["StackSampler"]] = ContextVar("active_sampler", default=None)
+
+
+def _frame_label(frame: FrameType) -> str:
+    code = frame.f_code
+    module = frame.f_globals.get("__name__", "?")
+    return f"{module}:{getattr(code, 'co_qualname', code.co_name)}"
+
+
+class StackSampler:
+    """
+    采样式性能分析：后台线程定时读取已登记线程的调用栈，按调用栈计数
+
+    只采样登记的线程（执行被分析请求的线程），其余请求不受影响；
+    结果为折叠栈格式（每行 "栈帧;栈帧;... 次数"），可直接用 flamegraph.pl、speedscope 等工具生成火焰图
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.samples: Counter = Counter()
+        self.sample_count = 0
+        self.started_at = 0.0
+        self.duration = 0.0
+        self._threads: Dict[int, FrameType] = {}
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def add_thread(self, ident: int, root: FrameType):
+        """
+        登记需要采样的线程，root以下（调用方一侧）的栈帧不计入结果
+        """
+        with self._lock:
+            self._threads[ident] = root
+
+    def remove_thread(self, ident: int):
+        with self._lock:
+            self._threads.pop(ident, None)
+
+    def start(self):
+        self.started_at = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.duration = time.perf_counter() - self.started_at
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            with self._lock:
+                threads = dict(self._threads)
+            if not threads:
+                continue
+            frames = sys._current_frames()
+            for ident, root in threads.items():
+                frame = frames.get(ident)
+                if frame is not None:
+                    self._record(frame, root)
+
+    def _record(self, frame: FrameType, root: FrameType):
+        labels = []
+        while frame is not None:
+            labels.append(_frame_label(frame))
+            if frame is root:
+                break
+            frame = frame.f_back
+        self.samples[";".join(reversed(labels))] += 1
+        self.sample_count += 1
+
+    def folded(self) -> str:
+        """
+        以折叠栈格式输出采样结果
+        """
+        return "".join(f"{stack} {count}\n" for stack, count in self.samples.most_common())
@@ -21,6 +21,15 @@ def create_access_token(subject: Union[str, Any], expires_delta: timedelta = Non
     encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm="HS256")
     return encoded_jwt
 
+# 媒体令牌的scope，只能用于播放接口
+MEDIA_TOKEN_SCOPE = "media"
+
+# 创建媒体令牌：放在播放地址中（<video> 标签无法携带 Authorization 头），只能访问一个视频，有效期较短
+def create_media_token(subject: Union[str, Any], video_id: str) -> str:
+    expire = datetime.utcnow() + timedelta(minutes=settings.MEDIA_TOKEN_EXPIRE_MINUTES)
+    to_encode = {"exp": expire, "sub": str(subject), "scope": MEDIA_TOKEN_SCOPE, "video_id": video_id}
+    return jwt.encode(to_encode, settings.SECRET_KEY, algorithm="HS256")
+
 # 验证密码
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
@@ -0,0 +1,107 @@
+import io
+import logging
+from datetime import datetime
+from itertools import islice
+from typing import Any, Dict, Iterable, List
+
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+
+# 配置日志
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def _apply_defaults(table, row: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    补齐行中缺失的、带Python端默认值的列（例如created_at），COPY不会执行这些默认值
+    """
+    for column in table.columns:
+        if column.name in row or column.default is None:
+            continue
+        if column.default.is_callable:
+            row[column.name] = column.default.arg(None)
+        elif column.default.is_scalar:
+            row[column.name] = column.default.arg
+    return row
+
+
+def _copy_value(value: Any) -> str:
+    """
+    将值转换为COPY CSV格式的字段（未加引号的空字段表示NULL）
+    """
+    if value is None:
+        return ""
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, (int, float)):
+        return repr(value)
+    return '"' + str(value).replace('"', '""') + '"'
+
+
+def _copy_csv(dialect, table, columns: List[str], rows: List[Dict[str, Any]]) -> str:
+    """
+    生成COPY的CSV数据
+
+    值先经过列类型的绑定处理（JSON序列化、枚举转为数据库中的取值），与insert写入的结果一致
+    """
+    processors = [table.c[column].type.bind_processor(dialect) for column in columns]
+    buffer = io.StringIO()
+    for row in rows:
+        values = []
+        for column, processor in zip(columns, processors):
+            value = row.get(column)
+            values.append(_copy_value(processor(value) if processor else value))
+        buffer.write(",".join(values))
+        buffer.write("\n")
+    return buffer.getvalue()
+
+
+def _copy_rows(db: Session, table, columns: List[str], rows: List[Dict[str, Any]]):
+    """
+    使用PostgreSQL的COPY写入一批数据（与会话共用同一个事务）
+    """
+    buffer = io.StringIO(_copy_csv(db.get_bind().dialect, table, columns, rows))
+
+    cursor = db.connection().connection.cursor()
+    try:
+        cursor.copy_expert(
+            f"COPY {table.name} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)",
+            buffer
+        )
+    finally:
+        cursor.close()
+
+
+def bulk_insert(db: Session, model, rows: Iterable[Dict[str, Any]], batch_size: int = None) -> int:
+    """
+    分批批量写入数据，不经过ORM对象
+
+    PostgreSQL下使用COPY，其他数据库使用insert().values的executemany；
+    rows可以是生成器，每次只在内存中保留一批。写入在会话的当前事务中进行，由调用方提交
+
+    返回写入的行数
+    """
+    table = model.__table__
+    batch_size = batch_size or settings.DB_BULK_BATCH_SIZE
+    use_copy = settings.DB_BULK_USE_COPY and db.get_bind().dialect.name == "postgresql"
+
+    rows = iter(rows)
+    total = 0
+    while True:
+        batch = [_apply_defaults(table, dict(row)) for row in islice(rows, batch_size)]
+        if not batch:
+            break
+
+        if use_copy:
+            _copy_rows(db, table, list(batch[0].keys()), batch)
+        else:
+            db.execute(insert(table), batch)
+        total += len(batch)
+
+    logger.info(f"批量写入 {table.name}: {total} 行")
+    return total
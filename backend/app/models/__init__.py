@@ -1,3 +1,3 @@
 from app.models.user import User
-from app.models.video import Video, VideoSegment, ProcessingStatus
+from app.models.video import Video, VideoSegment, ProcessingStatus, ProcessingStage
 from app.models.search import Transcript
@@ -1,5 +1,5 @@
 from datetime import datetime
-from sqlalchemy import Column, String, Float, DateTime, ForeignKey, Text, Integer
+from sqlalchemy import Column, String, Float, DateTime, ForeignKey, Text, Integer, Index
 from sqlalchemy.orm import relationship
 
 from app.db.session import Base
@@ -24,5 +24,10 @@ class Transcript(Base):
     # 关系
     video = relationship("Video", back_populates="transcripts")
     
+    __table_args__ = (
+        # 按时间顺序分页列出视频的台词
+        Index("idx_transcripts_video_start", "video_id", "start_time", "id"),
+    )
+
     def __repr__(self):
         return f"<Transcript {self.id} ({self.start_time}-{self.end_time})>"
@@ -1,5 +1,5 @@
 from datetime import datetime
-from sqlalchemy import Column, String, Integer, Float, DateTime, ForeignKey, Enum, JSON, Text
+from sqlalchemy import Column, String, Integer, Float, DateTime, ForeignKey, Enum, JSON, Text, Index, text
 from sqlalchemy.orm import relationship
 import enum
 
@@ -13,6 +13,22 @@ class ProcessingStatus(enum.Enum):
     FAILED = "failed"
 
 
+class ProcessingStage(enum.Enum):
+    """
+    视频处理中已完成的阶段（按执行顺序），用于失败后从断点继续处理
+    """
+    PROBED = "probed"
+    AUDIO_EXTRACTED = "audio_extracted"
+    TRANSCRIBED = "transcribed"
+    EMBEDDED = "embedded"
+    INDEXED = "indexed"
+    CUT = "cut"
+
+
+# 处理阶段的执行顺序
+PROCESSING_STAGE_ORDER = list(ProcessingStage)
+
+
 class Video(Base):
     __tablename__ = "videos"
 
@@ -20,6 +36,7 @@ class Video(Base):
     title = Column(String, index=True, nullable=False)
     description = Column(Text, nullable=True)
     file_path = Column(String, nullable=False)
+    content_hash = Column(String, index=True, nullable=True)  # 文件内容的SHA-256，用于去重
     duration = Column(Float, nullable=True)  # 视频时长(秒)
     file_size = Column(Integer, nullable=True)  # 文件大小(字节)
     format = Column(String, nullable=True)  # 视频格式
@@ -28,13 +45,22 @@ class Video(Base):
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     owner_id = Column(String, ForeignKey("users.id"))
     processing_status = Column(Enum(ProcessingStatus), default=ProcessingStatus.PENDING)
+    processing_stage = Column(Enum(ProcessingStage), nullable=True)  # 最近完成的处理阶段
     video_metadata = Column(JSON, nullable=True)  # 其他元数据，改名避免与SQLAlchemy内部属性冲突
+    deleted_at = Column(DateTime, nullable=True)  # 删除时间，非空表示已删除、等待后台回收
     
     # 关系
     owner = relationship("User", back_populates="videos")
     segments = relationship("VideoSegment", back_populates="video", cascade="all, delete-orphan")
     transcripts = relationship("Transcript", back_populates="video", cascade="all, delete-orphan")
     
+    __table_args__ = (
+        # 按用户分页列出视频（游标分页的排序键）
+        Index("idx_videos_owner_created", "owner_id", "created_at", "id"),
+        # 回收任务查找已删除的视频
+        Index("idx_videos_deleted", "deleted_at", postgresql_where=text("deleted_at IS NOT NULL")),
+    )
+
     def __repr__(self):
         return f"<Video {self.title}>"
 
@@ -52,5 +78,10 @@ class VideoSegment(Base):
     # 关系
     video = relationship("Video", back_populates="segments")
     
+    __table_args__ = (
+        # 分页列出片段；包含end_time，统计片段时长时只需读索引
+        Index("idx_video_segments_video_start", "video_id", "start_time", "id", postgresql_include=["end_time"]),
+    )
+
     def __repr__(self):
         return f"<VideoSegment {self.id} ({self.start_time}-{self.end_time})>"
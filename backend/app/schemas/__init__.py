@@ -1,5 +1,8 @@
 from app.schemas.user import User, UserCreate, UserUpdate, UserInDB
-from app.schemas.video import Video, VideoCreate, VideoUpdate, VideoDetail
+from app.schemas.video import (
+    Video, VideoCreate, VideoUpdate, VideoDetail, VideoSegment, VideoSegmentSummary,
+    VideoUploadInit, VideoUploadInitResponse, VideoUploadComplete, VideoUploadPart, VideoUploadStatus
+)
 from app.schemas.search import SearchResults, SearchQuery, Transcript
-from app.schemas.token import Token, TokenPayload
+from app.schemas.token import Token, TokenPayload, MediaToken
 from app.models.video import ProcessingStatus as VideoStatus
@@ -28,7 +28,7 @@ class TranscriptInDBBase(TranscriptBase):
     created_at: datetime
 
     class Config:
-        orm_mode = True
+        from_attributes = True
 
 
 # 返回给前端的台词
@@ -41,6 +41,13 @@ class SearchQuery(BaseModel):
     query: str
     limit: Optional[int] = 10
     min_confidence: Optional[float] = 0.5
+    min_similarity: Optional[float] = None  # 设置后返回所有相似度不低于该值的台词（最多limit条）
+    # 搜索范围：只在指定的视频、上传时间范围内、视频中的时间段内搜索
+    video_ids: Optional[List[str]] = None
+    uploaded_after: Optional[datetime] = None
+    uploaded_before: Optional[datetime] = None
+    start_time: Optional[float] = None  # 视频内时间段(秒)，返回与该时间段有重叠的台词
+    end_time: Optional[float] = None
     include_video_details: Optional[bool] = False
 
 
@@ -53,6 +60,15 @@ class SearchResultVideo(BaseModel):
     thumbnail: Optional[str] = None
 
 
+# 台词片段在关键帧精灵图中的位置
+class SearchResultSprite(BaseModel):
+    url: str
+    x: int
+    y: int
+    width: int
+    height: int
+
+
 # 搜索结果中的台词命中
 class SearchResultTranscript(BaseModel):
     id: str
@@ -62,6 +78,8 @@ class SearchResultTranscript(BaseModel):
     confidence: Optional[float] = None
     similarity_score: float
     video: SearchResultVideo
+    sprite: Optional[SearchResultSprite] = None
+    media_url: Optional[str] = None  # 从台词开始位置播放原始视频的地址（已附带该视频的媒体令牌）
 
 
 # 搜索结果响应
@@ -15,4 +15,14 @@ class TokenPayload(BaseModel):
     令牌负载模型
     """
     sub: Optional[str] = None
-    exp: Optional[int] = None 
\ No newline at end of file
+    exp: Optional[int] = None
+    scope: Optional[str] = None  # 媒体令牌为 media，访问令牌没有scope
+    video_id: Optional[str] = None  # 媒体令牌可以访问的视频
+
+
+class MediaToken(BaseModel):
+    """
+    媒体令牌响应模型
+    """
+    token: str
+    expires_in: int  # 有效期(秒) 
\ No newline at end of file
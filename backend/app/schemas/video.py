@@ -2,7 +2,7 @@ from datetime import datetime
 from typing import Optional, List, Dict, Any
 from pydantic import BaseModel, Field
 
-from app.models.video import ProcessingStatus
+from app.models.video import ProcessingStatus, ProcessingStage
 
 
 # 视频片段基础模型
@@ -25,7 +25,7 @@ class VideoSegmentInDBBase(VideoSegmentBase):
     created_at: datetime
 
     class Config:
-        orm_mode = True
+        from_attributes = True
 
 
 # 返回给前端的视频片段
@@ -54,6 +54,7 @@ class VideoUpdate(VideoBase):
 class VideoInDBBase(VideoBase):
     id: str
     file_path: str
+    content_hash: Optional[str] = None
     duration: Optional[float] = None
     file_size: Optional[int] = None
     format: Optional[str] = None
@@ -62,10 +63,12 @@ class VideoInDBBase(VideoBase):
     updated_at: datetime
     owner_id: str
     processing_status: ProcessingStatus
-    metadata: Optional[Dict[str, Any]] = None
+    processing_stage: Optional[ProcessingStage] = None
+    # 模型中的列名为video_metadata（Base.metadata 是SQLAlchemy的表结构对象）
+    metadata: Optional[Dict[str, Any]] = Field(None, validation_alias="video_metadata")
 
     class Config:
-        orm_mode = True
+        from_attributes = True
 
 
 # 返回给前端的视频信息（不包含片段）
@@ -73,9 +76,15 @@ class Video(VideoInDBBase):
     pass
 
 
-# 返回给前端的详细视频信息（包含片段）
+# 视频片段的汇总信息（在数据库中统计，不加载片段）
+class VideoSegmentSummary(BaseModel):
+    count: int = 0
+    total_duration: float = 0.0
+
+
+# 返回给前端的详细视频信息（片段只返回汇总，片段列表通过分页接口获取）
 class VideoDetail(Video):
-    segments: List[VideoSegment] = []
+    segment_summary: VideoSegmentSummary = VideoSegmentSummary()
 
 
 # 上传视频初始化请求
@@ -84,6 +93,7 @@ class VideoUploadInit(BaseModel):
     description: Optional[str] = None
     file_size: int
     file_type: str
+    force_asr: Optional[bool] = False  # 忽略视频中的字幕，始终进行语音识别
 
 
 # 上传视频初始化响应
@@ -98,3 +108,18 @@ class VideoUploadComplete(BaseModel):
     upload_id: str
     video_id: str
     parts: List[Dict[str, Any]]
+
+
+# 已上传的分块
+class VideoUploadPart(BaseModel):
+    part_number: int
+    size: int
+    sha256: str
+
+
+# 上传会话状态（用于断点续传）
+class VideoUploadStatus(BaseModel):
+    upload_id: str
+    video_id: str
+    parts: List[Dict[str, Any]]
+    uploaded_parts: List[VideoUploadPart]
@@ -0,0 +1,320 @@
+import os
+import time
+import shutil
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+import redis
+from sqlalchemy import or_
+from sqlalchemy.orm import Session
+
+from app.db.session import SessionLocal
+from app.models.video import Video, VideoSegment, ProcessingStatus
+from app.models.search import Transcript
+from app.core.config import settings
+from app.core.celery_app import celery_app
+from app.core.metrics import Gauge
+from app.services.storage import get_tmp_dir
+from app.services.thumbnails import preview_files
+from app.services.uploads import get_uploads_dir
+from app.services.vector_search import get_video_store_files, republish_video_removal
+
+# 配置日志
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# 累计回收量保存在Redis中，各worker共享
+_STATS_KEY = "cleanup:stats"
+
+# IN查询每次携带的参数个数
+_QUERY_CHUNK_SIZE = 1000
+
+_redis_client = None
+
+CLEANUP_RECLAIMED = Gauge("cleanup_reclaimed", "回收任务累计回收的视频数、文件数和字节数", ["kind"])
+
+
+def _get_redis() -> redis.Redis:
+    global _redis_client
+    if _redis_client is None:
+        _redis_client = redis.Redis(
+            host=settings.REDIS_HOST,
+            port=settings.REDIS_PORT,
+            db=settings.REDIS_DB,
+            socket_timeout=0.5,
+            socket_connect_timeout=0.5,
+        )
+    return _redis_client
+
+
+def _chunks(items: List[str]) -> Iterator[List[str]]:
+    for i in range(0, len(items), _QUERY_CHUNK_SIZE):
+        yield items[i:i + _QUERY_CHUNK_SIZE]
+
+
+def _remove_file(path: str) -> Optional[int]:
+    """
+    删除文件，返回释放的字节数；文件不存在或删除失败时返回None
+    """
+    try:
+        size = os.path.getsize(path)
+        os.remove(path)
+        return size
+    except FileNotFoundError:
+        return None
+    except OSError as e:
+        logger.error(f"删除文件失败 {path}: {e}")
+        return None
+
+
+def _remove_tree(path: str) -> Tuple[int, int]:
+    """
+    删除目录，返回 (文件数, 释放的字节数)
+    """
+    files = size = 0
+    for root, _, names in os.walk(path):
+        for name in names:
+            try:
+                size += os.path.getsize(os.path.join(root, name))
+                files += 1
+            except OSError:
+                continue
+    shutil.rmtree(path, ignore_errors=True)
+    return files, size
+
+
+def _metadata_artifacts(metadata: Optional[Dict[str, Any]]) -> Set[str]:
+    """
+    视频元数据中记录的附属文件（缩略图、精灵图、外挂字幕）
+
+    内容相同的视频复用处理结果时会复制元数据，这些文件因此可能被多个视频引用。
+    语音识别缓存按视频内容共享，不随视频删除，由缓存的容量上限淘汰
+    """
+    metadata = metadata or {}
+    files = set(preview_files(metadata.get("preview")))
+    if metadata.get("sidecar_subtitle"):
+        files.add(metadata["sidecar_subtitle"])
+    return files
+
+
+def _referenced(db: Session, column, values: Set[str]) -> Set[str]:
+    """
+    返回仍被数据库中的记录引用的值
+    """
+    referenced = set()
+    for chunk in _chunks(list(values)):
+        referenced.update(value for (value,) in db.query(column).filter(column.in_(chunk)).distinct())
+    return referenced
+
+
+def _collect_batch(db: Session, batch_size: int) -> Optional[Dict[str, int]]:
+    """
+    回收一批已删除的视频：删除数据库记录，再删除不再被任何视频引用的文件
+
+    返回本批的回收量，没有待回收的视频时返回None
+    """
+    deadline = datetime.utcnow() - timedelta(minutes=settings.PROCESSING_STUCK_TIMEOUT_MINUTES)
+    videos = (
+        db.query(Video)
+        .filter(
+            Video.deleted_at.isnot(None),
+            # 正在处理的视频等当前阶段结束（或超时）后再回收，避免与处理任务同时写文件
+            or_(Video.processing_status != ProcessingStatus.PROCESSING, Video.updated_at < deadline)
+        )
+        .order_by(Video.deleted_at)
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)  # 多个worker同时回收时各取不同的视频
+        .all()
+    )
+    if not videos:
+        return None
+
+    video_ids = [video.id for video in videos]
+    content_hashes = {video.content_hash for video in videos if video.content_hash}
+    video_files = {video.file_path for video in videos}
+    segment_files: Set[str] = set()
+    for chunk in _chunks(video_ids):
+        segment_files.update(
+            path for (path,) in db.query(VideoSegment.segment_path)
+            .filter(VideoSegment.video_id.in_(chunk), VideoSegment.segment_path.isnot(None))
+        )
+    artifact_files: Set[str] = set()
+    for video in videos:
+        artifact_files |= _metadata_artifacts(video.video_metadata)
+
+    # 先删除数据库记录，再按剩余的引用判断哪些文件可以删除
+    for chunk in _chunks(video_ids):
+        db.query(Transcript).filter(Transcript.video_id.in_(chunk)).delete(synchronize_session=False)
+        db.query(VideoSegment).filter(VideoSegment.video_id.in_(chunk)).delete(synchronize_session=False)
+        db.query(Video).filter(Video.id.in_(chunk)).delete(synchronize_session=False)
+    db.commit()
+
+    # 内容相同的视频共用视频文件和片段文件，并通过复制的元数据共用预览图和字幕
+    video_files -= _referenced(db, Video.file_path, video_files)
+    segment_files -= _referenced(db, VideoSegment.segment_path, segment_files)
+    for chunk in _chunks(list(content_hashes)):
+        for (metadata,) in db.query(Video.video_metadata).filter(Video.content_hash.in_(chunk)):
+            artifact_files -= _metadata_artifacts(metadata)
+    db.commit()
+
+    stats = {"videos": len(video_ids), "files": 0, "bytes": 0}
+
+    def reclaimed(size: Optional[int]):
+        if size is not None:
+            stats["files"] += 1
+            stats["bytes"] += size
+
+    for path in video_files | segment_files | artifact_files:
+        reclaimed(_remove_file(path))
+
+    for video_id in video_ids:
+        # 先在各代的向量日志中再记录一次删除（覆盖删除后仍在处理的任务写入的记录），分片删除后重新加载时不再载入
+        republish_video_removal(video_id)
+        for path in get_video_store_files(video_id):
+            reclaimed(_remove_file(path))
+        files, size = _remove_tree(os.path.join(settings.VIDEOS_STORAGE_PATH, "work", video_id))
+        stats["files"] += files
+        stats["bytes"] += size
+
+    return stats
+
+
+def _record_stats(stats: Dict[str, int]):
+    try:
+        pipeline = _get_redis().pipeline()
+        for name, value in stats.items():
+            pipeline.hincrby(_STATS_KEY, name, value)
+        pipeline.hset(_STATS_KEY, "last_run_at", datetime.utcnow().isoformat())
+        pipeline.execute()
+    except redis.RedisError as e:
+        logger.warning(f"记录回收统计失败: {e}")
+
+
+def get_cleanup_stats() -> Dict[str, Any]:
+    """
+    读取累计回收的视频数、文件数和字节数
+    """
+    try:
+        raw = _get_redis().hgetall(_STATS_KEY)
+    except redis.RedisError as e:
+        logger.warning(f"读取回收统计失败: {e}")
+        return {}
+
+    stats: Dict[str, Any] = {}
+    for name, value in raw.items():
+        name, value = name.decode(), value.decode()
+        stats[name] = value if name == "last_run_at" else int(value)
+    return stats
+
+
+CLEANUP_RECLAIMED.set_function(lambda: {
+    (name,): value for name, value in get_cleanup_stats().items() if name != "last_run_at"
+})
+
+
+def collect_deleted_videos(batch_size: Optional[int] = None) -> Dict[str, int]:
+    """
+    分批回收所有已删除的视频，返回本次的回收量
+    """
+    batch_size = batch_size or settings.CLEANUP_BATCH_SIZE
+    total = {"videos": 0, "files": 0, "bytes": 0}
+
+    db = SessionLocal()
+    try:
+        while True:
+            stats = _collect_batch(db, batch_size)
+            if stats is None:
+                break
+            _record_stats(stats)
+            for name, value in stats.items():
+                total[name] += value
+            logger.info(
+                f"回收已删除视频: {stats['videos']} 个，{stats['files']} 个文件，{stats['bytes'] / 1024 / 1024:.1f} MB"
+            )
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+    return total
+
+
+def _last_modified(path: str) -> float:
+    """
+    目录中最近一次写入的时间（目录本身和其中所有文件的最大修改时间）
+    """
+    latest = os.path.getmtime(path)
+    for root, _, names in os.walk(path):
+        for name in names:
+            try:
+                latest = max(latest, os.path.getmtime(os.path.join(root, name)))
+            except OSError:
+                continue
+    return latest
+
+
+def sweep_abandoned_uploads() -> Dict[str, int]:
+    """
+    删除超过 UPLOAD_SESSION_TTL_HOURS 没有写入的分块上传会话，以及上传临时目录中遗留的临时文件
+
+    按最近一次写入时间而不是创建时间判断，仍在续传的会话不会被删除
+    """
+    deadline = time.time() - settings.UPLOAD_SESSION_TTL_HOURS * 3600
+    stats = {"uploads": 0, "files": 0, "bytes": 0}
+
+    uploads_dir = get_uploads_dir()
+    for name in os.listdir(uploads_dir) if os.path.isdir(uploads_dir) else []:
+        path = os.path.join(uploads_dir, name)
+        try:
+            if _last_modified(path) >= deadline:
+                continue
+        except FileNotFoundError:
+            continue
+        files, size = _remove_tree(path)
+        stats["uploads"] += 1
+        stats["files"] += files
+        stats["bytes"] += size
+
+    tmp_dir = get_tmp_dir()
+    for name in os.listdir(tmp_dir):
+        path = os.path.join(tmp_dir, name)
+        try:
+            if os.path.getmtime(path) >= deadline:
+                continue
+        except FileNotFoundError:
+            continue
+        size = _remove_file(path)
+        if size is not None:
+            stats["files"] += 1
+            stats["bytes"] += size
+
+    if stats["uploads"] or stats["files"]:
+        logger.info(
+            f"回收已放弃的上传: {stats['uploads']} 个会话，{stats['files']} 个文件，{stats['bytes'] / 1024 / 1024:.1f} MB"
+        )
+    return stats
+
+
+def schedule_cleanup():
+    """
+    分发回收任务；分发失败时由定时任务稍后回收
+    """
+    try:
+        collect_deleted_videos_task.delay()
+    except Exception as e:
+        logger.warning(f"分发回收任务失败，等待定时回收: {e}")
+
+
+@celery_app.task
+def collect_deleted_videos_task():
+    """
+    Celery任务：回收已删除视频的文件、片段和向量分片，以及已放弃的分块上传
+    """
+    stats = collect_deleted_videos()
+    upload_stats = sweep_abandoned_uploads()
+    _record_stats(upload_stats)
+    for name, value in upload_stats.items():
+        stats[name] = stats.get(name, 0) + value
+    return stats
@@ -0,0 +1,363 @@
+import os
+import json
+import time
+import logging
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import numpy as np
+from sqlalchemy import and_, or_, tuple_
+from sqlalchemy.orm import Session
+
+from app.db.session import SessionLocal
+from app.models.video import Video, ProcessingStage
+from app.models.search import Transcript
+from app.core.config import settings
+from app.core.celery_app import celery_app
+from app.services.vector_search import (
+    activate_generation, copy_video_vectors, create_generation, encode_texts, get_active_generation,
+    get_embedding_model, get_generation_dir, get_generation_meta, list_generation_videos, load_video_vectors,
+    publish_video_removal, publish_video_vectors, save_video_columns, save_video_vectors, vector_store_lock
+)
+
+# 配置日志
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# 已向量化的视频所处的阶段
+VECTOR_STAGES = [ProcessingStage.EMBEDDED, ProcessingStage.INDEXED, ProcessingStage.CUT]
+
+
+def _progress_path(generation: str) -> str:
+    return os.path.join(get_generation_dir(generation), "progress.json")
+
+
+def _save_progress(generation: str, progress: Dict[str, Any]):
+    progress["updated_at"] = datetime.utcnow().isoformat()
+    path = _progress_path(generation)
+    with open(f"{path}.tmp", "w") as f:
+        json.dump(progress, f)
+    os.replace(f"{path}.tmp", path)
+
+
+def get_reindex_progress(generation: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """
+    读取重建任务的进度，未指定时返回最近一次重建的进度
+    """
+    if generation is None:
+        generations_dir = os.path.join(settings.VECTOR_STORE_PATH, "generations")
+        if not os.path.isdir(generations_dir):
+            return None
+        candidates = sorted(
+            name for name in os.listdir(generations_dir)
+            if os.path.exists(_progress_path(name))
+        )
+        if not candidates:
+            return None
+        # 代的名称以创建时间开头，按名称排序即按时间排序
+        generation = candidates[-1]
+
+    path = _progress_path(generation)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return {"generation": generation, **json.load(f)}
+
+
+def _find_resumable_generation(model_name: str) -> Optional[str]:
+    """
+    查找同一模型下尚未完成的重建任务
+    """
+    progress = get_reindex_progress()
+    if progress and progress["status"] == "building" and progress["model"] == model_name:
+        return progress["generation"]
+    return None
+
+
+def _find_clone_source(db: Session, video_id: str, created_at: datetime, first_vector_id: str) -> Optional[str]:
+    """
+    查找与视频共用同一组vector_id的最早的视频（内容相同的视频复用了它的向量），没有时返回None
+    """
+    source = db.query(Transcript.video_id).join(Video, Transcript.video_id == Video.id).filter(
+        Transcript.vector_id == first_vector_id,
+        Transcript.video_id != video_id,
+        Video.deleted_at.is_(None),
+        or_(
+            Video.created_at < created_at,
+            and_(Video.created_at == created_at, Video.id < video_id)
+        )
+    ).order_by(Video.created_at, Video.id).first()
+    return source[0] if source else None
+
+
+def _write_video(db: Session, generation: str, video_id: str, vector_ids: List[str], vectors: np.ndarray):
+    if not save_video_vectors(video_id, vector_ids, vectors, generation) or \
+            not save_video_columns(db, video_id, generation) or \
+            not publish_video_vectors(video_id, generation):
+        raise RuntimeError(f"写入向量存储失败: {video_id}")
+
+
+def _encode_videos(
+    db: Session,
+    generation: str,
+    model_name: str,
+    videos: List[Tuple[str, datetime, List[str], List[str]]],
+    sources: Optional[Dict[str, Optional[str]]] = None,
+) -> int:
+    """
+    将一批视频的台词合并向量化，按视频写入新一代的向量分片和列数据，并记录到向量日志
+
+    内容相同的视频共用同一组向量，只向量化最早的那个视频，其余的直接复制；
+    sources中已给出复用来源的视频不再查询。返回写入的向量数
+    """
+    batch_ids = {video[0] for video in videos}
+    known = sources or {}
+    sources = {
+        video[0]: known[video[0]] if video[0] in known else _find_clone_source(db, video[0], video[1], video[2][0])
+        for video in videos
+    }
+
+    def needs_encoding(video_id: str) -> bool:
+        source = sources[video_id]
+        return source is None or (source not in batch_ids and load_video_vectors(source, generation) is None)
+
+    to_encode = [video for video in videos if needs_encoding(video[0])]
+    clones = [video for video in videos if not needs_encoding(video[0])]
+
+    texts = [text for _, _, _, video_texts in to_encode for text in video_texts]
+    if texts:
+        vectors = encode_texts(texts, model_name)
+        if vectors is None:
+            raise RuntimeError("向量化台词失败")
+        vectors = np.asarray(vectors)
+
+        offset = 0
+        for video_id, _, vector_ids, _ in to_encode:
+            # 沿用原有的vector_id，数据库中的台词记录无需修改
+            _write_video(db, generation, video_id, vector_ids, vectors[offset:offset + len(vector_ids)])
+            offset += len(vector_ids)
+
+    written = len(texts)
+    for video_id, _, _, _ in clones:
+        vector_ids, vectors = load_video_vectors(sources[video_id], generation)
+        _write_video(db, generation, video_id, vector_ids, vectors)
+        written += len(vector_ids)
+
+    return written
+
+
+def _stream_transcripts(db: Session, generation: str, model_name: str, progress: Dict[str, Any], batch_size: int):
+    """
+    用服务端游标按视频顺序分批读取全部台词并重新向量化
+
+    每批处理完成后记录最后一个视频的位置，中断后从该位置继续
+    """
+    query = (
+        db.query(Transcript.video_id, Video.created_at, Transcript.vector_id, Transcript.text)
+        .join(Video, Transcript.video_id == Video.id)
+        .filter(
+            Video.processing_stage.in_(VECTOR_STAGES),
+            Video.deleted_at.is_(None),
+            Transcript.vector_id.isnot(None)
+        )
+    )
+    if progress.get("last_video_id"):
+        query = query.filter(
+            tuple_(Video.created_at, Video.id) >
+            tuple_(datetime.fromisoformat(progress["last_created_at"]), progress["last_video_id"])
+        )
+    query = query.order_by(Video.created_at, Video.id, Transcript.segment_index).yield_per(batch_size)
+
+    start_time = time.time()
+    pending: List[Tuple[str, datetime, List[str], List[str]]] = []
+    pending_count = 0
+
+    def flush():
+        progress["transcripts"] += _encode_videos(db, generation, model_name, pending)
+        progress["videos"] += len(pending)
+        progress["last_video_id"] = pending[-1][0]
+        progress["last_created_at"] = pending[-1][1].isoformat()
+        _save_progress(generation, progress)
+
+        elapsed = time.time() - start_time
+        logger.info(
+            f"重建向量进度: {progress['videos']}/{progress['total_videos']} 个视频，"
+            f"{progress['transcripts']} 条台词，{progress['transcripts'] / max(elapsed, 1e-6):.0f} 条/秒"
+        )
+
+    for video_id, created_at, vector_id, text in query:
+        if not pending or pending[-1][0] != video_id:
+            # 只在视频边界处分批，保证每个视频的向量写在同一个分片中
+            if pending_count >= batch_size:
+                flush()
+                pending = []
+                pending_count = 0
+            pending.append((video_id, created_at, [], []))
+        pending[-1][2].append(vector_id)
+        pending[-1][3].append(text)
+        pending_count += 1
+
+    if pending:
+        flush()
+
+
+def _live_videos(db: Session, generation: str) -> Tuple[Dict[str, datetime], Set[str]]:
+    """
+    返回 (所有已向量化且未删除的视频及其上传时间, 已写入新一代的视频)
+    """
+    done = set(list_generation_videos(generation))
+    live = {
+        video_id: created_at
+        for video_id, created_at in db.query(Video.id, Video.created_at)
+        .filter(Video.processing_stage.in_(VECTOR_STAGES), Video.deleted_at.is_(None))
+    }
+    return live, done
+
+
+def _plan_videos(db: Session, videos: Dict[str, datetime]) -> Dict[str, Optional[Tuple[str, datetime, List[str], List[str], Optional[str]]]]:
+    """
+    查询视频的台词和复用来源，返回 视频ID -> (视频ID, 上传时间, vector_id列表, 台词列表, 复用来源)，没有台词的视频为None
+    """
+    plan = {}
+    for video_id, created_at in videos.items():
+        rows = (
+            db.query(Transcript.vector_id, Transcript.text)
+            .filter(Transcript.video_id == video_id, Transcript.vector_id.isnot(None))
+            .order_by(Transcript.segment_index)
+            .all()
+        )
+        if not rows:
+            plan[video_id] = None
+            continue
+        vector_ids = [vector_id for vector_id, _ in rows]
+        plan[video_id] = (
+            video_id, created_at, vector_ids, [text for _, text in rows],
+            _find_clone_source(db, video_id, created_at, vector_ids[0]),
+        )
+    return plan
+
+
+def _catch_up(
+    db: Session,
+    generation: str,
+    model_name: str,
+    planned: Optional[Dict[str, Optional[Tuple[str, datetime, List[str], List[str], Optional[str]]]]] = None,
+) -> int:
+    """
+    补上重建期间新处理完成、尚未写入新一代的视频，并移除期间被删除的视频，返回补充的视频数
+
+    planned为事先查询好的台词和复用来源（见_plan_videos），其中没有的视频才查询数据库
+    """
+    live, done = _live_videos(db, generation)
+    
+    # 删除视频时只记录到当时生效的一代
+    for video_id in done - set(live):
+        publish_video_removal(video_id, generation)
+
+    planned = planned or {}
+    missing = {video_id: created_at for video_id, created_at in live.items() if video_id not in done}
+    plan = _plan_videos(db, {video_id: created_at for video_id, created_at in missing.items() if video_id not in planned})
+    for video_id in missing:
+        entry = plan[video_id] if video_id in plan else planned[video_id]
+        if entry:
+            _encode_videos(db, generation, model_name, [entry[:4]], {video_id: entry[4]})
+
+    return len(missing)
+
+
+def reindex_vectors(model_name: Optional[str] = None, generation: Optional[str] = None, batch_size: Optional[int] = None) -> str:
+    """
+    用指定模型重新向量化全部台词，在新一代向量存储中构建索引，完成后原子切换
+
+    重建期间搜索和视频处理继续使用当前生效的那一代；同一模型下未完成的重建会从中断处继续。
+    返回新一代的名称
+    """
+    model_name = model_name or settings.EMBEDDING_MODEL
+    batch_size = batch_size or settings.REINDEX_BATCH_SIZE
+    generation = generation or _find_resumable_generation(model_name)
+
+    if generation:
+        progress = get_reindex_progress(generation)
+        progress.pop("generation", None)
+        logger.info(f"继续重建向量: {generation}, 已完成 {progress['videos']} 个视频")
+    else:
+        dimension = get_embedding_model(model_name).get_sentence_embedding_dimension()
+        generation = create_generation(model_name, dimension)
+        progress = {
+            "model": model_name,
+            "dimension": dimension,
+            "status": "building",
+            "videos": 0,
+            "transcripts": 0,
+            "started_at": datetime.utcnow().isoformat(),
+        }
+        logger.info(f"开始重建向量: {generation}, 模型: {model_name}, 维度: {dimension}")
+
+    db = SessionLocal()
+    try:
+        progress["total_videos"] = db.query(Video.id).filter(
+            Video.processing_stage.in_(VECTOR_STAGES),
+            Video.deleted_at.is_(None)
+        ).count()
+        _save_progress(generation, progress)
+
+        _stream_transcripts(db, generation, model_name, progress, batch_size)
+        db.rollback()  # 结束服务端游标所在的事务
+
+        # 先在不加锁的情况下补上大部分新视频，再在排他锁内补上最后一批并切换，缩短阻塞写入的时间；
+        # 最后一批的台词和复用来源也在加锁前查好，锁内只为此后才处理完成的视频查询数据库
+        _catch_up(db, generation, model_name)
+        live, done = _live_videos(db, generation)
+        planned = _plan_videos(db, {video_id: created_at for video_id, created_at in live.items() if video_id not in done})
+        with vector_store_lock(exclusive=True):
+            _catch_up(db, generation, model_name, planned)
+            activate_generation(generation)
+
+        progress["status"] = "active"
+        _save_progress(generation, progress)
+        logger.info(f"重建向量完成: {generation}, 共 {progress['transcripts']} 条台词")
+
+    finally:
+        db.close()
+
+    return generation
+
+
+def rebuild_from_store() -> str:
+    """
+    用已持久化的向量分片重建一代新的向量存储并切换，不运行向量化模型
+
+    用于整理向量日志、把旧版本的float32分片转换为当前的存储精度，或在更换索引类型后重新加载。
+    返回新一代的名称
+    """
+    source = get_active_generation()
+    meta = get_generation_meta(source)
+    generation = create_generation(meta["model"], meta["dimension"])
+    logger.info(f"开始从向量存储重建: {source or '(根目录)'} -> {generation}")
+
+    def copy_missing() -> int:
+        done = set(list_generation_videos(generation))
+        copied = 0
+        for video_id in list_generation_videos(source):
+            if video_id in done:
+                continue
+            if copy_video_vectors(video_id, source, generation) and publish_video_vectors(video_id, generation):
+                copied += 1
+        return copied
+
+    copied = copy_missing()
+    with vector_store_lock(exclusive=True):
+        # 补上复制期间新写入的视频后切换
+        copied += copy_missing()
+        activate_generation(generation)
+
+    logger.info(f"从向量存储重建完成: {generation}, 共 {copied} 个视频")
+    return generation
+
+
+@celery_app.task
+def reindex_vectors_task(model_name: Optional[str] = None):
+    """
+    Celery任务：在后台重建全部向量并切换索引
+    """
+    return reindex_vectors(model_name)
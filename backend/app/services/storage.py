@@ -0,0 +1,202 @@
+import os
+import uuid
+import shutil
+import hashlib
+import logging
+from typing import BinaryIO, Optional, Tuple
+from urllib.parse import urlencode
+
+from sqlalchemy.orm import Session
+
+from app.models.video import Video, VideoSegment, ProcessingStatus, ProcessingStage
+from app.models.search import Transcript
+from app.core.config import settings
+from app.db.bulk import bulk_insert
+from app.services.thumbnails import copy_previews
+
+# 配置日志
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# 流式写入时每次读取的块大小
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+
+def get_tmp_dir() -> str:
+    """
+    获取上传临时目录（与视频存储在同一文件系统，保证可以原子移动）
+    """
+    tmp_dir = os.path.join(settings.VIDEOS_STORAGE_PATH, "tmp")
+    os.makedirs(tmp_dir, exist_ok=True)
+    return tmp_dir
+
+
+def get_object_path(content_hash: str, file_ext: str) -> str:
+    """
+    按内容哈希计算视频文件的存储路径
+    """
+    return os.path.join(settings.VIDEOS_STORAGE_PATH, "objects", content_hash[:2], f"{content_hash}{file_ext}")
+
+
+def save_upload(source: BinaryIO) -> Tuple[str, str, int]:
+    """
+    将上传的文件分块写入临时文件，同时计算SHA-256
+
+    返回 (临时文件路径, 内容哈希, 文件大小)
+    """
+    tmp_path = os.path.join(get_tmp_dir(), f"{uuid.uuid4()}.part")
+    sha256 = hashlib.sha256()
+    size = 0
+
+    try:
+        with open(tmp_path, "wb") as file_object:
+            while True:
+                chunk = source.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                sha256.update(chunk)
+                file_object.write(chunk)
+                size += len(chunk)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    return tmp_path, sha256.hexdigest(), size
+
+
+def save_subtitle(source: BinaryIO, video_id: str, file_ext: str) -> str:
+    """
+    保存用户上传的外挂字幕文件，返回文件路径
+    """
+    subtitles_dir = os.path.join(settings.VIDEOS_STORAGE_PATH, "subtitles")
+    os.makedirs(subtitles_dir, exist_ok=True)
+
+    file_path = os.path.join(subtitles_dir, f"{video_id}{file_ext}")
+    with open(file_path, "wb") as file_object:
+        shutil.copyfileobj(source, file_object, UPLOAD_CHUNK_SIZE)
+    return file_path
+
+
+def store_file(db: Session, tmp_path: str, content_hash: str, file_ext: str) -> str:
+    """
+    将临时文件放入按内容寻址的存储中，相同内容的文件只保留一份
+
+    返回最终的文件路径
+    """
+    # 已有相同内容的视频时直接复用它的文件。只复用未删除的视频，并锁住这些行直到调用方提交：
+    # 回收任务以 SKIP LOCKED 选取视频，在新视频入库前不会回收它们，入库后回收时能看到新视频的引用
+    # （同一事务中 find_completed_duplicate 找到的来源视频也在其中，它的片段文件同样受到保护）
+    existing = (
+        db.query(Video.file_path)
+        .filter(Video.content_hash == content_hash, Video.deleted_at.is_(None))
+        .with_for_update()
+        .all()
+    )
+    for (file_path,) in existing:
+        if os.path.exists(file_path):
+            os.remove(tmp_path)
+            logger.info(f"复用已存储的相同文件: {file_path}")
+            return file_path
+
+    file_path = get_object_path(content_hash, file_ext)
+    if os.path.exists(file_path):
+        # 文件属于已删除、等待回收的视频，回收时会删除它：另存一份，不与其共用
+        root, ext = os.path.splitext(file_path)
+        file_path = f"{root}-{uuid.uuid4().hex[:8]}{ext}"
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    os.replace(tmp_path, file_path)
+    return file_path
+
+
+def find_completed_duplicate(db: Session, content_hash: str) -> Optional[Video]:
+    """
+    查找内容相同且已处理完成的视频
+    """
+    return (
+        db.query(Video)
+        .filter(
+            Video.content_hash == content_hash,
+            Video.processing_status == ProcessingStatus.COMPLETED,
+            Video.deleted_at.is_(None)  # 已删除的视频即将被回收，不再作为复用的来源
+        )
+        .order_by(Video.created_at)
+        .first()
+    )
+
+
+def clone_processed_video(db: Session, source: Video, target: Video) -> None:
+    """
+    复用已处理视频的结果：台词沿用原有的vector_id（引用同一组向量），
+    片段沿用原有的片段文件，只复制数据库行，不重新处理
+    """
+    for key in ("duration", "file_size", "format", "resolution"):
+        setattr(target, key, getattr(source, key))
+
+    # 预览图复制为目标视频自己的文件，不与来源共用
+    metadata = dict(source.video_metadata or {})
+    preview = copy_previews(metadata.pop("preview", None), target.id)
+    if preview:
+        metadata["preview"] = preview
+    target.video_metadata = metadata or None
+
+    # 先写入目标视频行，满足台词和片段的外键约束
+    db.flush()
+
+    transcript_rows = [
+        {
+            "id": str(uuid.uuid4()),
+            "video_id": target.id,
+            "start_time": start_time,
+            "end_time": end_time,
+            "text": text,
+            "vector_id": vector_id,
+            "confidence": confidence,
+            "segment_index": segment_index,
+        }
+        for start_time, end_time, text, vector_id, confidence, segment_index in db.query(
+            Transcript.start_time, Transcript.end_time, Transcript.text,
+            Transcript.vector_id, Transcript.confidence, Transcript.segment_index
+        ).filter(Transcript.video_id == source.id)
+    ]
+
+    segment_rows = [
+        {
+            "id": str(uuid.uuid4()),
+            "video_id": target.id,
+            "start_time": start_time,
+            "end_time": end_time,
+            "segment_path": segment_path,
+        }
+        for start_time, end_time, segment_path in db.query(
+            VideoSegment.start_time, VideoSegment.end_time, VideoSegment.segment_path
+        ).filter(VideoSegment.video_id == source.id)
+    ]
+
+    bulk_insert(db, Transcript, transcript_rows)
+    bulk_insert(db, VideoSegment, segment_rows)
+
+    target.processing_status = ProcessingStatus.COMPLETED
+    target.processing_stage = ProcessingStage.CUT
+    logger.info(
+        f"视频 {target.id} 与 {source.id} 内容相同，复用 {len(transcript_rows)} 条台词和 {len(segment_rows)} 个片段"
+    )
+
+
+def get_media_url(
+    video_id: str,
+    start_time: Optional[float] = None,
+    end_time: Optional[float] = None,
+    token: Optional[str] = None,
+) -> str:
+    """
+    原始视频的播放地址，指定开始时间时附带媒体片段（#t=开始,结束），指定媒体令牌时附带 token 参数
+    """
+    url = f"{settings.API_V1_STR}/media/videos/{video_id}"
+    if token:
+        url = f"{url}?{urlencode({'token': token})}"
+    if start_time is None:
+        return url
+    if end_time is None:
+        return f"{url}#t={start_time:.3f}"
+    return f"{url}#t={start_time:.3f},{end_time:.3f}"
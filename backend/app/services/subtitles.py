@@ -0,0 +1,121 @@
+import re
+import logging
+from typing import Any, Dict, List, Optional
+
+import ffmpeg
+
+# 配置日志
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# 可以直接转换为文本的字幕编码（图形字幕如PGS、DVD字幕需要OCR，不在此列）
+TEXT_SUBTITLE_CODECS = {"subrip", "srt", "ass", "ssa", "mov_text", "webvtt", "text"}
+
+# 支持的外挂字幕格式
+SUPPORTED_SUBTITLE_EXTENSIONS = [".srt", ".vtt", ".ass", ".ssa"]
+
+# 字幕的置信度（人工字幕，不受min_confidence过滤影响）
+SUBTITLE_CONFIDENCE = 1.0
+
+_TIMESTAMP_PATTERN = re.compile(
+    r"(\d+):(\d{2}):(\d{2})[,.](\d{3})\s*-->\s*(\d+):(\d{2}):(\d{2})[,.](\d{3})"
+)
+_TAG_PATTERN = re.compile(r"<[^>]+>|\{[^}]*\}")
+
+
+def _to_seconds(hours: str, minutes: str, seconds: str, millis: str) -> float:
+    return int(hours) * 3600 + int(minutes) * 60 + int(seconds) + int(millis) / 1000
+
+
+def parse_srt(content: str) -> List[Dict[str, Any]]:
+    """
+    解析SRT字幕，返回与语音识别结果相同结构的台词片段
+    """
+    segments = []
+    for block in re.split(r"\r?\n\s*\r?\n", content.strip()):
+        lines = block.splitlines()
+        for i, line in enumerate(lines):
+            match = _TIMESTAMP_PATTERN.search(line)
+            if match:
+                break
+        else:
+            continue
+
+        text = " ".join(
+            _TAG_PATTERN.sub("", text_line).strip() for text_line in lines[i + 1:]
+        ).strip()
+        if not text:
+            continue
+
+        segments.append({
+            "start": _to_seconds(*match.groups()[:4]),
+            "end": _to_seconds(*match.groups()[4:]),
+            "text": text,
+            "confidence": SUBTITLE_CONFIDENCE,
+            "words": [],
+        })
+
+    segments.sort(key=lambda segment: segment["start"])
+    return segments
+
+
+def _convert_to_srt(input_path: str, **output_args) -> Optional[List[Dict[str, Any]]]:
+    """
+    使用ffmpeg将字幕（内嵌字幕流或外挂字幕文件）转换为SRT并解析
+    """
+    try:
+        out, _ = (
+            ffmpeg
+            .input(input_path)
+            .output('pipe:', format='srt', **output_args)
+            .run(capture_stdout=True, capture_stderr=True)
+        )
+        return parse_srt(out.decode("utf-8", errors="replace"))
+    except ffmpeg.Error as e:
+        logger.error(f"读取字幕时出错: {e}")
+        return None
+
+
+def read_subtitle_file(path: str) -> Optional[List[Dict[str, Any]]]:
+    """
+    读取外挂字幕文件（.srt/.vtt/.ass）
+    """
+    return _convert_to_srt(path)
+
+
+def extract_subtitle_stream(video_path: str, stream_index: int) -> Optional[List[Dict[str, Any]]]:
+    """
+    提取视频中内嵌的文本字幕流
+    """
+    return _convert_to_srt(video_path, map=f"0:{stream_index}")
+
+
+def get_subtitle_streams(probe: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    从ffprobe结果中找出文本字幕流
+    """
+    return [
+        {
+            "index": stream["index"],
+            "codec": stream.get("codec_name", ""),
+            "language": stream.get("tags", {}).get("language", ""),
+        }
+        for stream in probe.get("streams", [])
+        if stream.get("codec_type") == "subtitle" and stream.get("codec_name") in TEXT_SUBTITLE_CODECS
+    ]
+
+
+def pick_subtitle_stream(streams: List[Dict[str, Any]], language: str) -> Optional[Dict[str, Any]]:
+    """
+    选择与识别语言一致的字幕流，没有匹配的字幕流时返回None（回退到语音识别）
+
+    其他语言的字幕（例如外语片中的中文翻译字幕）与音频内容不一致，不能代替语音识别
+    """
+    # ffprobe中的语言标签多为ISO 639-2编码
+    aliases = {"zh": {"zh", "chi", "zho", "chs", "cht"}, "en": {"en", "eng"}, "ja": {"ja", "jpn"}}
+    wanted = aliases.get(language, {language})
+
+    for stream in streams:
+        if stream["language"].lower() in wanted:
+            return stream
+    return None
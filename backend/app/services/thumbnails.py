@@ -0,0 +1,212 @@
+import os
+import shutil
+import logging
+from typing import Any, Dict, List, Optional
+
+import ffmpeg
+import numpy as np
+
+from app.core.config import settings
+
+# 配置日志
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def _write_jpeg(image: np.ndarray, output_path: str):
+    """
+    使用ffmpeg将RGB图像编码为JPEG
+    """
+    height, width = image.shape[:2]
+    tmp_path = f"{output_path}.tmp.jpg"
+    (
+        ffmpeg
+        .input('pipe:', format='rawvideo', pix_fmt='rgb24', s=f"{width}x{height}")
+        .output(tmp_path, vframes=1, **{'q:v': 4})
+        .run(input=np.ascontiguousarray(image).tobytes(), quiet=True, overwrite_output=True)
+    )
+    os.replace(tmp_path, output_path)
+
+
+def sprite_url(video_id: str, sheet: int) -> str:
+    return f"/static/sprites/{video_id}-{sheet}.jpg"
+
+
+def preview_files(preview: Optional[Dict[str, Any]]) -> List[str]:
+    """
+    列出预览信息对应的缩略图和精灵图文件路径
+    """
+    if not preview:
+        return []
+
+    files = []
+    if preview.get("thumbnail"):
+        files.append(os.path.join(settings.STATIC_DIR, "thumbnails", os.path.basename(preview["thumbnail"])))
+    sprite = preview.get("sprite")
+    if sprite:
+        sprites_dir = os.path.join(settings.STATIC_DIR, "sprites")
+        files.extend(os.path.join(sprites_dir, f"{sprite['video_id']}-{sheet}.jpg") for sheet in range(sprite["sheets"]))
+    return files
+
+
+def generate_previews(video_path: str, video_id: str, timestamps: List[float], duration: float) -> Optional[Dict[str, Any]]:
+    """
+    一次解码生成视频缩略图和每个台词片段的关键帧精灵图
+
+    只解码关键帧并按每秒一帧输出缩小后的画面，第i个片段取时间点timestamps[i]附近的关键帧，
+    放在精灵图的第i格；片段较多时按SPRITE_TILES_PER_SHEET拆分为多张精灵图
+
+    返回写入视频元数据的预览信息，失败时返回None
+    """
+    tile_width = settings.PREVIEW_TILE_WIDTH
+    tile_height = settings.PREVIEW_TILE_HEIGHT
+    columns = settings.SPRITE_COLUMNS
+    per_sheet = settings.SPRITE_TILES_PER_SHEET
+    frame_size = tile_width * tile_height * 3
+
+    thumbnails_dir = os.path.join(settings.STATIC_DIR, "thumbnails")
+    sprites_dir = os.path.join(settings.STATIC_DIR, "sprites")
+    os.makedirs(thumbnails_dir, exist_ok=True)
+    os.makedirs(sprites_dir, exist_ok=True)
+
+    # 每一帧（按秒编号）需要放入哪些格子
+    thumbnail_frame = int(duration * 0.1) if duration else 0
+    pending: Dict[int, List[int]] = {}
+    for tile, timestamp in enumerate(timestamps):
+        pending.setdefault(max(int(timestamp), 0), []).append(tile)
+
+    sheet_count = (len(timestamps) + per_sheet - 1) // per_sheet
+    sheets: Dict[int, np.ndarray] = {}
+    filled = [0] * sheet_count
+
+    def sheet_size(sheet: int) -> int:
+        return min(per_sheet, len(timestamps) - sheet * per_sheet)
+
+    def place(tile: int, frame: np.ndarray):
+        sheet, position = divmod(tile, per_sheet)
+        if sheet not in sheets:
+            rows = (sheet_size(sheet) + columns - 1) // columns
+            sheets[sheet] = np.zeros((rows * tile_height, columns * tile_width, 3), dtype=np.uint8)
+        row, column = divmod(position, columns)
+        sheets[sheet][row * tile_height:(row + 1) * tile_height, column * tile_width:(column + 1) * tile_width] = frame
+        filled[sheet] += 1
+        # 一张精灵图填满后立即写出并释放内存
+        if filled[sheet] == sheet_size(sheet):
+            _write_jpeg(sheets.pop(sheet), os.path.join(sprites_dir, f"{video_id}-{sheet}.jpg"))
+
+    process = (
+        ffmpeg
+        .input(video_path, skip_frame='nokey')
+        .filter('fps', fps=1)
+        .filter('scale', tile_width, tile_height, force_original_aspect_ratio='decrease')
+        .filter('pad', tile_width, tile_height, '(ow-iw)/2', '(oh-ih)/2')
+        .output('pipe:', format='rawvideo', pix_fmt='rgb24')
+        .global_args('-nostdin', '-loglevel', 'error')
+        .run_async(pipe_stdout=True)
+    )
+
+    frame = None
+    thumbnail = None
+    try:
+        index = 0
+        while True:
+            data = process.stdout.read(frame_size)
+            if len(data) < frame_size:
+                break
+            frame = np.frombuffer(data, dtype=np.uint8).reshape(tile_height, tile_width, 3)
+            if index == thumbnail_frame:
+                thumbnail = frame
+            for tile in pending.pop(index, []):
+                place(tile, frame)
+            index += 1
+
+        if process.wait() != 0 or frame is None:
+            logger.error(f"生成预览图时解码失败: {video_path}")
+            return None
+
+        # 时间超出视频末尾的片段使用最后一帧
+        for tiles in pending.values():
+            for tile in tiles:
+                place(tile, frame)
+
+        _write_jpeg(thumbnail if thumbnail is not None else frame, os.path.join(thumbnails_dir, f"{video_id}.jpg"))
+
+    except Exception as e:
+        logger.error(f"生成预览图时出错: {e}")
+        return None
+
+    finally:
+        if process.poll() is None:
+            process.kill()
+            process.wait()
+        process.stdout.close()
+
+    return {
+        "thumbnail": f"/static/thumbnails/{video_id}.jpg",
+        "sprite": {
+            "video_id": video_id,
+            "sheets": sheet_count,
+            "tile_width": tile_width,
+            "tile_height": tile_height,
+            "columns": columns,
+            "tiles_per_sheet": per_sheet,
+        },
+    }
+
+
+def copy_previews(preview: Optional[Dict[str, Any]], video_id: str) -> Optional[Dict[str, Any]]:
+    """
+    为内容相同的视频复制一份预览图（画面相同，无需重新解码），返回指向新文件的预览信息
+
+    复制后两个视频各自持有自己的文件，回收其中一个不影响另一个；失败时返回None
+    """
+    if not preview:
+        return None
+
+    sources = preview_files(preview)
+    copied = {**preview}
+    if preview.get("thumbnail"):
+        copied["thumbnail"] = f"/static/thumbnails/{video_id}.jpg"
+    if preview.get("sprite"):
+        copied["sprite"] = {**preview["sprite"], "video_id": video_id}
+    targets = preview_files(copied)
+
+    try:
+        for source, target in zip(sources, targets):
+            tmp_path = f"{target}.tmp.jpg"
+            try:
+                # 同一文件系统上用硬链接，不复制数据
+                os.link(source, tmp_path)
+            except OSError:
+                shutil.copyfile(source, tmp_path)
+            os.replace(tmp_path, target)
+    except OSError as e:
+        logger.error(f"复制预览图失败: {e}")
+        for target in targets:
+            if os.path.exists(target):
+                os.remove(target)
+        return None
+
+    return copied
+
+
+def get_sprite_tile(preview: Optional[Dict[str, Any]], segment_index: int) -> Optional[Dict[str, Any]]:
+    """
+    根据视频的预览信息计算某个台词片段在精灵图中的位置（无需在查询时解码视频）
+    """
+    sprite = (preview or {}).get("sprite")
+    if not sprite or segment_index is None:
+        return None
+
+    sheet, position = divmod(segment_index, sprite["tiles_per_sheet"])
+    if sheet >= sprite["sheets"]:
+        return None
+    row, column = divmod(position, sprite["columns"])
+
+    return {
+        "url": sprite_url(sprite["video_id"], sheet),
+        "x": column * sprite["tile_width"],
+        "y": row * sprite["tile_height"],
+        "width": sprite["tile_width"],
+        "height": sprite["tile_height"],
+    }
@@ -0,0 +1,159 @@
+import os
+import gzip
+import json
+import hashlib
+import logging
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+
+# 配置日志
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# 计算文件哈希时每次读取的块大小
+_HASH_CHUNK_SIZE = 1024 * 1024
+
+# 本进程估计的缓存总大小（首次写入时扫描目录得到，之后按写入增量累加，淘汰时重新扫描校准）
+_cache_bytes: Optional[int] = None
+_cache_bytes_lock = threading.Lock()
+
+
+def hash_file(path: str) -> str:
+    """
+    计算文件内容的SHA-256
+    """
+    sha256 = hashlib.sha256()
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(_HASH_CHUNK_SIZE)
+            if not chunk:
+                break
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+def make_cache_key(content_hash: str, model_name: str) -> str:
+    """
+    由视频内容哈希和影响识别结果的参数（模型、语言、beam size、VAD）生成缓存键
+
+    音频由视频按固定参数（16kHz单声道）提取，视频内容相同则音频相同，
+    因此不必先提取音频再计算哈希
+    """
+    params = {
+        "content": content_hash,
+        "model": model_name,
+        "language": settings.WHISPER_LANGUAGE,
+        "beam_size": settings.WHISPER_BEAM_SIZE,
+        "vad_filter": settings.WHISPER_VAD_FILTER,
+    }
+    return hashlib.sha256(json.dumps(params, sort_keys=True).encode()).hexdigest()
+
+
+def _cache_path(cache_key: str) -> str:
+    return os.path.join(settings.TRANSCRIPT_CACHE_DIR, cache_key[:2], f"{cache_key}.json.gz")
+
+
+def get_cached_transcript(cache_key: str) -> Optional[List[Dict[str, Any]]]:
+    """
+    读取缓存的识别结果（含逐词时间戳），未命中返回None
+    """
+    path = _cache_path(cache_key)
+    try:
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            segments = json.load(f)
+        # 更新访问时间，淘汰时按最近使用排序
+        os.utime(path)
+        logger.info(f"语音识别缓存命中: {cache_key}")
+        return segments
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logger.error(f"读取语音识别缓存失败: {e}")
+        return None
+
+
+def _scan_cache() -> List[Tuple[float, int, str]]:
+    """
+    扫描缓存目录，返回所有条目的 (访问时间, 大小, 路径)
+    """
+    entries = []
+    for root, _, files in os.walk(settings.TRANSCRIPT_CACHE_DIR):
+        for name in files:
+            if not name.endswith(".json.gz"):
+                continue
+            path = os.path.join(root, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+    return entries
+
+
+def _add_cache_bytes(delta: int) -> int:
+    """
+    累加本进程估计的缓存总大小并返回新值
+    """
+    global _cache_bytes
+    with _cache_bytes_lock:
+        if _cache_bytes is None:
+            _cache_bytes = sum(size for _, size, _ in _scan_cache())
+        else:
+            _cache_bytes += delta
+        return _cache_bytes
+
+
+def put_cached_transcript(cache_key: str, segments: List[Dict[str, Any]]):
+    """
+    缓存识别结果（gzip压缩的紧凑JSON），估计的总大小超过上限时淘汰最久未使用的条目
+
+    总大小按写入增量累加，不必每次写入都扫描整个缓存目录
+    """
+    path = _cache_path(cache_key)
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with gzip.open(f"{path}.tmp", "wt", encoding="utf-8") as f:
+            json.dump(segments, f, ensure_ascii=False, separators=(",", ":"))
+        try:
+            replaced = os.path.getsize(path)
+        except FileNotFoundError:
+            replaced = 0
+        os.replace(f"{path}.tmp", path)
+        if _add_cache_bytes(os.path.getsize(path) - replaced) > settings.TRANSCRIPT_CACHE_MAX_BYTES:
+            evict_transcript_cache()
+    except Exception as e:
+        logger.error(f"写入语音识别缓存失败: {e}")
+
+
+def evict_transcript_cache(max_bytes: int = None) -> int:
+    """
+    缓存总大小超过上限时，按最近使用时间从旧到新删除，直到降到上限的90%
+
+    扫描得到的实际大小同时用于校准本进程的估计值（其他进程写入的条目只在扫描时计入）
+
+    返回释放的字节数
+    """
+    global _cache_bytes
+    max_bytes = max_bytes or settings.TRANSCRIPT_CACHE_MAX_BYTES
+
+    entries = _scan_cache()
+    total = sum(size for _, size, _ in entries)
+
+    freed = 0
+    if total > max_bytes:
+        target = int(max_bytes * 0.9)
+        for _, size, path in sorted(entries):
+            if total - freed <= target:
+                break
+            try:
+                os.remove(path)
+                freed += size
+            except FileNotFoundError:
+                continue
+        logger.info(f"语音识别缓存淘汰: 释放 {freed} 字节")
+
+    with _cache_bytes_lock:
+        _cache_bytes = total - freed
+    return freed
@@ -0,0 +1,289 @@
+import os
+import re
+import json
+import uuid
+import shutil
+import hashlib
+import logging
+from datetime import datetime
+from typing import Any, AsyncIterator, BinaryIO, Dict, List, Optional, Tuple
+
+from starlette.concurrency import run_in_threadpool
+
+from app.core.config import settings
+from app.services.storage import UPLOAD_CHUNK_SIZE, get_tmp_dir
+
+# 配置日志
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# 支持的视频格式
+SUPPORTED_VIDEO_EXTENSIONS = ['.mp4', '.avi', '.mov', '.mkv', '.webm']
+
+# MIME类型到扩展名的映射
+_MIME_EXTENSIONS = {
+    "video/mp4": ".mp4",
+    "video/x-msvideo": ".avi",
+    "video/quicktime": ".mov",
+    "video/x-matroska": ".mkv",
+    "video/webm": ".webm",
+}
+
+_UPLOAD_ID_PATTERN = re.compile(r"^[0-9a-f-]{36}$")
+
+
+class UploadError(Exception):
+    """
+    分块上传过程中的错误（status_code对应返回给客户端的HTTP状态码）
+    """
+    def __init__(self, message: str, status_code: int = 400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def normalize_file_ext(file_type: str) -> Optional[str]:
+    """
+    将文件类型（扩展名或MIME类型）统一为扩展名，不支持的格式返回None
+    """
+    file_type = file_type.strip().lower()
+    if "/" in file_type:
+        file_ext = _MIME_EXTENSIONS.get(file_type)
+    else:
+        file_ext = file_type if file_type.startswith(".") else f".{file_type}"
+    return file_ext if file_ext in SUPPORTED_VIDEO_EXTENSIONS else None
+
+
+def get_uploads_dir() -> str:
+    """
+    获取保存所有分块上传会话的目录
+    """
+    return os.path.join(settings.VIDEOS_STORAGE_PATH, "uploads")
+
+
+def _upload_dir(upload_id: str) -> str:
+    if not _UPLOAD_ID_PATTERN.match(upload_id):
+        raise UploadError("上传会话不存在", status_code=404)
+    return os.path.join(get_uploads_dir(), upload_id)
+
+
+def _part_path(upload_id: str, part_number: int) -> str:
+    return os.path.join(_upload_dir(upload_id), f"part-{part_number:05d}")
+
+
+def _plan_parts(file_size: int, part_size: int) -> List[Dict[str, Any]]:
+    """
+    按固定块大小切分文件，返回每一块的编号、偏移和大小
+    """
+    parts = []
+    offset = 0
+    part_number = 1
+    while offset < file_size:
+        size = min(part_size, file_size - offset)
+        parts.append({"part_number": part_number, "offset": offset, "size": size})
+        offset += size
+        part_number += 1
+    return parts
+
+
+def create_upload_session(
+    owner_id: str,
+    title: str,
+    description: Optional[str],
+    file_size: int,
+    file_ext: str,
+    force_asr: bool = False,
+) -> Dict[str, Any]:
+    """
+    创建分块上传会话，会话信息保存在上传目录的manifest.json中
+    """
+    if file_size <= 0:
+        raise UploadError("文件大小无效")
+
+    upload_id = str(uuid.uuid4())
+    manifest = {
+        "upload_id": upload_id,
+        "video_id": str(uuid.uuid4()),
+        "owner_id": owner_id,
+        "title": title,
+        "description": description,
+        "file_ext": file_ext,
+        "file_size": file_size,
+        "force_asr": force_asr,
+        "part_size": settings.UPLOAD_PART_SIZE,
+        "parts": _plan_parts(file_size, settings.UPLOAD_PART_SIZE),
+        "created_at": datetime.utcnow().isoformat(),
+    }
+
+    upload_dir = _upload_dir(upload_id)
+    os.makedirs(upload_dir, exist_ok=True)
+    with open(os.path.join(upload_dir, "manifest.json"), "w") as f:
+        json.dump(manifest, f)
+
+    logger.info(f"创建分块上传会话: {upload_id}, 共 {len(manifest['parts'])} 块")
+    return manifest
+
+
+def get_upload_session(upload_id: str, owner_id: str) -> Dict[str, Any]:
+    """
+    读取上传会话，并检查是否属于当前用户
+    """
+    manifest_path = os.path.join(_upload_dir(upload_id), "manifest.json")
+    if not os.path.exists(manifest_path):
+        raise UploadError("上传会话不存在", status_code=404)
+
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+
+    if manifest["owner_id"] != owner_id:
+        raise UploadError("没有足够的权限访问此上传会话", status_code=403)
+    return manifest
+
+
+def list_uploaded_parts(manifest: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    列出已上传完成的分块（用于断点续传）
+    """
+    uploaded = []
+    for part in manifest["parts"]:
+        checksum_path = _part_path(manifest["upload_id"], part["part_number"]) + ".sha256"
+        if os.path.exists(checksum_path):
+            with open(checksum_path) as f:
+                uploaded.append({
+                    "part_number": part["part_number"],
+                    "size": part["size"],
+                    "sha256": f.read().strip(),
+                })
+    return uploaded
+
+
+async def write_part(
+    manifest: Dict[str, Any],
+    part_number: int,
+    body: AsyncIterator[bytes],
+    expected_sha256: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    流式写入一个分块并校验大小和SHA-256
+
+    分块先写入临时文件，校验通过后原子替换，因此同一分块可以安全重传，
+    不同分块之间互不影响，可以并行上传
+    """
+    if part_number < 1 or part_number > len(manifest["parts"]):
+        raise UploadError("分块编号无效")
+    expected_size = manifest["parts"][part_number - 1]["size"]
+
+    part_path = _part_path(manifest["upload_id"], part_number)
+    tmp_path = f"{part_path}.{uuid.uuid4().hex}.tmp"
+    sha256 = hashlib.sha256()
+    size = 0
+    buffer = bytearray()
+
+    try:
+        with open(tmp_path, "wb") as f:
+            async for chunk in body:
+                size += len(chunk)
+                if size > expected_size:
+                    raise UploadError("分块大小超出预期")
+                sha256.update(chunk)
+                buffer.extend(chunk)
+                # 攒够一块再写盘，避免每个小包都切换线程
+                if len(buffer) >= UPLOAD_CHUNK_SIZE:
+                    await run_in_threadpool(f.write, bytes(buffer))
+                    buffer.clear()
+            if buffer:
+                await run_in_threadpool(f.write, bytes(buffer))
+
+        if size != expected_size:
+            raise UploadError(f"分块大小不匹配: 期望 {expected_size}, 实际 {size}")
+
+        checksum = sha256.hexdigest()
+        if expected_sha256 and expected_sha256.lower() != checksum:
+            raise UploadError("分块校验和不匹配")
+
+        os.replace(tmp_path, part_path)
+        with open(f"{part_path}.sha256", "w") as f:
+            f.write(checksum)
+
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    return {"part_number": part_number, "size": size, "sha256": checksum}
+
+
+def save_session_subtitle(manifest: Dict[str, Any], source: BinaryIO, file_ext: str) -> None:
+    """
+    将外挂字幕保存到上传会话目录中，完成上传时随视频一起登记（重复上传会覆盖之前的字幕）
+    """
+    upload_dir = _upload_dir(manifest["upload_id"])
+    for name in os.listdir(upload_dir):
+        if name.startswith("subtitle."):
+            os.remove(os.path.join(upload_dir, name))
+
+    with open(os.path.join(upload_dir, f"subtitle{file_ext}"), "wb") as f:
+        shutil.copyfileobj(source, f, UPLOAD_CHUNK_SIZE)
+
+
+def get_session_subtitle(manifest: Dict[str, Any]) -> Optional[str]:
+    """
+    返回上传会话中的外挂字幕路径，没有字幕时返回None
+    """
+    upload_dir = _upload_dir(manifest["upload_id"])
+    for name in sorted(os.listdir(upload_dir)):
+        if name.startswith("subtitle."):
+            return os.path.join(upload_dir, name)
+    return None
+
+
+def assemble_upload(manifest: Dict[str, Any], parts: List[Dict[str, Any]]) -> Tuple[str, str, int]:
+    """
+    校验所有分块并在服务端合并为完整文件，同时计算整个文件的SHA-256
+
+    合并时按固定大小的块流式拷贝，不会把分块读入内存
+
+    返回 (临时文件路径, 内容哈希, 文件大小)
+    """
+    uploaded = {part["part_number"]: part for part in list_uploaded_parts(manifest)}
+    expected = {part["part_number"] for part in manifest["parts"]}
+
+    missing = sorted(expected - set(uploaded))
+    if missing:
+        raise UploadError(f"分块尚未上传完成: {missing[:10]}")
+
+    # 客户端提交的校验和必须与服务端记录一致
+    for part in parts:
+        number = part.get("part_number")
+        checksum = part.get("sha256")
+        if number not in uploaded:
+            raise UploadError(f"分块编号无效: {number}")
+        if checksum and checksum.lower() != uploaded[number]["sha256"]:
+            raise UploadError(f"分块 {number} 的校验和不匹配")
+
+    tmp_path = os.path.join(get_tmp_dir(), f"{manifest['upload_id']}.part")
+    sha256 = hashlib.sha256()
+    size = 0
+
+    try:
+        with open(tmp_path, "wb") as output:
+            for number in sorted(expected):
+                with open(_part_path(manifest["upload_id"], number), "rb") as part_file:
+                    while True:
+                        chunk = part_file.read(UPLOAD_CHUNK_SIZE)
+                        if not chunk:
+                            break
+                        sha256.update(chunk)
+                        output.write(chunk)
+                        size += len(chunk)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    return tmp_path, sha256.hexdigest(), size
+
+
+def remove_upload_session(upload_id: str) -> None:
+    """
+    删除上传会话及其所有分块
+    """
+    shutil.rmtree(_upload_dir(upload_id), ignore_errors=True)
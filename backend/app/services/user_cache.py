@@ -0,0 +1,235 @@
+import json
+import time
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+import redis
+from sqlalchemy import event, select
+from sqlalchemy.orm import ORMExecuteState, Session
+
+from app.core.config import settings
+from app.models.user import User
+
+# 配置日志
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# 缓存的用户字段（认证和权限检查只需要这些）
+PRINCIPAL_FIELDS = ("id", "email", "username", "is_active", "is_superuser")
+
+_REDIS_KEY_PREFIX = "user:principal:"
+_VERSION_KEY_PREFIX = "user:principal:version:"
+_INVALIDATION_CHANNEL = "user:principal:invalidate"
+
+# 本进程的缓存：用户ID -> (过期时间, 用户字段)，按最近使用顺序淘汰
+_local_cache: "OrderedDict[str, tuple]" = OrderedDict()
+_local_lock = threading.Lock()
+
+# 本进程清除缓存的次数：读取期间发生过清除时，读到的数据可能已过期，不写入本进程缓存
+_invalidations = 0
+
+_redis_client = None
+_subscriber = None
+_redis_retry_at = 0.0
+_redis_lock = threading.Lock()
+
+
+def _get_redis() -> Optional[redis.Redis]:
+    """
+    获取Redis连接，并订阅失效通知；Redis不可用时返回None（只使用本进程缓存），一段时间后重试
+    """
+    if _redis_client is not None:
+        return _redis_client
+    if time.monotonic() < _redis_retry_at:
+        return None
+
+    with _redis_lock:
+        if _redis_client is not None or time.monotonic() < _redis_retry_at:
+            return _redis_client
+        return _connect_redis()
+
+
+def _connect_redis() -> Optional[redis.Redis]:
+    global _redis_client, _subscriber, _redis_retry_at
+
+    try:
+        client = redis.Redis(
+            host=settings.REDIS_HOST,
+            port=settings.REDIS_PORT,
+            db=settings.REDIS_DB,
+            socket_timeout=0.2,
+            socket_connect_timeout=0.2,
+        )
+        client.ping()
+
+        # 其他进程更新用户后通过发布订阅清除本进程的缓存
+        pubsub = client.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(**{_INVALIDATION_CHANNEL: _on_invalidation})
+        _subscriber = pubsub.run_in_thread(sleep_time=1.0, daemon=True)
+        _redis_client = client
+        return client
+
+    except redis.RedisError as e:
+        logger.warning(f"用户缓存无法连接Redis，暂时只使用本进程缓存: {e}")
+        _redis_retry_at = time.monotonic() + 30
+        return None
+
+
+def _on_invalidation(message: Dict[str, Any]):
+    user_id = message["data"].decode() if isinstance(message["data"], bytes) else message["data"]
+    _invalidate_local(user_id)
+
+
+def _invalidate_local(user_id: str):
+    global _invalidations
+    with _local_lock:
+        _invalidations += 1
+        _local_cache.pop(user_id, None)
+
+
+def _get_local(user_id: str) -> Optional[Dict[str, Any]]:
+    with _local_lock:
+        entry = _local_cache.get(user_id)
+        if entry is None:
+            return None
+        expires_at, principal = entry
+        if expires_at < time.monotonic():
+            del _local_cache[user_id]
+            return None
+        _local_cache.move_to_end(user_id)
+        return principal
+
+
+def _put_local(user_id: str, principal: Dict[str, Any], invalidations: int):
+    with _local_lock:
+        if invalidations != _invalidations:
+            return
+        _local_cache[user_id] = (time.monotonic() + settings.USER_CACHE_LOCAL_TTL_SECONDS, principal)
+        _local_cache.move_to_end(user_id)
+        while len(_local_cache) > settings.USER_CACHE_SIZE:
+            _local_cache.popitem(last=False)
+
+
+def _to_user(principal: Dict[str, Any]) -> User:
+    """
+    用缓存的字段构造用户对象（不属于任何数据库会话，只用于认证和权限检查）
+    """
+    return User(**principal)
+
+
+def get_user_principal(db: Session, user_id: str) -> Optional[User]:
+    """
+    按用户ID获取用户，依次查询本进程缓存、Redis和数据库
+    """
+    principal = _get_local(user_id)
+    if principal is not None:
+        return _to_user(principal)
+
+    # 读取前记下清除次数和版本号，读取期间用户被修改时不把读到的数据写入缓存
+    invalidations = _invalidations
+    version = None
+    client = _get_redis()
+    if client is not None:
+        try:
+            cached, version = client.mget(_REDIS_KEY_PREFIX + user_id, _VERSION_KEY_PREFIX + user_id)
+            if cached is not None:
+                principal = json.loads(cached)
+                _put_local(user_id, principal, invalidations)
+                return _to_user(principal)
+        except redis.RedisError as e:
+            logger.warning(f"读取用户缓存失败: {e}")
+            client = None
+
+    user = db.query(User).filter(User.id == user_id).first()
+    if user is None:
+        return None
+
+    principal = {field: getattr(user, field) for field in PRINCIPAL_FIELDS}
+    _put_local(user_id, principal, invalidations)
+    if client is not None:
+        _put_redis(client, user_id, principal, version)
+    return user
+
+
+def _put_redis(client: redis.Redis, user_id: str, principal: Dict[str, Any], version: Optional[bytes]):
+    """
+    版本号与读取前相同时才写入Redis：清除缓存时先递增版本号，读取期间发生的清除会使写入放弃
+    """
+    version_key = _VERSION_KEY_PREFIX + user_id
+    try:
+        with client.pipeline() as pipe:
+            pipe.watch(version_key)
+            if pipe.get(version_key) != version:
+                return
+            pipe.multi()
+            pipe.set(_REDIS_KEY_PREFIX + user_id, json.dumps(principal), ex=settings.USER_CACHE_TTL_SECONDS)
+            pipe.execute()
+    except redis.WatchError:
+        pass
+    except redis.RedisError as e:
+        logger.warning(f"写入用户缓存失败: {e}")
+
+
+def invalidate_user(user_id: str):
+    """
+    清除用户的缓存（本进程、Redis，并通知其他进程）
+    """
+    _invalidate_local(user_id)
+
+    client = _get_redis()
+    if client is not None:
+        try:
+            version_key = _VERSION_KEY_PREFIX + user_id
+            pipeline = client.pipeline()
+            pipeline.incr(version_key)
+            # 版本号只需比正在进行的读取活得久
+            pipeline.expire(version_key, settings.USER_CACHE_TTL_SECONDS)
+            pipeline.delete(_REDIS_KEY_PREFIX + user_id)
+            pipeline.publish(_INVALIDATION_CHANNEL, user_id)
+            pipeline.execute()
+        except redis.RedisError as e:
+            logger.warning(f"清除用户缓存失败: {e}")
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_changed_users(session: Session, flush_context):
+    """
+    记录本次事务中被修改或删除的用户，提交后清除它们的缓存
+    """
+    changed = session.info.setdefault("changed_user_ids", set())
+    for obj in list(session.dirty) + list(session.deleted):
+        if isinstance(obj, User):
+            changed.add(obj.id)
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _collect_bulk_changed_users(orm_execute_state: ORMExecuteState):
+    """
+    query.update() / query.delete() 等批量语句不经过 after_flush：执行前按相同条件查出受影响的用户，
+    提交后同样清除它们的缓存
+    """
+    if not (orm_execute_state.is_update or orm_execute_state.is_delete):
+        return
+    mapper = orm_execute_state.bind_mapper
+    if mapper is None or not issubclass(mapper.class_, User):
+        return
+
+    statement = orm_execute_state.statement
+    query = select(User.id)
+    if statement.whereclause is not None:
+        query = query.where(statement.whereclause)
+    changed = orm_execute_state.session.info.setdefault("changed_user_ids", set())
+    changed.update(orm_execute_state.session.execute(query).scalars())
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_changed_users(session: Session):
+    for user_id in session.info.pop("changed_user_ids", ()):
+        invalidate_user(user_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_changed_users(session: Session):
+    session.info.pop("changed_user_ids", None)
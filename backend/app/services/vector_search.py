@@ -1,14 +1,29 @@
 import os
+import json
+import uuid
+import fcntl
+import shutil
+import math
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
 import numpy as np
 import faiss
 import logging
-from typing import List, Tuple, Dict, Any, Optional
+from typing import List, Tuple, Dict, Any, Optional, Set
 import time
+from datetime import datetime, timezone
 
 from sqlalchemy.orm import Session
 from app.models.search import Transcript
 from app.models.video import Video
 from app.core.config import settings
+from app.core.metrics import (
+    COLUMN_STORE_BYTES, EMBEDDING_MODEL_LOAD_SECONDS, INGEST_STEP_SECONDS, SEARCH_CANDIDATES, SEARCH_REQUESTS,
+    SEARCH_STAGE_SECONDS, VECTOR_INDEX_BYTES, VECTOR_INDEX_VECTORS, VECTOR_INDEX_VIDEOS, timed
+)
+from app.services.storage import get_media_url
+from app.services.thumbnails import get_sprite_tile
 
 # 配置日志
 logging.basicConfig(level=logging.INFO)
@@ -19,44 +34,282 @@ _vector_index = None
 _vector_ids = []
 _index_initialized = False
 
+# 保护索引的读写（FAISS索引在添加向量时不能同时搜索）
+_index_lock = threading.RLock()
+
+# 本进程已应用到索引的向量日志偏移(字节)
+_log_offset = 0
+
+# 已加入索引的视频及其向量在索引中的位置范围 [start, end)
+_video_ranges: Dict[str, Tuple[int, int]] = {}
+
+# 本进程索引对应的向量存储代（None表示尚未加载）
+_generation: Optional[str] = None
+
+# 切换到新一代索引时只允许一个线程在后台构建
+_swap_lock = threading.Lock()
+
+# 向量化模型（按模型名缓存，第一次使用时加载）
+_embedding_models: Dict[str, Any] = {}
+
+# 每条台词在列存储中的字段（与向量分片中的向量一一对应）
+COLUMN_DTYPE = np.dtype([
+    ("start_time", np.float32),
+    ("end_time", np.float32),
+    ("confidence", np.float32),
+    ("segment_index", np.int32),
+])
+
+
+class ColumnStore:
+    """
+    与FAISS索引位置一一对应的列式台词数据：开始/结束时间、置信度、片段序号、所属视频，
+    以及按偏移索引的文本。搜索时直接从这里组装结果，不需要查询数据库（数据库仍是权威数据源，
+    这里的数据在处理视频时写入向量分片旁边，各进程同步向量日志时加载）
+
+    没有列数据的向量（旧版本写入的分片）所属视频为-1，搜索时回退到数据库查询。
+    已删除的视频记在 removed 中，之后再同步到的同一视频的记录（例如删除时仍在处理的任务
+    随后发布了向量或视频信息）也保持删除状态。旧版本的视频信息没有上传时间，
+    这些视频记在 missing_created_at 中，按上传时间筛选前从数据库补齐
+    """
+    
+    def __init__(self):
+        self.size = 0
+        self.start_time = np.zeros(0, dtype=np.float32)
+        self.end_time = np.zeros(0, dtype=np.float32)
+        self.confidence = np.zeros(0, dtype=np.float32)
+        self.segment_index = np.zeros(0, dtype=np.int32)
+        self.video_slot = np.zeros(0, dtype=np.int32)
+        self.text_offsets = np.zeros(1, dtype=np.int64)
+        self.text_blob = bytearray()
+        self.transcript_ids: List[Optional[str]] = []
+        self.videos: List[Dict[str, Any]] = []
+        self.video_slots: Dict[str, int] = {}
+        self.owner_videos: Dict[str, List[str]] = {}
+        self.removed: Set[str] = set()
+        self.missing_created_at: Set[str] = set()
+    
+    def _video_entry(self, video_id: str, info: Dict[str, Any]) -> Dict[str, Any]:
+        entry = {**info, "id": video_id}
+        if video_id in self.removed:
+            entry["deleted"] = True
+        if entry.get("created_at"):
+            self.missing_created_at.discard(video_id)
+        else:
+            self.missing_created_at.add(video_id)
+        return entry
+    
+    def _reserve(self, count: int):
+        """
+        按倍增扩容，追加数据的均摊成本为O(1)
+        """
+        needed = self.size + count
+        if needed <= len(self.start_time):
+            return
+        capacity = max(needed, 2 * len(self.start_time), 1024)
+        for name in ("start_time", "end_time", "confidence", "segment_index", "video_slot"):
+            column = getattr(self, name)
+            grown = np.zeros(capacity, dtype=column.dtype)
+            grown[:self.size] = column[:self.size]
+            setattr(self, name, grown)
+        offsets = np.zeros(capacity + 1, dtype=np.int64)
+        offsets[:self.size + 1] = self.text_offsets[:self.size + 1]
+        self.text_offsets = offsets
+    
+    def add_video(
+        self,
+        video_id: Optional[str],
+        count: int,
+        info: Optional[Dict[str, Any]] = None,
+        columns: Optional[np.ndarray] = None,
+        texts: Optional[List[str]] = None,
+        transcript_ids: Optional[List[str]] = None,
+    ):
+        """
+        追加一个视频的全部台词（顺序与加入索引的向量一致）；没有列数据时只占位
+        """
+        self._reserve(count)
+        start, end = self.size, self.size + count
+        
+        if columns is None or info is None:
+            slot = -1
+            texts = [""] * count
+            transcript_ids = [None] * count
+        else:
+            slot = len(self.videos)
+            self.videos.append(self._video_entry(video_id, info))
+            self.video_slots[video_id] = slot
+            self.owner_videos.setdefault(info["owner_id"], []).append(video_id)
+            for name in COLUMN_DTYPE.names:
+                getattr(self, name)[start:end] = columns[name]
+        
+        self.video_slot[start:end] = slot
+        for i, text in enumerate(texts):
+            self.text_blob.extend(text.encode("utf-8"))
+            self.text_offsets[start + i + 1] = len(self.text_blob)
+        self.transcript_ids.extend(transcript_ids)
+        self.size = end
+    
+    def update_video(self, video_id: str, info: Dict[str, Any]):
+        slot = self.video_slots.get(video_id)
+        if slot is not None:
+            self.videos[slot] = self._video_entry(video_id, info)
+    
+    def remove_video(self, video_id: str):
+        """
+        标记视频已删除，搜索时不再返回它的台词
+        """
+        self.removed.add(video_id)
+        slot = self.video_slots.get(video_id)
+        if slot is not None:
+            self.videos[slot]["deleted"] = True
+    
+    def get_video(self, position: int) -> Optional[Dict[str, Any]]:
+        slot = self.video_slot[position]
+        return self.videos[slot] if slot >= 0 else None
+    
+    def nbytes(self) -> int:
+        """
+        列数据和文本占用的内存（不含视频信息字典）
+        """
+        columns = sum(
+            getattr(self, name).nbytes
+            for name in ("start_time", "end_time", "confidence", "segment_index", "video_slot", "text_offsets")
+        )
+        return columns + len(self.text_blob)
+    
+    def get_text(self, position: int) -> str:
+        return bytes(self.text_blob[self.text_offsets[position]:self.text_offsets[position + 1]]).decode("utf-8")
+
+
+# 与当前索引对齐的列存储
+_column_store = ColumnStore()
+
+# 各用户搜索时过滤后保留的候选比例（指数滑动平均），用来估计下一次搜索的初始候选数
+_filter_selectivity: "OrderedDict[str, float]" = OrderedDict()
+_SELECTIVITY_USERS = 10000
+_SELECTIVITY_ALPHA = 0.3
+_MIN_SELECTIVITY = 0.01
+
+
+def get_generation_dir(generation: str) -> str:
+    """
+    获取一代向量存储的目录（空字符串表示向量存储根目录，即引入分代之前的布局）
+    """
+    if not generation:
+        return settings.VECTOR_STORE_PATH
+    return os.path.join(settings.VECTOR_STORE_PATH, "generations", generation)
+
+
+def get_active_generation() -> str:
+    """
+    读取当前生效的向量存储代
+    """
+    try:
+        with open(os.path.join(settings.VECTOR_STORE_PATH, "CURRENT")) as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        return ""
+
+
+def get_generation_meta(generation: str) -> Dict[str, Any]:
+    """
+    读取一代向量存储使用的模型和向量维度
+    """
+    meta_path = os.path.join(get_generation_dir(generation), "meta.json")
+    if os.path.exists(meta_path):
+        with open(meta_path) as f:
+            return json.load(f)
+    return {"model": settings.EMBEDDING_MODEL, "dimension": settings.VECTOR_DIMENSION}
+
+
+def create_generation(model_name: str, dimension: int) -> str:
+    """
+    创建新一代向量存储（尚未生效），返回代的名称
+    """
+    generation = f"{time.strftime('%Y%m%d%H%M%S')}-{uuid.uuid4().hex[:8]}"
+    generation_dir = get_generation_dir(generation)
+    os.makedirs(os.path.join(generation_dir, "shards"), exist_ok=True)
+    with open(os.path.join(generation_dir, "meta.json"), "w") as f:
+        json.dump({"model": model_name, "dimension": dimension}, f)
+    return generation
+
+
+def activate_generation(generation: str):
+    """
+    原子地切换当前生效的向量存储代，各进程在下次同步时于后台加载新索引
+    """
+    current_path = os.path.join(settings.VECTOR_STORE_PATH, "CURRENT")
+    with open(f"{current_path}.tmp", "w") as f:
+        f.write(generation)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(f"{current_path}.tmp", current_path)
+    logger.info(f"向量存储已切换到: {generation}")
+
+
+@contextmanager
+def vector_store_lock(exclusive: bool = False):
+    """
+    向量存储的跨进程锁：写入向量时持共享锁，切换代时持排他锁，
+    保证切换前后写入的向量都落在生效的那一代中
+    """
+    os.makedirs(settings.VECTOR_STORE_PATH, exist_ok=True)
+    with open(os.path.join(settings.VECTOR_STORE_PATH, ".lock"), "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _create_index(dimension: int):
+    """
+    创建空的向量索引（GPU可用时放在GPU上）
+    """
+    # 检查GPU是否可用
+    gpu_count = faiss.get_num_gpus()
+    logger.info(f"FAISS检测到的GPU数量: {gpu_count}")
+    
+    # 创建基础索引（使用内积/余弦相似度）
+    base_index = faiss.IndexFlatIP(dimension)
+    
+    # 如果GPU可用，使用GPU资源
+    if gpu_count > 0:
+        try:
+            # 创建GPU资源对象
+            res = faiss.StandardGpuResources()
+            # 设置GPU资源的使用
+            gpu_options = faiss.GpuClonerOptions()
+            gpu_options.useFloat16 = True  # 使用FP16可以节省内存
+            # 将索引转移到GPU
+            index = faiss.index_cpu_to_gpu(res, 0, base_index, gpu_options)
+            logger.info(f"成功将FAISS索引移至GPU 0，使用FP16优化")
+            return index
+        except Exception as gpu_error:
+            logger.error(f"无法使用GPU: {gpu_error}")
+            logger.info("回退到CPU版本")
+            return base_index
+    
+    logger.info("未检测到GPU，使用CPU版本的FAISS")
+    return base_index
+
 
 def get_vector_index():
     """
     获取或初始化向量索引
     """
-    global _vector_index, _vector_ids, _index_initialized
+    global _vector_index, _vector_ids, _index_initialized, _generation
     
     if not _index_initialized:
         try:
-            # 创建向量索引
-            dimension = settings.VECTOR_DIMENSION
+            # 创建向量索引（维度以当前生效的那一代向量存储为准）
+            generation = get_active_generation()
+            dimension = get_generation_meta(generation)["dimension"]
             logger.info(f"初始化向量索引，维度: {dimension}")
             
-            # 检查GPU是否可用
-            gpu_count = faiss.get_num_gpus()
-            logger.info(f"FAISS检测到的GPU数量: {gpu_count}")
-            
-            # 创建基础索引（使用内积/余弦相似度）
-            base_index = faiss.IndexFlatIP(dimension)
-            
-            # 如果GPU可用，使用GPU资源
-            if gpu_count > 0:
-                try:
-                    # 创建GPU资源对象
-                    res = faiss.StandardGpuResources()
-                    # 设置GPU资源的使用
-                    gpu_options = faiss.GpuClonerOptions()
-                    gpu_options.useFloat16 = True  # 使用FP16可以节省内存
-                    # 将索引转移到GPU
-                    _vector_index = faiss.index_cpu_to_gpu(res, 0, base_index, gpu_options)
-                    logger.info(f"成功将FAISS索引移至GPU 0，使用FP16优化")
-                except Exception as gpu_error:
-                    logger.error(f"无法使用GPU: {gpu_error}")
-                    logger.info("回退到CPU版本")
-                    _vector_index = base_index
-            else:
-                logger.info("未检测到GPU，使用CPU版本的FAISS")
-                _vector_index = base_index
+            _vector_index = _create_index(dimension)
+            _generation = generation
             
             # 初始化向量ID列表
             _vector_ids = []
@@ -75,10 +328,15 @@ def reset_index():
     """
     重置向量索引（用于测试或重建索引）
     """
-    global _vector_index, _vector_ids, _index_initialized
-    _vector_index = None
-    _vector_ids = []
-    _index_initialized = False
+    global _vector_index, _vector_ids, _index_initialized, _log_offset, _generation, _column_store
+    with _index_lock:
+        _vector_index = None
+        _vector_ids = []
+        _index_initialized = False
+        _log_offset = 0
+        _generation = None
+        _column_store = ColumnStore()
+        _video_ranges.clear()
     logger.info("向量索引已重置")
 
 
@@ -96,12 +354,14 @@ def add_vector_to_index(vector_id: str, vector: np.ndarray):
         # 确保向量是浮点型并且形状正确
         vector = vector.astype(np.float32).reshape(1, -1)
         
-        # 获取索引
-        index, ids = get_vector_index()
-        
-        # 添加向量
-        index.add(vector)
-        ids.append(vector_id)
+        with _index_lock:
+            # 获取索引
+            index, ids = get_vector_index()
+            
+            # 添加向量（没有列数据，搜索时从数据库读取台词）
+            index.add(vector)
+            ids.append(vector_id)
+            _column_store.add_video(None, 1)
         
         logger.info(f"向量添加成功: {vector_id}, 当前索引大小: {len(ids)}")
         return True
@@ -125,12 +385,14 @@ def batch_add_vectors(vector_ids: List[str], vectors: np.ndarray):
         # 确保向量是浮点型
         vectors = vectors.astype(np.float32)
         
-        # 获取索引
-        index, ids = get_vector_index()
-        
-        # 添加向量
-        index.add(vectors)
-        ids.extend(vector_ids)
+        with _index_lock:
+            # 获取索引
+            index, ids = get_vector_index()
+            
+            # 添加向量（没有列数据，搜索时从数据库读取台词）
+            index.add(vectors)
+            ids.extend(vector_ids)
+            _column_store.add_video(None, len(vector_ids))
         
         logger.info(f"批量添加向量成功: {len(vector_ids)}条, 当前索引大小: {len(ids)}")
         return True
@@ -140,29 +402,679 @@ def batch_add_vectors(vector_ids: List[str], vectors: np.ndarray):
         return False
 
 
-def search_vectors(query_vector: np.ndarray, top_k: int = 10) -> List[Tuple[str, float]]:
+def _resolve_generation(generation: Optional[str]) -> str:
+    return get_active_generation() if generation is None else generation
+
+
+def _get_log_path(generation: Optional[str] = None) -> str:
+    return os.path.join(get_generation_dir(_resolve_generation(generation)), "index.log")
+
+
+def _get_shard_paths(video_id: str, generation: Optional[str] = None) -> Tuple[str, str]:
+    shards_dir = os.path.join(get_generation_dir(_resolve_generation(generation)), "shards")
+    return (
+        os.path.join(shards_dir, f"{video_id}.npy"),
+        os.path.join(shards_dir, f"{video_id}.ids.json"),
+    )
+
+
+def _get_column_paths(video_id: str, generation: Optional[str] = None) -> Tuple[str, str, str]:
+    shards_dir = os.path.join(get_generation_dir(_resolve_generation(generation)), "shards")
+    return (
+        os.path.join(shards_dir, f"{video_id}.cols.npy"),
+        os.path.join(shards_dir, f"{video_id}.text.json"),
+        os.path.join(shards_dir, f"{video_id}.video.json"),
+    )
+
+
+def _list_generations() -> List[str]:
     """
-    搜索向量
+    列出所有代（包括根目录、正在重建和已停用的代）
+    """
+    generations = [""]
+    generations_dir = os.path.join(settings.VECTOR_STORE_PATH, "generations")
+    if os.path.isdir(generations_dir):
+        generations.extend(sorted(os.listdir(generations_dir)))
+    return generations
+
+
+def get_video_store_files(video_id: str) -> List[str]:
+    """
+    列出视频在各代向量存储中的全部文件（向量分片和列数据），包括正在重建和已停用的代
+    """
+    return [
+        path
+        for generation in _list_generations()
+        for path in (*_get_shard_paths(video_id, generation), *_get_column_paths(video_id, generation))
+        if os.path.exists(path)
+    ]
+
+
+def _write_file_atomic(path: str, write):
+    with open(f"{path}.tmp", "wb") as f:
+        write(f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(f"{path}.tmp", path)
+
+
+def _append_log(entry: Dict[str, Any], generation: Optional[str] = None):
+    """
+    向向量日志追加一条记录（加文件锁，多个worker可以同时写入）
+    """
+    log_path = _get_log_path(generation)
+    os.makedirs(os.path.dirname(log_path), exist_ok=True)
+    with open(log_path, "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            f.write(json.dumps(entry) + "\n")
+            f.flush()
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def save_video_vectors(video_id: str, vector_ids: List[str], vectors: np.ndarray, generation: Optional[str] = None) -> bool:
+    """
+    持久化一个视频的全部向量（向量分片），默认写入当前生效的那一代
+
+    向量按VECTOR_STORE_DTYPE（默认float16）保存，重建索引时直接从分片读取，无需重新运行模型
     """
     try:
-        # 获取索引
-        index, ids = get_vector_index()
+        if not vector_ids or vectors is None or vectors.size == 0:
+            logger.error("无效的批量向量数据")
+            return False
         
-        if len(ids) == 0:
-            logger.warning("向量索引为空，无法搜索")
-            return []
+        vectors_path, ids_path = _get_shard_paths(video_id, generation)
+        os.makedirs(os.path.dirname(vectors_path), exist_ok=True)
+        
+        # 先写临时文件再原子替换，避免其他进程读到写了一半的分片
+        with open(f"{vectors_path}.tmp", "wb") as f:
+            np.save(f, np.asarray(vectors).astype(settings.VECTOR_STORE_DTYPE))
+            f.flush()
+            os.fsync(f.fileno())
+        with open(f"{ids_path}.tmp", "w") as f:
+            json.dump(vector_ids, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(f"{vectors_path}.tmp", vectors_path)
+        os.replace(f"{ids_path}.tmp", ids_path)
+        
+        logger.info(f"视频 {video_id} 的 {len(vector_ids)} 个向量已写入向量存储")
+        return True
+    
+    except Exception as e:
+        logger.error(f"写入向量存储失败: {e}")
+        return False
+
+
+def publish_video_vectors(video_id: str, generation: Optional[str] = None) -> bool:
+    """
+    将已持久化的向量分片记录到向量日志中，各进程同步后即可搜索到
+    """
+    try:
+        _append_log({"op": "add", "video_id": video_id}, generation)
+        return True
+    except Exception as e:
+        logger.error(f"写入向量日志失败: {e}")
+        return False
+
+
+def store_video_vectors(video_id: str, vector_ids: List[str], vectors: np.ndarray) -> bool:
+    """
+    持久化一个视频的全部向量，并记录到向量日志中
+
+    向量索引只存在于各个进程的内存里，处理视频的worker通过向量日志把向量交给
+    API进程：各进程在搜索前调用sync_vector_index()加载日志中新增的向量分片
+    """
+    return save_video_vectors(video_id, vector_ids, vectors) and publish_video_vectors(video_id)
+
+
+def load_video_vectors(video_id: str, generation: Optional[str] = None) -> Optional[Tuple[List[str], np.ndarray]]:
+    """
+    读取一个视频的向量分片（内存映射，按需从磁盘读取；旧版本写入的float32分片同样可以读取）
+    """
+    vectors_path, ids_path = _get_shard_paths(video_id, generation)
+    if not os.path.exists(vectors_path) or not os.path.exists(ids_path):
+        return None
+    
+    with open(ids_path) as f:
+        vector_ids = json.load(f)
+    return vector_ids, np.load(vectors_path, mmap_mode="r")
+
+
+def copy_video_vectors(video_id: str, source_generation: str, target_generation: str) -> bool:
+    """
+    将一个视频的向量分片从一代复制到另一代（按当前的存储精度重新保存），不需要重新向量化
+    """
+    shard = load_video_vectors(video_id, source_generation)
+    if shard is None:
+        logger.warning(f"向量分片不存在: {video_id}")
+        return False
+    vector_ids, vectors = shard
+    if not save_video_vectors(video_id, vector_ids, vectors, target_generation):
+        return False
+    
+    # 列数据与向量分片一起复制（旧版本的分片没有列数据）
+    for source_path, target_path in zip(
+        _get_column_paths(video_id, source_generation), _get_column_paths(video_id, target_generation)
+    ):
+        if os.path.exists(source_path):
+            with open(source_path, "rb") as source:
+                _write_file_atomic(target_path, lambda f: shutil.copyfileobj(source, f))
+    return True
+
+
+def _video_info(video: Video) -> Dict[str, Any]:
+    return {
+        "title": video.title,
+        "description": video.description,
+        "duration": video.duration,
+        "owner_id": video.owner_id,
+        "created_at": video.created_at.isoformat() if video.created_at else None,
+        "preview": (video.video_metadata or {}).get("preview"),
+    }
+
+
+def save_video_info(video: Video, generation: Optional[str] = None):
+    """
+    写入列存储中视频级别的信息（标题、时长、所属用户、预览图）
+    """
+    info_path = _get_column_paths(video.id, generation)[2]
+    os.makedirs(os.path.dirname(info_path), exist_ok=True)
+    _write_file_atomic(info_path, lambda f: f.write(json.dumps(_video_info(video)).encode("utf-8")))
+
+
+def save_video_columns(db: Session, video_id: str, generation: Optional[str] = None) -> bool:
+    """
+    从数据库读取视频的台词，按向量分片中向量的顺序写入列存储
+    """
+    try:
+        _, ids_path = _get_shard_paths(video_id, generation)
+        with open(ids_path) as f:
+            vector_ids = json.load(f)
         
-        # 确保查询向量是浮点型并且形状正确
-        query_vector = query_vector.astype(np.float32).reshape(1, -1)
+        video = db.query(Video).filter(Video.id == video_id).first()
+        if video is None:
+            return False
         
-        # 执行搜索
-        distances, indices = index.search(query_vector, min(top_k, len(ids)))
+        rows = {
+            row.vector_id: row
+            for row in db.query(
+                Transcript.vector_id, Transcript.id, Transcript.start_time, Transcript.end_time,
+                Transcript.confidence, Transcript.segment_index, Transcript.text
+            ).filter(Transcript.video_id == video_id)
+        }
         
-        # 获取结果
-        results = []
-        for i, idx in enumerate(indices[0]):
-            if idx < len(ids) and idx >= 0:
-                results.append((ids[idx], float(distances[0][i])))
+        columns = np.zeros(len(vector_ids), dtype=COLUMN_DTYPE)
+        transcript_ids = []
+        texts = []
+        for i, vector_id in enumerate(vector_ids):
+            row = rows.get(vector_id)
+            if row is None:
+                transcript_ids.append(None)
+                texts.append("")
+                continue
+            columns[i] = (row.start_time, row.end_time, row.confidence or 0.0, row.segment_index or 0)
+            transcript_ids.append(row.id)
+            texts.append(row.text)
+        
+        columns_path, text_path, _ = _get_column_paths(video_id, generation)
+        _write_file_atomic(columns_path, lambda f: np.save(f, columns))
+        _write_file_atomic(text_path, lambda f: f.write(
+            json.dumps({"transcript_ids": transcript_ids, "texts": texts}, ensure_ascii=False).encode("utf-8")
+        ))
+        save_video_info(video, generation)
+        return True
+    
+    except Exception as e:
+        logger.error(f"写入列存储失败: {e}")
+        return False
+
+
+def _load_video_columns(video_id: str, generation: str) -> Optional[Tuple[Dict[str, Any], np.ndarray, List[str], List[str]]]:
+    """
+    读取一个视频的列数据，返回 (视频信息, 列数组, 文本, 台词ID)，不存在时返回None
+    """
+    columns_path, text_path, info_path = _get_column_paths(video_id, generation)
+    if not all(os.path.exists(path) for path in (columns_path, text_path, info_path)):
+        return None
+    
+    with open(text_path) as f:
+        text = json.load(f)
+    with open(info_path) as f:
+        info = json.load(f)
+    return info, np.load(columns_path, mmap_mode="r"), text["texts"], text["transcript_ids"]
+
+
+def publish_video_info(video: Video):
+    """
+    更新列存储中的视频信息并记录到向量日志（例如处理完成后生成了预览图）
+    """
+    try:
+        with vector_store_lock():
+            save_video_info(video)
+            _append_log({"op": "video", "video_id": video.id})
+    except Exception as e:
+        logger.error(f"更新视频信息失败: {e}")
+
+
+def publish_video_removal(video_id: str, generation: Optional[str] = None):
+    """
+    记录视频已删除，各进程同步后搜索结果中不再出现该视频
+    """
+    try:
+        _append_log({"op": "remove", "video_id": video_id}, generation)
+    except Exception as e:
+        logger.error(f"写入向量日志失败: {e}")
+
+
+def republish_video_removal(video_id: str):
+    """
+    在保存着该视频向量分片的每一代中重新记录删除
+
+    删除视频时只记录到当时生效的一代，之后仍在处理的任务可能又写入了向量或视频信息，
+    重建中的新一代也可能已经载入了它；回收时再记录一次，确保各代都不再返回该视频
+    """
+    for generation in _list_generations():
+        if os.path.exists(_get_shard_paths(video_id, generation)[0]):
+            publish_video_removal(video_id, generation)
+
+
+def clone_video_vectors(db: Session, source_video_id: str, target_video_id: str) -> bool:
+    """
+    内容相同的视频复用已有视频的向量：复制向量分片并写入自己的列数据，然后记录到向量日志
+    """
+    with vector_store_lock():
+        shard = load_video_vectors(source_video_id)
+        if shard is None:
+            logger.warning(f"向量分片不存在: {source_video_id}")
+            return False
+        vector_ids, vectors = shard
+        return (
+            save_video_vectors(target_video_id, vector_ids, vectors)
+            and save_video_columns(db, target_video_id)
+            and publish_video_vectors(target_video_id)
+        )
+
+
+def list_generation_videos(generation: str) -> List[str]:
+    """
+    列出向量日志中记录的所有视频（不包括之后被删除的视频）
+    """
+    log_path = _get_log_path(generation)
+    if not os.path.exists(log_path):
+        return []
+    
+    video_ids: Dict[str, None] = {}
+    removed: Set[str] = set()
+    with open(log_path, "rb") as f:
+        for line in f:
+            if line.endswith(b"\n"):
+                entry = json.loads(line)
+                if entry.get("op") == "add" and entry["video_id"] not in removed:
+                    video_ids[entry["video_id"]] = None
+                elif entry.get("op") == "remove":
+                    removed.add(entry["video_id"])
+                    video_ids.pop(entry["video_id"], None)
+    return list(video_ids)
+
+
+def _apply_log(
+    generation: str,
+    index,
+    ids: List[str],
+    ranges: Dict[str, Tuple[int, int]],
+    store: ColumnStore,
+    offset: int,
+) -> Tuple[int, int]:
+    """
+    将一代向量存储的日志从offset开始应用到给定的索引和列存储上
+
+    返回 (新的日志偏移, 新增的向量数)
+    """
+    log_path = _get_log_path(generation)
+    if not os.path.exists(log_path) or os.path.getsize(log_path) <= offset:
+        return offset, 0
+    
+    with open(log_path, "rb") as f:
+        f.seek(offset)
+        data = f.read()
+    
+    # 只处理完整的行，写了一半的记录留到下次
+    complete = data[:data.rfind(b"\n") + 1]
+    
+    added = 0
+    for line in complete.splitlines():
+        entry = json.loads(line)
+        op = entry.get("op")
+        video_id = entry.get("video_id")
+        
+        if op == "video":
+            if video_id in ranges:
+                loaded = _load_video_columns(video_id, generation)
+                if loaded:
+                    store.update_video(video_id, loaded[0])
+            continue
+        if op == "remove":
+            store.remove_video(video_id)
+            continue
+        
+        # 同一视频重复记录时（例如任务重试）只加入一次
+        if op != "add" or video_id in ranges:
+            continue
+        shard = load_video_vectors(video_id, generation)
+        if shard is None:
+            logger.warning(f"向量分片不存在: {video_id}")
+            continue
+        vector_ids, vectors = shard
+        if vectors.ndim != 2 or vectors.shape[1] != index.d:
+            logger.warning(f"向量分片维度与索引不一致，已跳过: {video_id}")
+            continue
+        start = len(ids)
+        index.add(np.ascontiguousarray(vectors, dtype=np.float32))
+        ids.extend(vector_ids)
+        ranges[video_id] = (start, start + len(vector_ids))
+        
+        loaded = _load_video_columns(video_id, generation)
+        if loaded and len(loaded[1]) == len(vector_ids):
+            info, columns, texts, transcript_ids = loaded
+            store.add_video(video_id, len(vector_ids), info, columns, texts, transcript_ids)
+        else:
+            store.add_video(video_id, len(vector_ids))
+        added += len(vector_ids)
+    
+    return offset + len(complete), added
+
+
+def _swap_generation(generation: str):
+    """
+    在后台为新一代向量存储构建索引，构建完成后原子替换当前索引
+
+    构建期间搜索继续使用旧索引和旧模型
+    """
+    global _vector_index, _vector_ids, _index_initialized, _log_offset, _generation, _column_store
+    
+    try:
+        meta = get_generation_meta(generation)
+        logger.info(f"开始加载新一代向量索引: {generation}, 模型: {meta['model']}")
+        
+        # 预先加载新模型，切换后查询立即使用
+        get_embedding_model(meta["model"])
+        
+        index = _create_index(meta["dimension"])
+        ids: List[str] = []
+        ranges: Dict[str, Tuple[int, int]] = {}
+        store = ColumnStore()
+        offset, added = _apply_log(generation, index, ids, ranges, store, 0)
+        
+        with _index_lock:
+            # 补上构建期间新写入的向量后切换
+            offset, _ = _apply_log(generation, index, ids, ranges, store, offset)
+            _vector_index = index
+            _vector_ids = ids
+            _column_store = store
+            _video_ranges.clear()
+            _video_ranges.update(ranges)
+            _log_offset = offset
+            _generation = generation
+            _index_initialized = True
+        
+        # 释放不再使用的模型
+        for model_name in list(_embedding_models):
+            if model_name != meta["model"]:
+                _embedding_models.pop(model_name, None)
+        
+        logger.info(f"已切换到新一代向量索引: {generation}, 向量数: {len(ids)}")
+    
+    except Exception as e:
+        logger.error(f"加载新一代向量索引失败: {e}")
+    
+    finally:
+        _swap_lock.release()
+
+
+def sync_vector_index():
+    """
+    将向量日志中新增的向量分片加入本进程的索引；
+    生效的向量存储代发生变化时，在后台线程中加载新索引
+    """
+    global _log_offset
+    
+    try:
+        generation = get_active_generation()
+        if _index_initialized and generation != _generation and _swap_lock.acquire(blocking=False):
+            threading.Thread(target=_swap_generation, args=(generation,), daemon=True).start()
+        
+        with _index_lock:
+            index, ids = get_vector_index()
+            _log_offset, added = _apply_log(_generation, index, ids, _video_ranges, _column_store, _log_offset)
+        
+        if added:
+            logger.info(f"从向量日志同步了 {added} 个向量")
+    
+    except Exception as e:
+        logger.error(f"同步向量索引失败: {e}")
+
+
+@timed(SEARCH_STAGE_SECONDS, stage="ann")
+def _search_index(query_vector: np.ndarray, top_k: int) -> List[Tuple[int, float]]:
+    """
+    在当前索引中搜索，返回 (索引位置, 相似度)（调用方需持有_index_lock）
+    """
+    index, ids = get_vector_index()
+    
+    if len(ids) == 0:
+        logger.warning("向量索引为空，无法搜索")
+        return []
+    
+    # 确保查询向量是浮点型并且形状正确
+    query_vector = query_vector.astype(np.float32).reshape(1, -1)
+    if query_vector.shape[1] != index.d:
+        # 查询向量化与索引切换恰好交错时出现
+        logger.warning("查询向量维度与索引不一致，请重试")
+        return []
+    
+    # 执行搜索
+    distances, indices = index.search(query_vector, min(top_k, len(ids)))
+    
+    return [
+        (int(idx), float(distances[0][i]))
+        for i, idx in enumerate(indices[0])
+        if 0 <= idx < len(ids)
+    ]
+
+
+@timed(SEARCH_STAGE_SECONDS, stage="ann")
+def _range_search_index(query_vector: np.ndarray, min_similarity: float, max_results: int) -> List[Tuple[int, float]]:
+    """
+    返回相似度不低于min_similarity的全部向量，按相似度从高到低最多max_results个（调用方需持有_index_lock）
+
+    GPU索引不支持range_search，改为逐步扩大k直到出现低于阈值的结果
+    """
+    index, ids = get_vector_index()
+    if len(ids) == 0:
+        return []
+    
+    query_vector = query_vector.astype(np.float32).reshape(1, -1)
+    if query_vector.shape[1] != index.d:
+        logger.warning("查询向量维度与索引不一致，请重试")
+        return []
+    
+    try:
+        lims, distances, indices = index.range_search(query_vector, min_similarity)
+        hits = sorted(
+            zip(indices[lims[0]:lims[1]].tolist(), distances[lims[0]:lims[1]].tolist()),
+            key=lambda hit: hit[1],
+            reverse=True
+        )
+        return hits[:max_results]
+    
+    except RuntimeError:
+        k = min(max(len(ids) // 1000, 64), max_results)
+        while True:
+            hits = _search_index(query_vector, k)
+            if len(hits) < k or k >= max_results or (hits and hits[-1][1] < min_similarity):
+                return [(position, score) for position, score in hits if score >= min_similarity]
+            k = min(k * settings.SEARCH_GROWTH_FACTOR, max_results)
+
+
+def _initial_k(user_id: str, limit: int) -> int:
+    """
+    根据该用户以往的过滤保留比例估计需要取回的候选数
+    """
+    selectivity = _filter_selectivity.get(user_id, 1.0 / 3)  # 没有记录时与原先的limit*3一致
+    return min(max(limit, math.ceil(limit / max(selectivity, _MIN_SELECTIVITY))), settings.SEARCH_MAX_CANDIDATES)
+
+
+def _record_selectivity(user_id: str, candidates: int, survivors: int):
+    if candidates == 0:
+        return
+    observed = survivors / candidates
+    previous = _filter_selectivity.pop(user_id, observed)
+    _filter_selectivity[user_id] = (1 - _SELECTIVITY_ALPHA) * previous + _SELECTIVITY_ALPHA * observed
+    if len(_filter_selectivity) > _SELECTIVITY_USERS:
+        _filter_selectivity.popitem(last=False)
+
+
+def _to_utc(value: Optional[datetime]) -> Optional[datetime]:
+    if value is not None and value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def _backfill_created_at(db: Session):
+    """
+    旧版本写入的视频信息没有上传时间，从数据库补齐（每个视频只查询一次）
+    """
+    with _index_lock:
+        missing = list(_column_store.missing_created_at)
+    if not missing:
+        return
+    
+    created = {}
+    for start in range(0, len(missing), 500):
+        chunk = missing[start:start + 500]
+        created.update(db.query(Video.id, Video.created_at).filter(Video.id.in_(chunk)).all())
+    
+    with _index_lock:
+        store = _column_store
+        for video_id in missing:
+            slot = store.video_slots.get(video_id)
+            if slot is not None and created.get(video_id) and not store.videos[slot].get("created_at"):
+                store.videos[slot]["created_at"] = created[video_id].isoformat()
+            # 数据库中已没有的视频同样不再查询，按上传时间筛选时跳过
+            store.missing_created_at.discard(video_id)
+
+
+@timed(SEARCH_STAGE_SECONDS, stage="scope")
+def _scoped_ranges(
+    user_id: str,
+    min_confidence: float,
+    video_ids: Optional[List[str]] = None,
+    uploaded_after: Optional[datetime] = None,
+    uploaded_before: Optional[datetime] = None,
+    start_time: Optional[float] = None,
+    end_time: Optional[float] = None,
+) -> List[Tuple[int, int, np.ndarray]]:
+    """
+    根据搜索范围计算需要搜索的索引位置（调用方需持有_index_lock）
+
+    返回每个视频在索引中的位置范围 [start, end) 以及范围内满足时间段和置信度条件的掩码；
+    只包含有列数据的视频，按上传时间筛选时跳过无法确定上传时间的视频
+    """
+    store = _column_store
+    uploaded_after = _to_utc(uploaded_after)
+    uploaded_before = _to_utc(uploaded_before)
+    
+    ranges = []
+    for video_id in (video_ids if video_ids is not None else store.owner_videos.get(user_id, [])):
+        slot = store.video_slots.get(video_id)
+        if slot is None:
+            continue
+        video = store.videos[slot]
+        if video.get("deleted") or video["owner_id"] != user_id:
+            continue
+        
+        if uploaded_after or uploaded_before:
+            created_at = datetime.fromisoformat(video["created_at"]) if video.get("created_at") else None
+            if created_at is None:
+                continue
+            if uploaded_after and created_at < uploaded_after:
+                continue
+            if uploaded_before and created_at > uploaded_before:
+                continue
+        
+        start, end = _video_ranges[video_id]
+        mask = store.confidence[start:end] >= min_confidence
+        if start_time is not None:
+            mask &= store.end_time[start:end] >= start_time
+        if end_time is not None:
+            mask &= store.start_time[start:end] <= end_time
+        if mask.any():
+            ranges.append((start, end, mask))
+    
+    return ranges
+
+
+@timed(SEARCH_STAGE_SECONDS, stage="ann")
+def _search_scoped(query_vector: np.ndarray, ranges: List[Tuple[int, int, np.ndarray]], k: int) -> List[Tuple[int, float]]:
+    """
+    只在给定范围内搜索（调用方需持有_index_lock）
+
+    范围较小时取出范围内的向量直接计算相似度，耗时只与范围大小有关；
+    范围较大时通过IDSelectorBatch在FAISS中过滤。扁平索引仍要逐个检查全部向量，
+    耗时与不限范围的搜索相当，并不更快，只是不必取回大量候选再逐条过滤
+    """
+    index = _vector_index
+    query_vector = query_vector.astype(np.float32).reshape(-1)
+    if query_vector.shape[0] != index.d:
+        logger.warning("查询向量维度与索引不一致，请重试")
+        return []
+    
+    total = sum(int(mask.sum()) for _, _, mask in ranges)
+    if total == 0:
+        return []
+    
+    if total > settings.SEARCH_SCOPED_EXACT_MAX:
+        positions = np.concatenate([np.arange(start, end)[mask] for start, end, mask in ranges]).astype(np.int64)
+        try:
+            params = faiss.SearchParameters(sel=faiss.IDSelectorBatch(positions))
+            distances, indices = index.search(query_vector.reshape(1, -1), min(k, total), params=params)
+            return [
+                (int(idx), float(distances[0][i]))
+                for i, idx in enumerate(indices[0])
+                if idx >= 0
+            ]
+        except (AttributeError, RuntimeError, TypeError):
+            # 索引不支持搜索参数（例如GPU索引）时逐段计算
+            pass
+    
+    positions = []
+    scores = []
+    for start, end, mask in ranges:
+        vectors = index.reconstruct_n(start, end - start)
+        positions.append(np.arange(start, end)[mask])
+        scores.append((vectors @ query_vector)[mask])
+    positions = np.concatenate(positions)
+    scores = np.concatenate(scores)
+    
+    if len(scores) > k:
+        top = np.argpartition(-scores, k - 1)[:k]
+        positions, scores = positions[top], scores[top]
+    order = np.argsort(-scores)
+    return [(int(positions[i]), float(scores[i])) for i in order]
+
+
+def search_vectors(query_vector: np.ndarray, top_k: int = 10) -> List[Tuple[str, float]]:
+    """
+    搜索向量
+    """
+    try:
+        # 加载其他进程新写入的向量
+        sync_vector_index()
+        
+        with _index_lock:
+            results = [(_vector_ids[position], score) for position, score in _search_index(query_vector, top_k)]
         
         logger.info(f"搜索完成，找到{len(results)}个结果")
         return results
@@ -172,15 +1084,48 @@ def search_vectors(query_vector: np.ndarray, top_k: int = 10) -> List[Tuple[str,
         return []
 
 
+def get_embedding_model(model_name: Optional[str] = None):
+    """
+    获取（并缓存）向量化模型
+
+    未指定模型时使用本进程索引对应那一代的模型（尚未加载索引时使用当前生效的那一代），
+    保证查询向量与索引中的向量来自同一个模型
+    """
+    if model_name is None:
+        generation = _generation if _generation is not None else get_active_generation()
+        model_name = get_generation_meta(generation)["model"]
+    
+    if model_name not in _embedding_models:
+        from sentence_transformers import SentenceTransformer
+        
+        logger.info(f"加载向量化模型: {model_name}")
+        with EMBEDDING_MODEL_LOAD_SECONDS.time(model=model_name):
+            _embedding_models[model_name] = SentenceTransformer(model_name)
+    
+    return _embedding_models[model_name]
+
+
+@timed(INGEST_STEP_SECONDS, step="embed")
+def encode_texts(texts: List[str], model_name: Optional[str] = None) -> Optional[np.ndarray]:
+    """
+    批量将文本向量化
+    """
+    try:
+        model = get_embedding_model(model_name)
+        return model.encode(texts, batch_size=settings.EMBEDDING_BATCH_SIZE)
+    
+    except Exception as e:
+        logger.error(f"批量向量化文本时出错: {e}")
+        return None
+
+
 def vectorize_query(query_text: str) -> Optional[np.ndarray]:
     """
     将查询文本向量化
     """
     try:
-        from sentence_transformers import SentenceTransformer
-        
         # 加载模型（与视频处理中使用相同的模型）
-        model = SentenceTransformer('distiluse-base-multilingual-cased-v1')
+        model = get_embedding_model()
         
         # 获取文本向量
         embedding = model.encode(query_text)
@@ -192,73 +1137,210 @@ def vectorize_query(query_text: str) -> Optional[np.ndarray]:
         return None
 
 
-def search_transcripts(db: Session, user_id: str, query_text: str, limit: int = 10, min_confidence: float = 0.5) -> Tuple[List[Dict[str, Any]], int]:
+def _build_result(
+    transcript_id: str,
+    text: str,
+    start_time: float,
+    end_time: float,
+    confidence: Optional[float],
+    segment_index: Optional[int],
+    similarity_score: float,
+    video: Dict[str, Any],
+) -> Dict[str, Any]:
+    """
+    组装前端使用的搜索结果
+    """
+    # 预览图在处理阶段已生成，这里只根据片段序号计算精灵图中的位置
+    preview = video.get("preview")
+    
+    return {
+        "id": transcript_id,
+        "text": text,
+        "start_time": start_time,
+        "end_time": end_time,
+        "confidence": confidence,
+        "similarity_score": similarity_score,
+        "video": {
+            "id": video["id"],
+            "title": video["title"],
+            "description": video["description"],
+            "duration": video["duration"],
+            "thumbnail": preview["thumbnail"] if preview else None
+        },
+        "sprite": get_sprite_tile(preview, segment_index),
+        # 直接从原始视频中台词开始的位置播放
+        "media_url": get_media_url(video["id"], start_time, end_time)
+    }
+
+
+@timed(SEARCH_STAGE_SECONDS, stage="hydrate")
+def _collect_results(hits: List[Tuple[int, float]], user_id: str, min_confidence: float) -> Tuple[List[Dict[str, Any]], List[Tuple[str, float]]]:
+    """
+    从列存储中组装搜索结果（调用方需持有_index_lock）
+
+    返回 (搜索结果, 没有列数据、需要从数据库读取的 (vector_id, 相似度))
+    """
+    store = _column_store
+    results = []
+    fallback = []
+    
+    for position, score in hits:
+        video = store.get_video(position)
+        if video is None:
+            fallback.append((_vector_ids[position], score))
+            continue
+        
+        # 权限检查和置信度过滤
+        if video.get("deleted") or video["owner_id"] != user_id or store.transcript_ids[position] is None:
+            continue
+        confidence = float(store.confidence[position])
+        if confidence < min_confidence:
+            continue
+        
+        results.append(_build_result(
+            store.transcript_ids[position],
+            store.get_text(position),
+            float(store.start_time[position]),
+            float(store.end_time[position]),
+            confidence,
+            int(store.segment_index[position]),
+            score,
+            video,
+        ))
+    
+    return results, fallback
+
+
+@timed(SEARCH_STAGE_SECONDS, stage="sql")
+def _fetch_results_from_db(db: Session, user_id: str, vector_results: List[Tuple[str, float]], min_confidence: float) -> List[Dict[str, Any]]:
+    """
+    从数据库读取台词并组装搜索结果（用于没有列数据的旧向量）
+    """
+    scores = dict(vector_results)
+    
+    # 获取台词记录，包括用户权限检查
+    transcripts_with_video = (
+        db.query(Transcript, Video)
+        .join(Video, Transcript.video_id == Video.id)
+        .filter(
+            Transcript.vector_id.in_(list(scores)),
+            Video.owner_id == user_id,
+            Video.deleted_at.is_(None),
+            Transcript.confidence >= min_confidence
+        )
+        .all()
+    )
+    
+    return [
+        _build_result(
+            transcript.id,
+            transcript.text,
+            transcript.start_time,
+            transcript.end_time,
+            transcript.confidence,
+            transcript.segment_index,
+            scores.get(transcript.vector_id, 0.0),
+            {"id": video.id, **_video_info(video)},
+        )
+        for transcript, video in transcripts_with_video
+    ]
+
+
+def search_transcripts(
+    db: Session,
+    user_id: str,
+    query_text: str,
+    limit: int = 10,
+    min_confidence: float = 0.5,
+    min_similarity: Optional[float] = None,
+    video_ids: Optional[List[str]] = None,
+    uploaded_after: Optional[datetime] = None,
+    uploaded_before: Optional[datetime] = None,
+    start_time: Optional[float] = None,
+    end_time: Optional[float] = None,
+) -> Tuple[List[Dict[str, Any]], int]:
     """
     搜索视频台词
+
+    结果直接从与索引对齐的列存储中组装，不查询数据库；只有旧版本写入、没有列数据的向量才回退到数据库。
+    按用户和置信度过滤后结果不足limit条时，逐步扩大取回的候选数，直到结果足够或达到SEARCH_MAX_CANDIDATES；
+    指定min_similarity时改为返回相似度不低于该值的结果。
+
+    指定视频、上传时间或视频内时间段时，先按范围筛选出索引位置，只在范围内搜索
+    （只搜索有列数据的视频）
     """
-    start_time = time.time()
+    search_start = time.time()
+    scoped = any(value is not None for value in (video_ids, uploaded_after, uploaded_before, start_time, end_time))
     
     try:
+        SEARCH_REQUESTS.inc(mode="scoped" if scoped else "threshold" if min_similarity is not None else "top_k")
+        
         # 向量化查询文本
-        query_vector = vectorize_query(query_text)
+        with SEARCH_STAGE_SECONDS.time(stage="embed"):
+            query_vector = vectorize_query(query_text)
         if query_vector is None:
             logger.error("无法向量化查询文本")
             return [], 0
         
-        # 在FAISS中搜索相似向量
-        vector_results = search_vectors(query_vector, top_k=limit*3)  # 获取更多结果以便过滤
+        # 加载其他进程新写入的向量
+        sync_vector_index()
+        if uploaded_after is not None or uploaded_before is not None:
+            _backfill_created_at(db)
+        
+        # 在FAISS中搜索相似向量，并在同一把锁内读取列存储，保证索引位置与列数据对应；
+        # 没有列数据的旧向量在锁外从数据库读取，按用户和置信度过滤后才计入结果
+        if scoped:
+            with _index_lock:
+                ranges = _scoped_ranges(
+                    user_id, min_confidence, video_ids, uploaded_after, uploaded_before, start_time, end_time
+                )
+                # 范围内的向量已按用户和置信度筛选过，取回的结果无需再扩大候选数
+                top_k = settings.SEARCH_MAX_CANDIDATES if min_similarity is not None else limit
+                hits = _search_scoped(query_vector, ranges, top_k)
+                if min_similarity is not None:
+                    hits = [(position, score) for position, score in hits if score >= min_similarity]
+                results, fallback = _collect_results(hits, user_id, min_confidence)
+            legacy = _fetch_results_from_db(db, user_id, fallback, min_confidence) if fallback else []
+        elif min_similarity is not None:
+            with _index_lock:
+                hits = _range_search_index(query_vector, min_similarity, settings.SEARCH_MAX_CANDIDATES)
+                results, fallback = _collect_results(hits, user_id, min_confidence)
+            legacy = _fetch_results_from_db(db, user_id, fallback, min_confidence) if fallback else []
+        else:
+            with _index_lock:
+                k = _initial_k(user_id, limit)
+            legacy = []
+            fetched = set()
+            while True:
+                with _index_lock:
+                    hits = _search_index(query_vector, k)
+                    results, fallback = _collect_results(hits, user_id, min_confidence)
+                # 扩大候选数后之前的候选仍在其中，旧向量只查询新增的部分
+                new_fallback = [(vector_id, score) for vector_id, score in fallback if vector_id not in fetched]
+                if new_fallback:
+                    fetched.update(vector_id for vector_id, _ in new_fallback)
+                    legacy.extend(_fetch_results_from_db(db, user_id, new_fallback, min_confidence))
+                # 过滤后的结果足够、索引已取完或达到上限时停止
+                if len(results) + len(legacy) >= limit or len(hits) < k or k >= settings.SEARCH_MAX_CANDIDATES:
+                    break
+                k = min(k * settings.SEARCH_GROWTH_FACTOR, settings.SEARCH_MAX_CANDIDATES)
         
-        if not vector_results:
+        SEARCH_CANDIDATES.observe(len(hits))
+        if not scoped:
+            # 限定范围的搜索已预先筛选，不计入过滤保留比例
+            with _index_lock:
+                _record_selectivity(user_id, len(hits), len(results) + len(legacy))
+        
+        if not hits:
             logger.warning(f"未找到与查询 '{query_text}' 相匹配的向量")
             return [], 0
         
-        # 从数据库获取相应的台词记录
-        vector_ids = [vid for vid, _ in vector_results]
-        
-        # 获取台词记录，包括用户权限检查
-        transcripts_with_video = (
-            db.query(Transcript, Video)
-            .join(Video, Transcript.video_id == Video.id)
-            .filter(
-                Transcript.vector_id.in_(vector_ids),
-                Video.owner_id == user_id,
-                Transcript.confidence >= min_confidence
-            )
-            .all()
-        )
-        
-        # 将结果映射到前端格式
-        results = []
-        for transcript, video in transcripts_with_video:
-            # 找到该向量的相似度分数
-            similarity_score = 0.0
-            for vid, score in vector_results:
-                if vid == transcript.vector_id:
-                    similarity_score = score
-                    break
-            
-            result = {
-                "id": transcript.id,
-                "text": transcript.text,
-                "start_time": transcript.start_time,
-                "end_time": transcript.end_time,
-                "confidence": transcript.confidence,
-                "similarity_score": similarity_score,
-                "video": {
-                    "id": video.id,
-                    "title": video.title,
-                    "description": video.description,
-                    "duration": video.duration,
-                    "thumbnail": f"/static/thumbnails/{video.id}.jpg"
-                }
-            }
-            
-            results.append(result)
+        results.extend(legacy)
         
         # 按相似度排序
         results = sorted(results, key=lambda x: x["similarity_score"], reverse=True)[:limit]
         
-        processing_time = time.time() - start_time
+        processing_time = time.time() - search_start
         logger.info(f"搜索完成，耗时: {processing_time:.3f}秒, 结果数: {len(results)}")
         
         return results, len(results)
@@ -268,14 +1350,32 @@ def search_transcripts(db: Session, user_id: str, query_text: str, limit: int =
         return [], 0
 
 
+def _index_size() -> int:
+    index = _vector_index
+    return index.ntotal if index is not None else 0
+
+
+def _index_bytes() -> int:
+    index = _vector_index
+    # 平坦索引以float32保存全部向量
+    return index.ntotal * index.d * 4 if index is not None else 0
+
+
+VECTOR_INDEX_VECTORS.set_function(_index_size)
+VECTOR_INDEX_VIDEOS.set_function(lambda: len(_video_ranges))
+VECTOR_INDEX_BYTES.set_function(_index_bytes)
+COLUMN_STORE_BYTES.set_function(lambda: _column_store.nbytes())
+
+
 # 初始化函数，用于在应用启动时预热模型和索引
 def init_vector_search():
     """
     初始化向量搜索组件（可用于应用启动时调用）
     """
     try:
-        # 初始化索引
+        # 初始化索引，并加载向量日志中已有的向量
         index, _ = get_vector_index()
+        sync_vector_index()
         logger.info(f"向量搜索系统初始化完成，是否在GPU上: {isinstance(index, faiss.GpuIndex)}")
         return True
     except Exception as e:
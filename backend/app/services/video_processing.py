@@ -1,24 +1,48 @@
 import os
+import json
 import uuid
-import tempfile
+import shutil
 import ffmpeg
+import queue
 import logging
-from typing import List, Dict, Any, Optional
+import threading
+from datetime import datetime, timedelta
+from typing import List, Dict, Any, Optional, Iterable, Iterator, Tuple, Union
 import numpy as np
 
+from celery import chain
 from sqlalchemy.orm import Session
 from app.db.session import SessionLocal
-from app.models.video import Video, VideoSegment, ProcessingStatus
+from app.db.bulk import bulk_insert
+from app.models.video import Video, VideoSegment, ProcessingStatus, ProcessingStage, PROCESSING_STAGE_ORDER
 from app.models.search import Transcript
 from app.core.config import settings
 from app.core.celery_app import celery_app
-from app.services.vector_search import add_vector_to_index, batch_add_vectors
+from app.core.metrics import INGEST_AUDIO_SECONDS, INGEST_STAGE_RESULTS, INGEST_STAGE_SECONDS, INGEST_STEP_SECONDS, timed
+from app.services.subtitles import (
+    extract_subtitle_stream, get_subtitle_streams, pick_subtitle_stream, read_subtitle_file
+)
+from app.services.transcript_cache import (
+    get_cached_transcript, hash_file, make_cache_key, put_cached_transcript
+)
+from app.services.thumbnails import generate_previews
+from app.services.vector_search import (
+    clone_video_vectors, encode_texts, get_active_generation, get_embedding_model, get_generation_meta, publish_video_info,
+    publish_video_vectors, save_video_columns, save_video_vectors, vector_store_lock
+)
 
 # 配置日志
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Whisper要求的输入格式：16kHz单声道
+AUDIO_SAMPLE_RATE = 16000
 
+# 已加载的Whisper模型（按模型名称/路径缓存，避免每次识别都重新加载）
+_whisper_models: Dict[str, Any] = {}
+
+
+@timed(INGEST_STEP_SECONDS, step="probe")
 def get_video_info(file_path: str) -> Dict[str, Any]:
     """
     使用ffmpeg获取视频文件信息
@@ -35,7 +59,8 @@ def get_video_info(file_path: str) -> Dict[str, Any]:
             'file_size': int(probe['format'].get('size', 0)),
             'format': probe['format'].get('format_name', ''),
             'resolution': f"{video_stream.get('width', 0)}x{video_stream.get('height', 0)}",
-            'codec': video_stream.get('codec_name', '')
+            'codec': video_stream.get('codec_name', ''),
+            'subtitle_streams': get_subtitle_streams(probe)
         }
         
         return info
@@ -45,6 +70,7 @@ def get_video_info(file_path: str) -> Dict[str, Any]:
         return {}
 
 
+@timed(INGEST_STEP_SECONDS, step="extract")
 def extract_audio(video_path: str, output_path: str) -> bool:
     """
     从视频中提取音频
@@ -62,6 +88,60 @@ def extract_audio(video_path: str, output_path: str) -> bool:
         return False
 
 
+def stream_audio_chunks(video_path: str, chunk_seconds: float = 0) -> Iterator[np.ndarray]:
+    """
+    通过管道从ffmpeg流式读取16kHz单声道PCM，按块产出float32数组（不落盘）
+    
+    chunk_seconds <= 0 时只在提取结束后产出一整块
+    """
+    process = (
+        ffmpeg
+        .input(video_path)
+        .output('pipe:', format='s16le', acodec='pcm_s16le', ac=1, ar=AUDIO_SAMPLE_RATE)
+        .global_args('-nostdin', '-loglevel', 'error')
+        .run_async(pipe_stdout=True)
+    )
+    
+    try:
+        if chunk_seconds and chunk_seconds > 0:
+            chunk_bytes = int(chunk_seconds * AUDIO_SAMPLE_RATE) * 2
+            while True:
+                data = process.stdout.read(chunk_bytes)
+                if not data:
+                    break
+                yield np.frombuffer(data, dtype=np.int16).astype(np.float32) / 32768.0
+        else:
+            data = process.stdout.read()
+            if data:
+                yield np.frombuffer(data, dtype=np.int16).astype(np.float32) / 32768.0
+        
+        if process.wait() != 0:
+            raise ffmpeg.Error('ffmpeg', None, None)
+    
+    finally:
+        # 调用方提前结束迭代时终止ffmpeg进程
+        if process.poll() is None:
+            process.kill()
+            process.wait()
+        process.stdout.close()
+
+
+@timed(INGEST_STEP_SECONDS, step="extract")
+def extract_audio_array(video_path: str) -> Optional[np.ndarray]:
+    """
+    从视频中提取音频到内存中的float32数组（16kHz单声道）
+    """
+    try:
+        chunks = list(stream_audio_chunks(video_path))
+        if not chunks:
+            logger.error(f"视频中没有音频数据: {video_path}")
+            return None
+        return chunks[0]
+    except ffmpeg.Error as e:
+        logger.error(f"提取音频时出错: {e}")
+        return None
+
+
 def split_video(video_path: str, start_time: float, end_time: float, output_path: str) -> bool:
     """
     分割视频片段
@@ -79,47 +159,194 @@ def split_video(video_path: str, start_time: float, end_time: float, output_path
         return False
 
 
-def transcribe_audio(audio_path: str, model_name: str = None) -> List[Dict[str, Any]]:
+def resolve_whisper_model(model_name: str = None) -> str:
+    """
+    确定实际使用的Whisper模型（名称或路径）
+    """
+    # 优先使用配置中的模型路径
+    if hasattr(settings, 'WHISPER_MODEL_PATH') and os.path.exists(settings.WHISPER_MODEL_PATH):
+        return settings.WHISPER_MODEL_PATH
+    # 如果提供了model_name且是完整路径
+    if model_name and os.path.exists(model_name):
+        return model_name
+    # 使用预设的模型名称
+    return model_name or settings.WHISPER_MODEL
+
+
+def get_whisper_model(model_name: str = None):
+    """
+    获取（并缓存）Whisper模型
+    """
+    from faster_whisper import WhisperModel
+    
+    model_key = resolve_whisper_model(model_name)
+    logger.info(f"使用Whisper模型: {model_key}")
+    
+    if model_key not in _whisper_models:
+        _whisper_models[model_key] = WhisperModel(model_key, device="cuda", compute_type="float16")
+    
+    return _whisper_models[model_key]
+
+
+def _run_whisper(model, audio: Union[str, np.ndarray], time_offset: float = 0.0) -> List[Dict[str, Any]]:
+    """
+    执行一次Whisper识别，time_offset用于把分块识别的时间戳换算回整段视频的时间
+    """
+    segments, info = model.transcribe(
+        audio, 
+        language=settings.WHISPER_LANGUAGE,
+        beam_size=settings.WHISPER_BEAM_SIZE,
+        word_timestamps=True,
+        vad_filter=settings.WHISPER_VAD_FILTER
+    )
+    
+    # 处理结果
+    results = []
+    for segment in segments:
+        results.append({
+            "start": segment.start + time_offset,
+            "end": segment.end + time_offset,
+            "text": segment.text,
+            "confidence": segment.avg_logprob,
+            "words": [
+                {"word": word.word, "start": word.start + time_offset, "end": word.end + time_offset}
+                for word in segment.words
+            ]
+        })
+    
+    return results
+
+
+@timed(INGEST_STEP_SECONDS, step="transcribe")
+def transcribe_audio(audio: Union[str, np.ndarray], model_name: str = None) -> List[Dict[str, Any]]:
     """
-    使用Whisper模型进行语音识别
+    使用Whisper模型进行语音识别（audio可以是音频文件路径，也可以是16kHz单声道float32数组）
     """
     try:
-        from faster_whisper import WhisperModel
-        
-        # 优先使用配置中的模型路径
-        if hasattr(settings, 'WHISPER_MODEL_PATH') and os.path.exists(settings.WHISPER_MODEL_PATH):
-            logger.info(f"使用配置的自定义模型路径: {settings.WHISPER_MODEL_PATH}")
-            model = WhisperModel(settings.WHISPER_MODEL_PATH, device="cuda", compute_type="float16")
-        # 如果提供了model_name且是完整路径
-        elif model_name and os.path.exists(model_name):
-            logger.info(f"使用传入的自定义模型路径: {model_name}")
-            model = WhisperModel(model_name, device="cuda", compute_type="float16")
-        else:
-            # 使用预设的模型名称
-            model_name = model_name or settings.WHISPER_MODEL
-            logger.info(f"使用预设模型: {model_name}")
-            model = WhisperModel(model_name, device="cuda", compute_type="float16")
+        model = get_whisper_model(model_name)
+        return _run_whisper(model, audio)
+    
+    except Exception as e:
+        logger.error(f"语音识别时出错: {e}")
+        return []
+
+
+def _trim_segments(segments: List[Dict[str, Any]], start: float = None, end: float = None) -> List[Dict[str, Any]]:
+    """
+    只保留开始时间在 [start, end) 内的词（用于去掉相邻分块重叠部分的重复识别结果）
+
+    部分词被去掉的台词按剩余的词重新计算起止时间和文本，没有剩余词的台词整条去掉
+    """
+    def inside(value: float) -> bool:
+        return (start is None or value >= start) and (end is None or value < end)
+    
+    trimmed = []
+    for segment in segments:
+        words = segment["words"]
+        if not words:
+            if inside(segment["start"]):
+                trimmed.append(segment)
+            continue
         
-        # 执行转录
-        segments, info = model.transcribe(
-            audio_path, 
-            language="zh", 
-            beam_size=5,
-            word_timestamps=True,
-            vad_filter=True
-        )
+        kept = [word for word in words if inside(word["start"])]
+        if len(kept) == len(words):
+            trimmed.append(segment)
+        elif kept:
+            trimmed.append({
+                **segment,
+                "start": kept[0]["start"],
+                "end": kept[-1]["end"],
+                "text": "".join(word["word"] for word in kept),
+                "words": kept,
+            })
+    return trimmed
+
+
+def _prefetch(chunks: Iterable[np.ndarray], depth: int) -> Iterator[np.ndarray]:
+    """
+    在后台线程中预先读取音频块，识别当前块的同时提取后面的音频
+
+    读取中的异常在取到对应位置时抛出；调用方提前结束迭代时停止读取并关闭来源（终止ffmpeg进程）
+    """
+    if depth <= 0:
+        yield from chunks
+        return
+    
+    buffer: queue.Queue = queue.Queue(maxsize=depth)
+    stop = threading.Event()
+    done = object()
+    
+    def put(item) -> bool:
+        while not stop.is_set():
+            try:
+                buffer.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+    
+    def produce():
+        source = iter(chunks)
+        try:
+            for chunk in source:
+                if not put(chunk):
+                    break
+            else:
+                put(done)
+        except Exception as e:
+            put(e)
+        finally:
+            if hasattr(source, "close"):
+                source.close()
+    
+    thread = threading.Thread(target=produce, name="audio-prefetch", daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = buffer.get()
+            if item is done:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        stop.set()
+        thread.join()
+
+
+@timed(INGEST_STEP_SECONDS, step="transcribe")
+def transcribe_audio_stream(chunks: Iterable[np.ndarray], model_name: str = None) -> List[Dict[str, Any]]:
+    """
+    对流式产出的音频块逐块进行语音识别，提取尚未结束时即可开始识别
+
+    音频在后台线程中预先读取，提取与识别并行进行。每块与上一块的末尾重叠
+    AUDIO_STREAM_OVERLAP_SECONDS 一起识别，避免块边界处的词被截断；重叠部分以中点为界，
+    之前的词取自上一块、之后的词取自当前块，不会重复
+    """
+    try:
+        model = get_whisper_model(model_name)
+        overlap = int(settings.AUDIO_STREAM_OVERLAP_SECONDS * AUDIO_SAMPLE_RATE)
         
-        # 处理结果
         results = []
-        for segment in segments:
-            results.append({
-                "start": segment.start,
-                "end": segment.end,
-                "text": segment.text,
-                "confidence": segment.avg_logprob,
-                "words": [{"word": word.word, "start": word.start, "end": word.end} for word in segment.words]
-            })
+        pending: List[Dict[str, Any]] = []  # 上一块的识别结果（末尾要等下一块确定分界后再截取）
+        tail = np.zeros(0, dtype=np.float32)
+        samples_done = 0
+        for chunk in _prefetch(chunks, settings.AUDIO_STREAM_PREFETCH_CHUNKS):
+            window_start = samples_done - len(tail)
+            segments = _run_whisper(model, np.concatenate([tail, chunk]), window_start / AUDIO_SAMPLE_RATE)
+            
+            if len(tail):
+                boundary = (window_start + len(tail) / 2) / AUDIO_SAMPLE_RATE
+                results.extend(_trim_segments(pending, end=boundary))
+                segments = _trim_segments(segments, start=boundary)
+            else:
+                results.extend(pending)
+            pending = segments
+            
+            samples_done += len(chunk)
+            tail = chunk[-overlap:] if overlap > 0 else tail
         
+        results.extend(pending)
         return results
     
     except Exception as e:
@@ -127,15 +354,149 @@ def transcribe_audio(audio_path: str, model_name: str = None) -> List[Dict[str,
         return []
 
 
+def get_work_dir(video_id: str) -> str:
+    """
+    获取视频处理中间产物的目录（失败重试时从这里复用已完成阶段的产物）
+    """
+    work_dir = os.path.join(settings.VIDEOS_STORAGE_PATH, "work", video_id)
+    os.makedirs(work_dir, exist_ok=True)
+    return work_dir
+
+
+def _to_pcm16(audio: np.ndarray) -> np.ndarray:
+    return (audio * 32768).astype(np.int16)
+
+
+def _save_pcm(pcm: np.ndarray, path: str):
+    """
+    保存16位PCM文件
+    """
+    pcm.tofile(f"{path}.tmp")
+    os.replace(f"{path}.tmp", path)
+
+
+def _load_pcm(path: str) -> np.ndarray:
+    return np.fromfile(path, dtype=np.int16).astype(np.float32) / 32768.0
+
+
+def _iter_pcm_chunks(path: str, chunk_seconds: float) -> Iterator[np.ndarray]:
+    """
+    按块读取已保存的PCM文件（内存映射，不整体读入内存）
+    """
+    data = np.memmap(path, dtype=np.int16, mode="r")
+    step = int(chunk_seconds * AUDIO_SAMPLE_RATE)
+    for start in range(0, len(data), step):
+        yield data[start:start + step].astype(np.float32) / 32768.0
+
+
+def _tee_audio_chunks(chunks: Iterable[np.ndarray], path: str) -> Iterator[np.ndarray]:
+    """
+    产出音频块的同时追加写入PCM文件，全部写完后才替换为正式文件
+    """
+    with open(f"{path}.tmp", "wb") as f:
+        for chunk in chunks:
+            _to_pcm16(chunk).tofile(f)
+            yield chunk
+    os.replace(f"{path}.tmp", path)
+
+
+def _write_json(path: str, data: Any):
+    with open(f"{path}.tmp", "w") as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(f"{path}.tmp", path)
+
+
+def _stage_done(video: Video, stage: ProcessingStage) -> bool:
+    """
+    检查视频是否已完成某个处理阶段
+    """
+    return (
+        video.processing_stage is not None
+        and PROCESSING_STAGE_ORDER.index(video.processing_stage) >= PROCESSING_STAGE_ORDER.index(stage)
+    )
+
+
+def _checkpoint(db: Session, video: Video, stage: ProcessingStage):
+    """
+    记录已完成的处理阶段
+    """
+    video.processing_stage = stage
+    db.commit()
+    logger.info(f"视频 {video.id} 完成阶段: {stage.value}")
+
+
+def transcribe_video(db: Session, video: Video, work_dir: str) -> Tuple[Optional[List[Dict[str, Any]]], Optional[str]]:
+    """
+    提取视频音频并进行语音识别
+
+    识别结果按视频内容哈希和识别参数缓存，在提取音频之前查询，命中时音频提取和ASR都跳过；
+    缓存键与音频的中间格式（WAV/PCM）无关，切换 AUDIO_IN_MEMORY 后仍能命中。
+    管道模式下音频只在内存中流转，KEEP_PROCESSING_ARTIFACTS 为true时才保存PCM文件供重试时复用
+    （否则重试时重新提取，提取远比识别快）；WAV模式下识别需要读取文件，音频总是写盘
+
+    返回 (识别结果, 缓存键)，音频提取失败时识别结果为None
+    """
+    chunk_seconds = settings.AUDIO_STREAM_CHUNK_SECONDS
+    model_name = resolve_whisper_model(settings.WHISPER_MODEL)
+    
+    cache_key = make_cache_key(video.content_hash or hash_file(video.file_path), model_name)
+    cached = get_cached_transcript(cache_key)
+    if cached is not None:
+        return cached, cache_key
+    
+    if settings.AUDIO_IN_MEMORY:
+        audio_path = os.path.join(work_dir, "audio.pcm") if settings.KEEP_PROCESSING_ARTIFACTS else None
+        
+        if audio_path and _stage_done(video, ProcessingStage.AUDIO_EXTRACTED) and os.path.exists(audio_path):
+            # 从断点继续：复用上次已提取的音频
+            if chunk_seconds > 0:
+                transcript_segments = transcribe_audio_stream(_iter_pcm_chunks(audio_path, chunk_seconds), model_name)
+            else:
+                transcript_segments = transcribe_audio(_load_pcm(audio_path), model_name)
+        
+        elif chunk_seconds > 0:
+            # 通过管道边提取边识别
+            chunks = stream_audio_chunks(video.file_path, chunk_seconds)
+            if audio_path:
+                chunks = _tee_audio_chunks(chunks, audio_path)
+            transcript_segments = transcribe_audio_stream(chunks, model_name)
+            if audio_path and os.path.exists(audio_path):
+                _checkpoint(db, video, ProcessingStage.AUDIO_EXTRACTED)
+        
+        else:
+            # 通过管道读取PCM，识别直接使用内存中的音频，不必先写盘再读回
+            audio = extract_audio_array(video.file_path)
+            if audio is None:
+                return None, None
+            if audio_path:
+                _save_pcm(_to_pcm16(audio), audio_path)
+                _checkpoint(db, video, ProcessingStage.AUDIO_EXTRACTED)
+            
+            transcript_segments = transcribe_audio(audio, model_name)
+    
+    else:
+        # 提取音频到WAV文件
+        audio_path = os.path.join(work_dir, "audio.wav")
+        if not (_stage_done(video, ProcessingStage.AUDIO_EXTRACTED) and os.path.exists(audio_path)):
+            if not extract_audio(video.file_path, audio_path):
+                return None, None
+            _checkpoint(db, video, ProcessingStage.AUDIO_EXTRACTED)
+        
+        transcript_segments = transcribe_audio(audio_path, model_name)
+    
+    if transcript_segments:
+        put_cached_transcript(cache_key, transcript_segments)
+    
+    return transcript_segments, cache_key
+
+
 def vectorize_text(text: str):
     """
     将文本转换为向量表示（使用sentence-transformers）
     """
     try:
-        from sentence_transformers import SentenceTransformer
-        
         # 加载模型（这里使用中文预训练模型）
-        model = SentenceTransformer('distiluse-base-multilingual-cased-v1')
+        model = get_embedding_model()
         
         # 获取文本向量
         embedding = model.encode(text)
@@ -147,138 +508,448 @@ def vectorize_text(text: str):
         return None
 
 
-def process_video(video_id: str):
+class VideoProcessingError(Exception):
     """
-    处理上传的视频，包括提取信息、切分、转录和向量化
+    视频处理的某个阶段失败（视频已被标记为FAILED）
     """
-    # 创建数据库会话
-    db = SessionLocal()
+
+
+def _fail(db: Session, video: Video, reason: str):
+    """
+    将视频标记为处理失败并中止后续阶段
+    """
+    logger.error(reason)
+    video.processing_status = ProcessingStatus.FAILED
+    db.commit()
+    raise VideoProcessingError(reason)
+
+
+def _check_not_deleted(db: Session, video: Video):
+    """
+    重新读取删除标记（处理期间视频可能被删除），已删除时中止处理，不再发布到搜索索引
+    """
+    if db.query(Video.deleted_at).filter(Video.id == video.id).scalar() is not None:
+        _fail(db, video, f"视频已删除: {video.id}")
+
+
+def probe_stage(db: Session, video: Video):
+    """
+    阶段：获取视频信息（I/O型）
+    """
+    if _stage_done(video, ProcessingStage.PROBED):
+        return
     
-    try:
-        # 获取视频记录
-        video = db.query(Video).filter(Video.id == video_id).first()
-        if not video:
-            logger.error(f"视频不存在: {video_id}")
-            return
+    # 获取视频信息
+    video_info = get_video_info(video.file_path)
+    if not video_info:
+        _fail(db, video, f"无法获取视频信息: {video.file_path}")
+    
+    # 字幕流信息记录在元数据中，供识别阶段使用
+    subtitle_streams = video_info.pop('subtitle_streams', [])
+    video.video_metadata = {**(video.video_metadata or {}), "subtitle_streams": subtitle_streams}
+    
+    # 更新视频信息
+    for key, value in video_info.items():
+        setattr(video, key, value)
+    
+    _checkpoint(db, video, ProcessingStage.PROBED)
+
+
+def load_subtitles(video: Video) -> Tuple[Optional[List[Dict[str, Any]]], Optional[str]]:
+    """
+    读取视频的外挂字幕或内嵌文本字幕
+
+    返回 (台词片段, 来源)，没有可用字幕或要求强制语音识别时返回 (None, None)
+    """
+    metadata = video.video_metadata or {}
+    if not settings.USE_SUBTITLES or metadata.get("force_asr"):
+        return None, None
+    
+    # 优先使用用户上传的外挂字幕
+    sidecar = metadata.get("sidecar_subtitle")
+    if sidecar and os.path.exists(sidecar):
+        segments = read_subtitle_file(sidecar)
+        if segments:
+            return segments, "sidecar"
+    
+    stream = pick_subtitle_stream(metadata.get("subtitle_streams", []), settings.WHISPER_LANGUAGE)
+    if stream:
+        segments = extract_subtitle_stream(video.file_path, stream["index"])
+        if segments:
+            return segments, "embedded"
+    
+    return None, None
+
+
+def transcribe_stage(db: Session, video: Video):
+    """
+    阶段：提取音频并进行语音识别，保存台词记录（CPU密集型）
+    """
+    if _stage_done(video, ProcessingStage.TRANSCRIBED):
+        return
+    
+    work_dir = get_work_dir(video.id)
+    transcript_path = os.path.join(work_dir, "transcript.json")
+    
+    if os.path.exists(transcript_path):
+        # 上次识别已完成但台词未入库，直接使用识别结果
+        with open(transcript_path) as f:
+            transcript_segments = json.load(f)
+    else:
+        # 视频带有文本字幕时直接解析字幕，跳过音频提取和语音识别
+        transcript_segments, source = load_subtitles(video)
+        cache_key = None
         
-        # 更新处理状态
-        video.processing_status = ProcessingStatus.PROCESSING
-        db.commit()
+        if transcript_segments:
+            logger.info(f"视频 {video.id} 使用{source}字幕，跳过语音识别")
+        else:
+            source = "asr"
+            
+            # 提取音频并使用Whisper进行语音识别
+            transcript_segments, cache_key = transcribe_video(db, video, work_dir)
+            if transcript_segments is None:
+                _fail(db, video, f"提取音频失败: {video.id}")
+            
+            if not transcript_segments:
+                _fail(db, video, f"语音识别失败: {video.id}")
         
-        # 获取视频信息
-        video_info = get_video_info(video.file_path)
-        if not video_info:
-            logger.error(f"无法获取视频信息: {video.file_path}")
-            video.processing_status = ProcessingStatus.FAILED
-            db.commit()
-            return
+        _write_json(transcript_path, transcript_segments)
         
-        # 更新视频信息
-        for key, value in video_info.items():
-            setattr(video, key, value)
+        # 记录台词来源和缓存键（缓存按内容共享，不随视频删除，由容量上限淘汰）
+        video.video_metadata = {
+            **(video.video_metadata or {}),
+            "transcript_source": source,
+            "transcript_cache_key": cache_key,
+        }
+    
+    # 任务重试时先清除上次留下的台词
+    db.query(Transcript).filter(Transcript.video_id == video.id).delete(synchronize_session=False)
+    
+    # 批量写入台词记录，与阶段记录在同一个事务中提交
+    with INGEST_STEP_SECONDS.time(step="insert"):
+        bulk_insert(db, Transcript, (
+            {
+                "id": str(uuid.uuid4()),
+                "video_id": video.id,
+                "start_time": segment["start"],
+                "end_time": segment["end"],
+                "text": segment["text"],
+                "vector_id": None,
+                "confidence": segment["confidence"],
+                "segment_index": i,
+            }
+            for i, segment in enumerate(transcript_segments)
+        ))
+        _checkpoint(db, video, ProcessingStage.TRANSCRIBED)
+
+
+def embed_stage(db: Session, video: Video):
+    """
+    阶段：批量向量化台词并写入向量存储，再加入索引（CPU密集型）
+    """
+    if _stage_done(video, ProcessingStage.INDEXED):
+        return
+    
+    if not _stage_done(video, ProcessingStage.EMBEDDED):
+        transcripts = (
+            db.query(Transcript)
+            .filter(Transcript.video_id == video.id)
+            .order_by(Transcript.segment_index)
+            .all()
+        )
         
-        db.commit()
+        texts = [transcript.text for transcript in transcripts]
+        vector_ids = [str(uuid.uuid4()) for _ in transcripts]
         
-        # 创建临时目录
-        with tempfile.TemporaryDirectory() as temp_dir:
-            # 提取音频
-            audio_path = os.path.join(temp_dir, f"{video_id}.wav")
-            if not extract_audio(video.file_path, audio_path):
-                video.processing_status = ProcessingStatus.FAILED
-                db.commit()
-                return
-            
-            # 使用Whisper进行语音识别
-            transcript_segments = transcribe_audio(audio_path, settings.WHISPER_MODEL)
+        while True:
+            # 使用当前生效的那一代向量存储的模型批量向量化文本
+            generation = get_active_generation()
+            vectors = encode_texts(texts, get_generation_meta(generation)["model"])
+            if vectors is None:
+                _fail(db, video, f"向量化台词失败: {video.id}")
             
-            if not transcript_segments:
-                logger.error(f"语音识别失败: {video_id}")
-                video.processing_status = ProcessingStatus.FAILED
-                db.commit()
-                return
-            
-            # 创建视频片段目录
-            segments_dir = os.path.join(settings.VIDEOS_STORAGE_PATH, "segments")
-            os.makedirs(segments_dir, exist_ok=True)
-            
-            # 准备批量添加向量
-            all_vectors = []
-            all_vector_ids = []
-            
-            # 处理转录结果
-            for i, segment in enumerate(transcript_segments):
-                # 生成唯一ID
-                segment_id = str(uuid.uuid4())
+            with vector_store_lock():
+                if get_active_generation() != generation:
+                    # 向量化期间向量存储已切换到新一代（可能换了模型），重新向量化
+                    continue
                 
-                # 获取时间范围
-                start_time = segment["start"]
-                end_time = segment["end"]
-                text = segment["text"]
-                confidence = segment["confidence"]
+                if not save_video_vectors(video.id, vector_ids, np.asarray(vectors), generation):
+                    _fail(db, video, f"写入向量存储失败: {video.id}")
                 
-                # 创建视频片段
-                segment_path = os.path.join(segments_dir, f"{segment_id}.mp4")
-                if split_video(video.file_path, start_time, end_time, segment_path):
-                    # 创建片段记录
-                    video_segment = VideoSegment(
-                        id=segment_id,
-                        video_id=video.id,
-                        start_time=start_time,
-                        end_time=end_time,
-                        segment_path=segment_path
-                    )
-                    db.add(video_segment)
+                for transcript, vector_id in zip(transcripts, vector_ids):
+                    transcript.vector_id = vector_id
                 
-                # 向量化文本
-                text_vector = vectorize_text(text)
-                vector_id = None
+                _checkpoint(db, video, ProcessingStage.EMBEDDED)
+            break
+    
+    # 写入与向量对齐的列数据（搜索时据此组装结果），再记录到向量日志，各进程的FAISS索引据此同步
+    with INGEST_STEP_SECONDS.time(step="index"), vector_store_lock():
+        _check_not_deleted(db, video)
+        if not save_video_columns(db, video.id) or not publish_video_vectors(video.id):
+            _fail(db, video, f"向量添加失败: {video.id}")
+    
+    _checkpoint(db, video, ProcessingStage.INDEXED)
+
+
+def cut_stage(db: Session, video: Video):
+    """
+    阶段：按台词切分视频片段，完成处理（I/O型）
+    """
+    if not _stage_done(video, ProcessingStage.CUT):
+        # 创建视频片段目录
+        segments_dir = os.path.join(settings.VIDEOS_STORAGE_PATH, "segments")
+        os.makedirs(segments_dir, exist_ok=True)
+        
+        # 任务重试时先清除上次留下的片段记录（已切好的片段文件会被复用）
+        db.query(VideoSegment).filter(VideoSegment.video_id == video.id).delete(synchronize_session=False)
+        
+        transcripts = (
+            db.query(Transcript.vector_id, Transcript.start_time, Transcript.end_time)
+            .filter(Transcript.video_id == video.id)
+            .order_by(Transcript.segment_index)
+            .all()
+        )
+        
+        # 整个切分步骤计时一次（按片段计时会使步骤耗时的计数等于片段数）
+        segment_rows = []
+        with INGEST_STEP_SECONDS.time(step="cut"):
+            for vector_id, start_time, end_time in transcripts:
+                # 片段ID与台词的vector_id保持一致
+                segment_id = vector_id or str(uuid.uuid4())
+                segment_path = os.path.join(segments_dir, f"{segment_id}.mp4")
                 
-                if text_vector is not None:
-                    # 使用segment_id作为vector_id
-                    vector_id = segment_id
-                    
-                    # 将向量添加到批处理列表
-                    all_vectors.append(text_vector)
-                    all_vector_ids.append(vector_id)
+                # 创建视频片段（先写临时文件，文件存在即表示已完整切好）
+                if not os.path.exists(segment_path):
+                    tmp_path = os.path.join(segments_dir, f"{segment_id}.tmp.mp4")
+                    if not split_video(video.file_path, start_time, end_time, tmp_path):
+                        continue
+                    os.replace(tmp_path, segment_path)
                 
-                # 创建台词记录
-                transcript = Transcript(
-                    id=str(uuid.uuid4()),
-                    video_id=video.id,
-                    start_time=start_time,
-                    end_time=end_time,
-                    text=text,
-                    vector_id=vector_id,
-                    confidence=confidence,
-                    segment_index=i
+                segment_rows.append({
+                    "id": segment_id,
+                    "video_id": video.id,
+                    "start_time": start_time,
+                    "end_time": end_time,
+                    "segment_path": segment_path,
+                })
+        
+        # 批量写入片段记录
+        with INGEST_STEP_SECONDS.time(step="insert"):
+            bulk_insert(db, VideoSegment, segment_rows)
+        
+        # 一次解码生成缩略图和每个片段的关键帧精灵图（失败不影响处理结果）
+        metadata = dict(video.video_metadata or {})
+        if "preview" not in metadata:
+            with INGEST_STEP_SECONDS.time(step="preview"):
+                preview = generate_previews(
+                    video.file_path,
+                    video.id,
+                    [(start_time + end_time) / 2 for _, start_time, end_time in transcripts],
+                    video.duration or 0,
                 )
-                db.add(transcript)
-            
-            # 批量提交到数据库
-            db.commit()
-            
-            # 批量添加向量到FAISS索引
-            if all_vectors and all_vector_ids:
-                try:
-                    # 将列表转换为numpy数组
-                    vectors_array = np.array(all_vectors)
-                    # 批量添加到索引
-                    batch_add_vectors(all_vector_ids, vectors_array)
-                    logger.info(f"成功为视频 {video_id} 添加 {len(all_vectors)} 个向量到FAISS索引")
-                except Exception as e:
-                    logger.error(f"向量添加失败: {e}")
-            
-            # 更新处理状态
-            video.processing_status = ProcessingStatus.COMPLETED
+            if preview:
+                metadata["preview"] = preview
+                video.video_metadata = metadata
+    
+    # 更新处理状态（处理期间已删除的视频不再标记完成和发布视频信息）
+    _check_not_deleted(db, video)
+    video.processing_status = ProcessingStatus.COMPLETED
+    _checkpoint(db, video, ProcessingStage.CUT)
+    INGEST_AUDIO_SECONDS.inc(video.duration or 0)
+    
+    # 预览图已生成，同步到搜索使用的列存储
+    publish_video_info(video)
+    
+    # 处理完成后清理中间产物
+    if not settings.KEEP_PROCESSING_ARTIFACTS:
+        shutil.rmtree(os.path.join(settings.VIDEOS_STORAGE_PATH, "work", video.id), ignore_errors=True)
+    
+    logger.info(f"视频处理完成: {video.id}")
+
+
+# 处理阶段（按执行顺序）
+PROCESSING_STAGES = [probe_stage, transcribe_stage, embed_stage, cut_stage]
+
+
+def run_stage(video_id: str, stage):
+    """
+    在独立的数据库会话中执行一个处理阶段
+    """
+    # 创建数据库会话
+    db = SessionLocal()
+    video = None
+    stage_name = stage.__name__.removesuffix("_stage")
+    
+    try:
+        # 获取视频记录
+        video = db.query(Video).filter(Video.id == video_id).first()
+        if not video:
+            raise VideoProcessingError(f"视频不存在: {video_id}")
+        
+        if video.deleted_at is not None:
+            # 视频已被删除：停止后续阶段，交给回收任务清理
+            video.processing_status = ProcessingStatus.FAILED
             db.commit()
-            
-            logger.info(f"视频处理完成: {video_id}")
+            raise VideoProcessingError(f"视频已删除: {video_id}")
+        
+        # 更新处理状态，并显式刷新updated_at作为心跳，避免被当作卡住的任务
+        # （上一阶段已是PROCESSING时状态没有变化，不会产生UPDATE，onupdate也就不会触发）
+        video.processing_status = ProcessingStatus.PROCESSING
+        video.updated_at = datetime.utcnow()
+        db.commit()
+        
+        with INGEST_STAGE_SECONDS.time(stage=stage_name):
+            stage(db, video)
+        INGEST_STAGE_RESULTS.inc(stage=stage_name, status="completed")
+    
+    except VideoProcessingError:
+        INGEST_STAGE_RESULTS.inc(stage=stage_name, status="failed")
+        raise
     
     except Exception as e:
+        INGEST_STAGE_RESULTS.inc(stage=stage_name, status="failed")
         logger.error(f"处理视频时出错: {e}")
-        video.processing_status = ProcessingStatus.FAILED
+        db.rollback()
+        if video is not None:
+            video.processing_status = ProcessingStatus.FAILED
+            db.commit()
+        raise
+    
+    finally:
+        db.close()
+
+
+def process_video(video_id: str):
+    """
+    处理上传的视频，包括提取信息、切分、转录和向量化（在当前进程中依次执行所有阶段）
+    """
+    try:
+        for stage in PROCESSING_STAGES:
+            run_stage(video_id, stage)
+    except Exception as e:
+        logger.error(f"视频处理失败 {video_id}: {e}")
+
+
+def enqueue_video_processing(video_id: str, completed_stage: Optional[ProcessingStage] = None):
+    """
+    通过Celery分发视频处理：各阶段按资源类型进入不同的队列，依次执行
+
+    completed_stage为已完成的阶段时，只分发之后尚未完成的阶段。
+    CELERY_TASK_ALWAYS_EAGER 时各阶段在当前进程内同步执行，阶段失败的异常会直接抛到这里；
+    此时视频记录已经提交，与worker中一样标记为FAILED（可通过重试接口重新处理），不再抛给调用方
+    """
+    stage_tasks = [
+        (ProcessingStage.PROBED, probe_video_task),
+        (ProcessingStage.TRANSCRIBED, transcribe_video_task),
+        (ProcessingStage.INDEXED, embed_video_task),
+        (ProcessingStage.CUT, cut_video_task),
+    ]
+    done = PROCESSING_STAGE_ORDER.index(completed_stage) if completed_stage else -1
+    
+    workflow = chain(*[
+        task.si(video_id)
+        for stage, task in stage_tasks
+        if PROCESSING_STAGE_ORDER.index(stage) > done
+    ])
+    try:
+        return workflow.apply_async(link_error=mark_video_failed_task.si(video_id))
+    except Exception as e:
+        if not settings.CELERY_TASK_ALWAYS_EAGER:
+            raise
+        logger.error(f"视频处理失败: {video_id}: {e}")
+        mark_video_failed_task(video_id)
+        return None
+
+
+def index_cloned_video(db: Session, source_id: str, target_id: str) -> bool:
+    """
+    复用内容相同视频的向量，将复用了处理结果的视频加入搜索索引
+
+    复制失败（例如来源视频的向量分片已被回收）时把视频退回到语音识别完成的阶段并返回False，
+    由调用方重新处理：台词沿用复制的结果，从向量化阶段起重新处理
+    """
+    if clone_video_vectors(db, source_id, target_id):
+        return True
+    
+    logger.warning(f"复用向量失败，从向量化阶段起重新处理: {target_id}")
+    video = db.query(Video).filter(Video.id == target_id).first()
+    video.processing_status = ProcessingStatus.PENDING
+    video.processing_stage = ProcessingStage.TRANSCRIBED
+    db.commit()
+    return False
+
+
+def sweep_stuck_videos() -> int:
+    """
+    将长时间停留在PROCESSING状态的视频重新入队，从最近完成的阶段继续处理
+    """
+    db = SessionLocal()
+    try:
+        deadline = datetime.utcnow() - timedelta(minutes=settings.PROCESSING_STUCK_TIMEOUT_MINUTES)
+        videos = db.query(Video).filter(
+            Video.processing_status == ProcessingStatus.PROCESSING,
+            Video.updated_at < deadline,
+            Video.deleted_at.is_(None)
+        ).all()
+        
+        requeued = [(video.id, video.processing_stage) for video in videos]
+        for video in videos:
+            # 刷新updated_at，避免下一轮重复入队
+            video.updated_at = datetime.utcnow()
         db.commit()
+    finally:
+        db.close()
+    
+    for video_id, completed_stage in requeued:
+        logger.warning(f"视频处理超时，重新入队: {video_id}, 已完成阶段: {completed_stage}")
+        enqueue_video_processing(video_id, completed_stage)
     
+    return len(requeued)
+
+
+@celery_app.task
+def probe_video_task(video_id: str):
+    """
+    Celery任务：探测视频信息
+    """
+    run_stage(video_id, probe_stage)
+
+
+@celery_app.task
+def transcribe_video_task(video_id: str):
+    """
+    Celery任务：语音识别
+    """
+    run_stage(video_id, transcribe_stage)
+
+
+@celery_app.task
+def embed_video_task(video_id: str):
+    """
+    Celery任务：台词向量化
+    """
+    run_stage(video_id, embed_stage)
+
+
+@celery_app.task
+def cut_video_task(video_id: str):
+    """
+    Celery任务：切分视频片段
+    """
+    run_stage(video_id, cut_stage)
+
+
+@celery_app.task
+def mark_video_failed_task(video_id: str):
+    """
+    Celery任务：处理链中任一任务失败时将视频标记为FAILED
+    """
+    db = SessionLocal()
+    try:
+        video = db.query(Video).filter(Video.id == video_id).first()
+        if video and video.processing_status != ProcessingStatus.COMPLETED:
+            video.processing_status = ProcessingStatus.FAILED
+            db.commit()
     finally:
         db.close()
 
@@ -286,6 +957,14 @@ def process_video(video_id: str):
 @celery_app.task
 def process_video_task(video_id: str):
     """
-    Celery任务：处理视频
+    Celery任务：在一个worker中完成视频处理的所有阶段
+    """
+    return process_video(video_id)
+
+
+@celery_app.task
+def sweep_stuck_videos_task():
+    """
+    Celery定时任务：重新入队卡住的视频
     """
-    return process_video(video_id) 
\ No newline at end of file
+    return sweep_stuck_videos()
@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+"""
+搜索接口压测：登录后按目标速率（开环，不等待上一个请求返回）向 /api/v1/search/ 发送查询，
+查询从文件中按Zipf分布抽取（少数热门查询反复出现），统计各速率下的延迟分位数、错误率和吞吐量
+
+延迟从计划发送的时刻算起，服务端处理不过来时排队的时间也计入延迟。
+可用 --start-server 在本地启动应用（--workers 指定进程数，--env 覆盖缓存等配置），
+结果中记录这些设置，便于比较不同设置下的饱和点
+
+用法：
+    python benchmarks/bench_search_load.py --queries-file queries.txt --username bench --password bench --rates 5,10,20,50
+    python benchmarks/bench_search_load.py --queries-file queries.txt --start-server --workers 4 --env USER_CACHE_SIZE=0 --output results/load.json
+"""
+import os
+import sys
+import json
+import time
+import signal
+import asyncio
+import hashlib
+import argparse
+import subprocess
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+import httpx
+import numpy as np
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SEARCH_PATH = "/api/v1/search/"
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="搜索接口压测")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000", help="应用地址")
+    parser.add_argument("--queries-file", required=True, help="查询文件，每行一个查询，按热门程度从高到低排列")
+    parser.add_argument("--zipf", type=float, default=1.1, help="查询分布的Zipf指数（0表示均匀分布）")
+    parser.add_argument("--rates", default="5,10,20,50", help="目标速率（请求/秒），逗号分隔，依次测量")
+    parser.add_argument("--duration", type=float, default=30, help="每个速率的测量时长(秒)")
+    parser.add_argument("--warmup", type=float, default=5, help="每个速率开始前的预热时长(秒)，不计入结果")
+    parser.add_argument("--arrival", choices=["poisson", "uniform"], default="poisson", help="请求到达间隔的分布")
+    parser.add_argument("--limit", type=int, default=10, help="每次搜索返回的结果数")
+    parser.add_argument("--timeout", type=float, default=30, help="单个请求的超时(秒)")
+    parser.add_argument("--max-connections", type=int, default=1000, help="客户端最多同时打开的连接数")
+    parser.add_argument("--username", default="bench", help="登录的用户名")
+    parser.add_argument("--password", default="bench-password", help="登录的密码")
+    parser.add_argument("--register", action="store_true", help="登录失败时先注册该用户")
+    parser.add_argument("--start-server", action="store_true", help="在本地启动应用（uvicorn main:app），测量结束后关闭")
+    parser.add_argument("--workers", type=int, default=1, help="启动应用时的worker进程数")
+    parser.add_argument("--env", action="append", default=[], help="启动应用时覆盖的配置，例如 USER_CACHE_SIZE=0，可重复")
+    parser.add_argument("--startup-timeout", type=float, default=300, help="等待应用启动（加载模型和索引）的最长时间(秒)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="将结果保存为JSON文件")
+    return parser.parse_args()
+
+
+def load_queries(path: str) -> List[str]:
+    with open(path, encoding="utf-8") as f:
+        queries = [line.strip() for line in f if line.strip()]
+    if not queries:
+        raise SystemExit(f"查询文件为空: {path}")
+    return queries
+
+
+def query_sampler(queries: List[str], s: float, seed: int):
+    """
+    按Zipf分布抽取查询：排在第i位的查询被抽中的概率与 1/i^s 成正比
+    """
+    rng = np.random.default_rng(seed)
+    weights = 1.0 / np.arange(1, len(queries) + 1) ** s
+    cumulative = np.cumsum(weights) / weights.sum()
+
+    def sample() -> str:
+        return queries[min(int(np.searchsorted(cumulative, rng.random())), len(queries) - 1)]
+    return sample
+
+
+def start_server(args) -> subprocess.Popen:
+    """
+    在本地启动应用并等待其可以响应请求
+    """
+    port = httpx.URL(args.base_url).port or 8000
+    env = dict(os.environ)
+    for item in args.env:
+        name, _, value = item.partition("=")
+        env[name] = value
+
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--workers", str(args.workers), "--log-level", "warning"],
+        cwd=BACKEND_DIR,
+        env=env,
+        start_new_session=True,
+    )
+
+    deadline = time.monotonic() + args.startup_timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise SystemExit(f"应用启动失败，退出码 {process.returncode}")
+        try:
+            if httpx.get(f"{args.base_url}/", timeout=1).status_code == 200:
+                return process
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.5)
+
+    stop_server(process)
+    raise SystemExit(f"应用在 {args.startup_timeout:.0f} 秒内未能启动")
+
+
+def stop_server(process: subprocess.Popen):
+    # uvicorn的主进程和worker进程在同一个进程组中
+    try:
+        os.killpg(process.pid, signal.SIGTERM)
+        process.wait(timeout=30)
+    except ProcessLookupError:
+        pass
+    except subprocess.TimeoutExpired:
+        os.killpg(process.pid, signal.SIGKILL)
+        process.wait()
+
+
+def login(args) -> str:
+    """
+    登录获取访问令牌，指定 --register 时用户不存在则先注册
+    """
+    url = f"{args.base_url}/api/v1/auth/login"
+    form = {"username": args.username, "password": args.password}
+    response = httpx.post(url, data=form, timeout=args.timeout)
+
+    if response.status_code == 401 and args.register:
+        registered = httpx.post(f"{args.base_url}/api/v1/auth/register", json={
+            "username": args.username,
+            "email": f"{args.username}@bench.local",
+            "password": args.password,
+        }, timeout=args.timeout)
+        if registered.status_code not in (200, 409):
+            raise SystemExit(f"注册失败: {registered.status_code} {registered.text}")
+        response = httpx.post(url, data=form, timeout=args.timeout)
+
+    if response.status_code != 200:
+        raise SystemExit(f"登录失败: {response.status_code} {response.text}")
+    return response.json()["access_token"]
+
+
+async def run_rate(args, client: httpx.AsyncClient, sample, rate: float, duration: float, rng) -> List[Dict[str, Any]]:
+    """
+    以目标速率发送duration秒的请求（开环），返回每个请求的记录
+    """
+    records: List[Dict[str, Any]] = []
+
+    async def send(query: str, scheduled: float):
+        record = {"status": None, "error": None}
+        try:
+            response = await client.post(SEARCH_PATH, json={"query": query, "limit": args.limit})
+            record["status"] = response.status_code
+            if response.status_code == 200:
+                record["server_seconds"] = response.json().get("processing_time")
+        except httpx.HTTPError as e:
+            record["error"] = type(e).__name__
+        record["latency"] = time.perf_counter() - scheduled
+        records.append(record)
+
+    loop_start = time.perf_counter()
+    next_at = 0.0
+    tasks = []
+    while next_at < duration:
+        delay = loop_start + next_at - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.create_task(send(sample(), loop_start + next_at)))
+        next_at += rng.exponential(1.0 / rate) if args.arrival == "poisson" else 1.0 / rate
+
+    await asyncio.gather(*tasks)
+    return records
+
+
+def summarize(rate: float, duration: float, records: List[Dict[str, Any]]) -> Dict[str, Any]:
+    ok = [record for record in records if record["status"] == 200]
+    errors: Dict[str, int] = {}
+    for record in records:
+        if record["status"] != 200:
+            key = record["error"] or str(record["status"])
+            errors[key] = errors.get(key, 0) + 1
+
+    latencies_ms = np.array([record["latency"] for record in ok]) * 1000
+    server_ms = np.array([record["server_seconds"] for record in ok if record.get("server_seconds") is not None]) * 1000
+
+    def percentile(values: np.ndarray, q: float) -> Optional[float]:
+        return round(float(np.percentile(values, q)), 2) if len(values) else None
+
+    return {
+        "target_rate": rate,
+        "requests": len(records),
+        "succeeded": len(ok),
+        "error_rate": round(1 - len(ok) / len(records), 4) if records else None,
+        "errors": errors,
+        "throughput": round(len(ok) / duration, 2),
+        "p50_ms": percentile(latencies_ms, 50),
+        "p90_ms": percentile(latencies_ms, 90),
+        "p99_ms": percentile(latencies_ms, 99),
+        "max_ms": round(float(latencies_ms.max()), 2) if len(latencies_ms) else None,
+        # 服务端记录的搜索耗时，与延迟的差值主要是排队和网络时间
+        "server_p50_ms": percentile(server_ms, 50),
+        "server_p99_ms": percentile(server_ms, 99),
+    }
+
+
+async def run(args, token: str, queries: List[str]) -> List[Dict[str, Any]]:
+    sample = query_sampler(queries, args.zipf, args.seed)
+    rng = np.random.default_rng(args.seed + 1)
+    limits = httpx.Limits(max_connections=args.max_connections, max_keepalive_connections=args.max_connections)
+
+    results = []
+    async with httpx.AsyncClient(
+        base_url=args.base_url,
+        headers={"Authorization": f"Bearer {token}"},
+        timeout=args.timeout,
+        limits=limits,
+    ) as client:
+        for rate in [float(rate) for rate in args.rates.split(",")]:
+            if args.warmup > 0:
+                await run_rate(args, client, sample, rate, args.warmup, rng)
+            records = await run_rate(args, client, sample, rate, args.duration, rng)
+            result = summarize(rate, args.duration, records)
+            results.append(result)
+            print(
+                f"目标 {rate:>7.1f} 请求/秒  实际 {result['throughput']:>7.1f}  "
+                f"p50 {result['p50_ms'] or 0:>8.1f} ms  p90 {result['p90_ms'] or 0:>8.1f} ms  "
+                f"p99 {result['p99_ms'] or 0:>8.1f} ms  错误率 {result['error_rate']:.2%}"
+            )
+    return results
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def main():
+    args = parse_args()
+    queries = load_queries(args.queries_file)
+
+    server = start_server(args) if args.start_server else None
+    try:
+        token = login(args)
+        results = asyncio.run(run(args, token, queries))
+    finally:
+        if server is not None:
+            stop_server(server)
+
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w") as f:
+            json.dump({
+                "benchmark": "search_load",
+                "commit": git_commit(),
+                "created_at": datetime.now().isoformat(),
+                "params": {
+                    **{key: value for key, value in vars(args).items() if key != "password"},
+                    "queries": len(queries),
+                    "queries_sha256": hashlib.sha256("\n".join(queries).encode()).hexdigest(),
+                },
+                # 只有本地启动时才知道服务端的进程数和配置
+                "server": {"workers": args.workers, "env": args.env} if args.start_server else None,
+                "results": results,
+            }, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    main()
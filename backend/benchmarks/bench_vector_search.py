@@ -0,0 +1,308 @@
+#!/usr/bin/env python3
+"""
+向量搜索基准测试：用合成的归一化向量和按Zipf分布的视频归属构建索引，测量各索引配置下
+搜索的延迟（p50/p99）、不同并发下的QPS、内存占用，以及相对精确搜索的recall@k
+
+搜索经过 app.services.vector_search 中的实际代码路径（索引锁、自适应候选数、列存储过滤），
+只有查询向量化被替换为直接返回合成的查询向量
+
+用法：
+    python benchmarks/bench_vector_search.py --sizes 100000,1000000 --output results/vector_search.json
+    python benchmarks/bench_vector_search.py --sizes 10000000 --dim 256 --queries 200 --concurrency 1,8
+"""
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import tempfile
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Dict, List
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# 生成向量和计算精确结果时每块的向量数（同一位置的块每次生成的内容相同，无需把语料保存在内存中）
+CHUNK_SIZE = 20000
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="向量搜索基准测试")
+    parser.add_argument("--sizes", default="100000", help="索引中的向量（台词）数，逗号分隔，例如 100000,1000000,10000000")
+    parser.add_argument("--dim", type=int, default=512, help="向量维度")
+    parser.add_argument("--configs", default="flat,flat-gpu", help="索引配置：flat（CPU）、flat-gpu（GPU，FP16存储，无GPU时跳过）")
+    parser.add_argument("--modes", default="ann,owner", help="搜索方式：ann（不过滤的top-k）、owner（按用户过滤，与搜索接口相同）")
+    parser.add_argument("--queries", type=int, default=500, help="每组测量的查询数")
+    parser.add_argument("--k", type=int, default=10, help="每次搜索返回的结果数")
+    parser.add_argument("--concurrency", default="1,4,16", help="并发线程数，逗号分隔")
+    parser.add_argument("--owners", type=int, default=1000, help="用户数")
+    parser.add_argument("--owner-skew", type=float, default=1.1, help="视频归属的Zipf分布指数（越大越集中在少数用户）")
+    parser.add_argument("--segments-per-video", type=int, default=200, help="每个视频的台词数")
+    parser.add_argument("--clusters", type=int, default=1000, help="合成向量的聚类中心数")
+    parser.add_argument("--noise", type=float, default=1.0, help="向量偏离聚类中心的程度")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="将结果保存为JSON文件")
+    return parser.parse_args()
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def make_centers(args) -> np.ndarray:
+    rng = np.random.default_rng([args.seed, 0])
+    return _normalize(rng.standard_normal((args.clusters, args.dim)).astype(np.float32))
+
+
+def make_chunk(args, centers: np.ndarray, chunk: int, count: int) -> np.ndarray:
+    """
+    生成第chunk块的向量：随机聚类中心加上噪声后归一化
+    """
+    rng = np.random.default_rng([args.seed, 1, chunk])
+    labels = rng.integers(0, len(centers), count)
+    noise = rng.standard_normal((count, args.dim)).astype(np.float32) * (args.noise / np.sqrt(args.dim))
+    return _normalize(centers[labels] + noise)
+
+
+def make_queries(args, centers: np.ndarray) -> np.ndarray:
+    rng = np.random.default_rng([args.seed, 2])
+    labels = rng.integers(0, len(centers), args.queries)
+    noise = rng.standard_normal((args.queries, args.dim)).astype(np.float32) * (args.noise / np.sqrt(args.dim))
+    return _normalize(centers[labels] + noise)
+
+
+def make_owners(args, video_count: int):
+    """
+    按Zipf分布为每个视频分配用户，查询的用户按同一分布抽取（视频多的用户搜索也多）
+    """
+    rng = np.random.default_rng([args.seed, 3])
+    weights = 1.0 / np.arange(1, args.owners + 1) ** args.owner_skew
+    weights /= weights.sum()
+    video_owners = rng.choice(args.owners, size=video_count, p=weights).astype(np.int32)
+    query_owners = rng.choice(args.owners, size=args.queries, p=weights).astype(np.int32)
+    return video_owners, query_owners
+
+
+def exact_top_k(args, centers, size, queries, position_owners, query_owners):
+    """
+    分块暴力计算精确的top-k：不过滤的结果和只保留查询用户自己视频的结果
+    """
+    k = args.k
+    best = {
+        "ann": (np.full((len(queries), k), -np.inf, dtype=np.float32), np.full((len(queries), k), -1, dtype=np.int64)),
+        "owner": (np.full((len(queries), k), -np.inf, dtype=np.float32), np.full((len(queries), k), -1, dtype=np.int64)),
+    }
+
+    for chunk, start in enumerate(range(0, size, CHUNK_SIZE)):
+        count = min(CHUNK_SIZE, size - start)
+        scores = queries @ make_chunk(args, centers, chunk, count).T
+        positions = np.arange(start, start + count)
+
+        for mode in best:
+            if mode == "owner":
+                scores = np.where(position_owners[start:start + count][None, :] == query_owners[:, None], scores, -np.inf)
+            best_scores, best_positions = best[mode]
+            merged_scores = np.concatenate([best_scores, scores], axis=1)
+            merged_positions = np.concatenate([best_positions, np.broadcast_to(positions, scores.shape)], axis=1)
+            top = np.argpartition(-merged_scores, k - 1, axis=1)[:, :k]
+            best[mode] = (
+                np.take_along_axis(merged_scores, top, axis=1),
+                np.take_along_axis(merged_positions, top, axis=1),
+            )
+
+    return {
+        mode: [set(row[scores_row > -np.inf].tolist()) for row, scores_row in zip(positions, scores)]
+        for mode, (scores, positions) in best.items()
+    }
+
+
+def build_index(args, config: str, size: int, centers: np.ndarray, video_owners: np.ndarray) -> Dict[str, Any]:
+    """
+    直接构建本进程的向量索引和列存储（与从向量日志加载后的状态相同），返回构建耗时和内存占用
+    """
+    import faiss
+    from app.core.metrics import _resident_memory_bytes
+    from app.services import vector_search
+    from app.services.vector_search import COLUMN_DTYPE, ColumnStore
+
+    rss_before = _resident_memory_bytes()
+    start = time.perf_counter()
+
+    index = vector_search._create_index(args.dim) if config == "flat-gpu" else faiss.IndexFlatIP(args.dim)
+    store = ColumnStore()
+    ranges = {}
+    spv = args.segments_per_video
+
+    for chunk, chunk_start in enumerate(range(0, size, CHUNK_SIZE)):
+        count = min(CHUNK_SIZE, size - chunk_start)
+        index.add(make_chunk(args, centers, chunk, count))
+
+    created_at = datetime(2024, 1, 1)
+    for video, start_position in enumerate(range(0, size, spv)):
+        count = min(spv, size - start_position)
+        video_id = f"video-{video}"
+        columns = np.zeros(count, dtype=COLUMN_DTYPE)
+        columns["start_time"] = np.arange(count) * 3.0
+        columns["end_time"] = columns["start_time"] + 2.5
+        columns["confidence"] = 0.9
+        columns["segment_index"] = np.arange(count)
+        info = {
+            "title": video_id,
+            "description": None,
+            "duration": count * 3.0,
+            "owner_id": f"user-{video_owners[video]}",
+            "created_at": created_at.isoformat(),
+            "preview": None,
+        }
+        # 台词ID直接使用索引位置，便于与精确结果比较
+        store.add_video(video_id, count, info, columns, [""] * count, list(range(start_position, start_position + count)))
+        ranges[video_id] = (start_position, start_position + count)
+
+    with vector_search._index_lock:
+        vector_search._vector_index = index
+        vector_search._vector_ids = [None] * size
+        vector_search._column_store = store
+        vector_search._video_ranges.clear()
+        vector_search._video_ranges.update(ranges)
+        vector_search._generation = ""
+        vector_search._log_offset = 0
+        vector_search._index_initialized = True
+        vector_search._filter_selectivity.clear()
+
+    return {
+        "build_seconds": round(time.perf_counter() - start, 3),
+        "rss_delta_bytes": int(_resident_memory_bytes() - rss_before),
+        "index_bytes": vector_search._index_bytes(),
+        "column_store_bytes": store.nbytes(),
+    }
+
+
+def run_queries(mode: str, queries: np.ndarray, query_owners: np.ndarray, k: int, concurrency: int):
+    """
+    并发执行全部查询，返回 (每个查询的耗时, 每个查询返回的索引位置, 总耗时)
+    """
+    from app.services import vector_search
+
+    def search(i: int):
+        start = time.perf_counter()
+        if mode == "ann":
+            with vector_search._index_lock:
+                positions = [position for position, _ in vector_search._search_index(queries[i], k)]
+        else:
+            results, _ = vector_search.search_transcripts(None, f"user-{query_owners[i]}", str(i), limit=k, min_confidence=0.0)
+            positions = [result["id"] for result in results]
+        return time.perf_counter() - start, positions
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        outcomes = list(executor.map(search, range(len(queries))))
+    wall = time.perf_counter() - start
+
+    return [latency for latency, _ in outcomes], [positions for _, positions in outcomes], wall
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def main():
+    args = parse_args()
+
+    # 必须在导入app之前设置：使用空的向量存储目录，同步向量日志时不会加载其他数据
+    os.environ["VECTOR_STORE_PATH"] = tempfile.mkdtemp(prefix="bench_vectors_")
+    logging.getLogger("app").setLevel(logging.WARNING)
+
+    import faiss
+    from app.core.config import settings
+    from app.services import vector_search
+
+    sizes = [int(size) for size in args.sizes.split(",")]
+    configs = args.configs.split(",")
+    modes = args.modes.split(",")
+    concurrency_levels = [int(level) for level in args.concurrency.split(",")]
+
+    if "flat-gpu" in configs and faiss.get_num_gpus() == 0:
+        print("未检测到GPU，跳过 flat-gpu")
+        configs.remove("flat-gpu")
+
+    centers = make_centers(args)
+    queries = make_queries(args, centers)
+    # 查询向量化替换为按编号返回合成的查询向量
+    vector_search.vectorize_query = lambda text: queries[int(text)]
+
+    results: List[Dict[str, Any]] = []
+    for size in sizes:
+        video_count = (size + args.segments_per_video - 1) // args.segments_per_video
+        video_owners, query_owners = make_owners(args, video_count)
+        position_owners = np.repeat(video_owners, args.segments_per_video)[:size]
+
+        start = time.perf_counter()
+        truth = exact_top_k(args, centers, size, queries, position_owners, query_owners)
+        print(f"[{size}] 精确结果计算完成，耗时 {time.perf_counter() - start:.1f} 秒")
+
+        for config in configs:
+            build = build_index(args, config, size, centers, video_owners)
+            print(
+                f"[{size}] {config}: 构建 {build['build_seconds']} 秒，"
+                f"常驻内存增加 {build['rss_delta_bytes'] / 1024 / 1024:.0f} MB"
+            )
+
+            for mode in modes:
+                for concurrency in concurrency_levels:
+                    # 先预热一轮（GPU初始化、用户过滤比例的估计）
+                    run_queries(mode, queries[:min(20, len(queries))], query_owners, args.k, concurrency)
+                    latencies, returned, wall = run_queries(mode, queries, query_owners, args.k, concurrency)
+
+                    recalls = [
+                        len(set(positions) & expected) / len(expected)
+                        for positions, expected in zip(returned, truth[mode])
+                        if expected
+                    ]
+                    latencies_ms = np.array(latencies) * 1000
+                    result = {
+                        "size": size,
+                        "config": config,
+                        "mode": mode,
+                        "concurrency": concurrency,
+                        "queries": len(queries),
+                        "p50_ms": round(float(np.percentile(latencies_ms, 50)), 3),
+                        "p99_ms": round(float(np.percentile(latencies_ms, 99)), 3),
+                        "qps": round(len(queries) / wall, 1),
+                        f"recall_at_{args.k}": round(float(np.mean(recalls)), 4) if recalls else None,
+                        **build,
+                    }
+                    results.append(result)
+                    print(
+                        f"  {mode:<6} 并发 {concurrency:>3}: p50 {result['p50_ms']:>8.2f} ms  "
+                        f"p99 {result['p99_ms']:>8.2f} ms  {result['qps']:>8.1f} QPS  "
+                        f"recall@{args.k} {result[f'recall_at_{args.k}']}"
+                    )
+
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w") as f:
+            json.dump({
+                "benchmark": "vector_search",
+                "commit": git_commit(),
+                "created_at": datetime.now().isoformat(),
+                "faiss_version": faiss.__version__,
+                "params": {
+                    **vars(args),
+                    "search_max_candidates": settings.SEARCH_MAX_CANDIDATES,
+                    "search_growth_factor": settings.SEARCH_GROWTH_FACTOR,
+                },
+                "results": results,
+            }, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
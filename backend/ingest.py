@@ -0,0 +1,310 @@
+#!/usr/bin/env python3
+"""
+批量导入视频的脚本：扫描目录或清单文件，批量登记视频记录，并用进程池并行处理
+
+用法：
+    python ingest.py /data/archive --owner admin@example.com --workers 4
+    python ingest.py --manifest archive.jsonl --owner admin@example.com
+
+清单文件每行一个JSON对象（{"path": ..., "title": ..., "description": ...}）或一个文件路径。
+已导入的文件（同一用户下内容哈希相同）会被跳过；中断后重新执行同一命令即可继续，
+未处理完成的视频从最近完成的阶段继续处理
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import logging
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Any, Dict, Iterator, List
+
+# 配置日志
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="批量导入视频")
+    parser.add_argument("directory", nargs="?", help="要导入的视频目录（递归扫描）")
+    parser.add_argument("--manifest", help="清单文件（JSON Lines或每行一个路径），与目录二选一")
+    parser.add_argument("--owner", required=True, help="视频所属用户的邮箱")
+    parser.add_argument("--workers", type=int, default=1, help="并行处理视频的进程数")
+    parser.add_argument("--batch-size", type=int, default=100, help="每批登记的视频数")
+    parser.add_argument(
+        "--state",
+        default="ingest_state.jsonl",
+        help="记录已登记文件的状态文件，重新执行时据此跳过已计算过哈希的文件"
+    )
+    parser.add_argument("--retry-failed", action="store_true", help="重新处理之前失败的视频")
+    parser.add_argument("--register-only", action="store_true", help="只登记视频，不进行处理")
+    args = parser.parse_args()
+
+    if bool(args.directory) == bool(args.manifest):
+        parser.error("请指定视频目录或 --manifest 之一")
+    return args
+
+
+def iter_directory(directory: str, extensions: List[str]) -> Iterator[Dict[str, Any]]:
+    """
+    递归扫描目录中支持格式的视频文件（按路径排序，保证每次执行顺序一致）
+    """
+    for root, dirs, files in os.walk(directory):
+        dirs.sort()
+        for name in sorted(files):
+            if os.path.splitext(name)[1].lower() in extensions:
+                yield {"path": os.path.join(root, name)}
+
+
+def iter_manifest(manifest: str) -> Iterator[Dict[str, Any]]:
+    """
+    读取清单文件，相对路径相对于清单文件所在目录
+    """
+    base_dir = os.path.dirname(os.path.abspath(manifest))
+    with open(manifest) as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            entry = json.loads(line) if line.startswith("{") else {"path": line}
+            entry["path"] = os.path.join(base_dir, entry["path"])
+            yield entry
+
+
+def load_state(state_path: str) -> Dict[str, Dict[str, Any]]:
+    """
+    读取状态文件：文件路径 -> {size, mtime, content_hash, video_id}
+    """
+    state = {}
+    if os.path.exists(state_path):
+        with open(state_path) as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # 中断时可能留下不完整的最后一行
+                    continue
+                state[record["path"]] = record
+    return state
+
+
+def init_worker():
+    """
+    子进程初始化：丢弃从父进程继承的数据库连接，由子进程重新建立
+    """
+    from app.db.session import engine
+    engine.dispose(close=False)
+
+
+def process_one(video_id: str):
+    """
+    在子进程中处理一个视频，返回 (视频ID, 处理状态, 时长)
+    """
+    from app.db.session import SessionLocal
+    from app.models.video import Video
+    from app.services.video_processing import process_video
+
+    process_video(video_id)
+
+    db = SessionLocal()
+    try:
+        video = db.query(Video).filter(Video.id == video_id).first()
+        return video_id, video.processing_status.value, video.duration or 0.0
+    finally:
+        db.close()
+
+
+def register_videos(db, entries: List[Dict[str, Any]], owner_id: str, state: Dict[str, Dict[str, Any]], state_file) -> int:
+    """
+    将一批文件复制到存储中并批量登记视频记录，返回新登记的视频数
+
+    同一用户下已有相同内容的视频时跳过；其他用户已处理完成的相同视频直接复用处理结果
+    """
+    from app.db.bulk import bulk_insert
+    from app.models.video import Video, ProcessingStatus
+    from app.services import storage
+    from app.services.video_processing import index_cloned_video
+
+    rows = []
+    duplicates = []
+    updated = []
+    owned_hashes = {}  # 本批新登记的内容哈希 -> 视频ID
+
+    for entry in entries:
+        path = entry["path"]
+        stat = os.stat(path)
+        record = state.get(path)
+        if record and record["size"] == stat.st_size and record["mtime"] == stat.st_mtime:
+            # 状态文件中已记录且文件未变化：不再读取文件
+            continue
+
+        # 复制到临时文件的同时计算哈希，只读一遍源文件
+        with open(path, "rb") as source:
+            tmp_path, content_hash, file_size = storage.save_upload(source)
+
+        existing = db.query(Video.id).filter(
+            Video.owner_id == owner_id,
+            Video.content_hash == content_hash,
+            Video.deleted_at.is_(None)
+        ).first()
+        if existing or content_hash in owned_hashes:
+            os.remove(tmp_path)
+            video_id = existing[0] if existing else owned_hashes[content_hash]
+            logger.info(f"跳过已导入的文件: {path}")
+        else:
+            video_id = str(uuid.uuid4())
+            file_ext = os.path.splitext(path)[1].lower()
+            rows.append({
+                "id": video_id,
+                "title": entry.get("title") or os.path.splitext(os.path.basename(path))[0],
+                "description": entry.get("description"),
+                "file_path": storage.store_file(db, tmp_path, content_hash, file_ext),
+                "content_hash": content_hash,
+                "file_size": file_size,
+                "owner_id": owner_id,
+                "processing_status": ProcessingStatus.PENDING.name,  # 与ORM一致按枚举名存储
+            })
+            owned_hashes[content_hash] = video_id
+
+            duplicate = storage.find_completed_duplicate(db, content_hash)
+            if duplicate:
+                duplicates.append((duplicate.id, video_id))
+
+        state[path] = {
+            "path": path,
+            "size": stat.st_size,
+            "mtime": stat.st_mtime,
+            "content_hash": content_hash,
+            "video_id": video_id,
+        }
+        updated.append(state[path])
+
+    bulk_insert(db, Video, rows)
+    db.flush()
+
+    for source_id, target_id in duplicates:
+        source = db.query(Video).filter(Video.id == source_id).first()
+        target = db.query(Video).filter(Video.id == target_id).first()
+        storage.clone_processed_video(db, source, target)
+
+    db.commit()
+
+    # 复用已有视频的向量，加入搜索索引；复用失败的视频退回待处理，在第二步中重新向量化
+    for source_id, target_id in duplicates:
+        index_cloned_video(db, source_id, target_id)
+
+    # 数据库提交成功后再写状态文件，中断时最多重新计算一批文件的哈希
+    for record in updated:
+        state_file.write(json.dumps(record) + "\n")
+    state_file.flush()
+
+    return len(rows)
+
+
+def main():
+    args = parse_args()
+
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from app.core.config import settings
+    from app.db.session import SessionLocal
+    from app.models.user import User
+    from app.models.video import Video, ProcessingStatus
+    from app.services.uploads import SUPPORTED_VIDEO_EXTENSIONS
+
+    db = SessionLocal()
+    try:
+        owner = db.query(User).filter(User.email == args.owner).first()
+        if not owner:
+            logger.error(f"用户不存在: {args.owner}")
+            return 1
+
+        if args.directory:
+            entries = iter_directory(args.directory, SUPPORTED_VIDEO_EXTENSIONS)
+        else:
+            entries = iter_manifest(args.manifest)
+
+        # 第一步：批量登记
+        state = load_state(args.state)
+        registered = 0
+        with open(args.state, "a") as state_file:
+            batch = []
+            for entry in entries:
+                batch.append(entry)
+                if len(batch) >= args.batch_size:
+                    registered += register_videos(db, batch, owner.id, state, state_file)
+                    batch = []
+            if batch:
+                registered += register_videos(db, batch, owner.id, state, state_file)
+        logger.info(f"新登记视频: {registered} 个")
+
+        if args.register_only:
+            return 0
+
+        # 第二步：处理本次导入涉及的、尚未完成的视频（包括上次中断的视频）
+        statuses = [ProcessingStatus.PENDING, ProcessingStatus.PROCESSING]
+        if args.retry_failed:
+            statuses.append(ProcessingStatus.FAILED)
+        video_ids = {record["video_id"] for record in state.values() if record.get("video_id")}
+        pending = [
+            video_id for (video_id,) in db.query(Video.id).filter(
+                Video.owner_id == owner.id,
+                Video.processing_status.in_(statuses),
+                Video.deleted_at.is_(None)
+            )
+            if video_id in video_ids
+        ]
+    finally:
+        db.close()
+
+    # 每个进程都会在GPU上加载一份Whisper模型，进程数受显存限制
+    workers = min(args.workers, settings.WHISPER_MAX_PROCESSES)
+    if workers < args.workers:
+        logger.warning(f"进程数受 WHISPER_MAX_PROCESSES 限制，从 {args.workers} 降为 {workers}")
+
+    logger.info(f"待处理视频: {len(pending)} 个，进程数: {workers}")
+    if not pending:
+        return 0
+
+    start_time = time.time()
+    completed = failed = 0
+    audio_seconds = 0.0
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker) as executor:
+        futures = [executor.submit(process_one, video_id) for video_id in pending]
+        for future in as_completed(futures):
+            try:
+                video_id, status, duration = future.result()
+            except Exception as e:
+                logger.error(f"处理进程出错: {e}")
+                failed += 1
+                continue
+
+            if status == ProcessingStatus.COMPLETED.value:
+                completed += 1
+                audio_seconds += duration
+            else:
+                failed += 1
+                logger.warning(f"视频处理未完成: {video_id}, 状态: {status}")
+
+            # 第一个视频可能立即返回（例如已经处理完成），避免除以0
+            elapsed_hours = max(time.time() - start_time, 1e-3) / 3600
+            logger.info(
+                f"进度: {completed + failed}/{len(pending)}，"
+                f"{completed / elapsed_hours:.1f} 个视频/小时，"
+                f"{audio_seconds / 3600 / elapsed_hours:.2f} 音频小时/小时"
+            )
+
+    elapsed = time.time() - start_time
+    logger.info(
+        f"处理结束: 成功 {completed} 个，失败 {failed} 个，耗时 {elapsed:.0f} 秒，"
+        f"共 {audio_seconds / 3600:.2f} 小时音频"
+    )
+    return 0 if failed == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -33,6 +33,7 @@ CREATE TABLE IF NOT EXISTS videos (
     title VARCHAR NOT NULL,
     description TEXT,
     file_path VARCHAR NOT NULL,
+    content_hash VARCHAR,
     duration FLOAT,
     file_size INTEGER,
     format VARCHAR,
@@ -41,7 +42,9 @@ CREATE TABLE IF NOT EXISTS videos (
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     owner_id VARCHAR REFERENCES users(id),
     processing_status VARCHAR,
-    video_metadata JSONB
+    processing_stage VARCHAR,
+    video_metadata JSONB,
+    deleted_at TIMESTAMP
 );
 
 -- 创建video_segments表
@@ -67,11 +70,26 @@ CREATE TABLE IF NOT EXISTS transcripts (
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
+-- 为已存在的表补充新增的列
+ALTER TABLE videos ADD COLUMN IF NOT EXISTS content_hash VARCHAR;
+ALTER TABLE videos ADD COLUMN IF NOT EXISTS processing_stage VARCHAR;
+ALTER TABLE videos ADD COLUMN IF NOT EXISTS deleted_at TIMESTAMP;
+
 -- 创建索引
 CREATE INDEX IF NOT EXISTS idx_videos_title ON videos (title);
 CREATE INDEX IF NOT EXISTS idx_videos_owner ON videos (owner_id);
+-- 按用户分页列出视频（游标分页的排序键）
+CREATE INDEX IF NOT EXISTS idx_videos_owner_created ON videos (owner_id, created_at, id);
+CREATE INDEX IF NOT EXISTS idx_videos_content_hash ON videos (content_hash);
+CREATE INDEX IF NOT EXISTS idx_videos_status_updated ON videos (processing_status, updated_at);
+-- 回收任务查找已删除的视频
+CREATE INDEX IF NOT EXISTS idx_videos_deleted ON videos (deleted_at) WHERE deleted_at IS NOT NULL;
 CREATE INDEX IF NOT EXISTS idx_video_segments_video ON video_segments (video_id);
+-- 分页列出视频的片段；包含end_time，统计片段时长时只需读索引
+CREATE INDEX IF NOT EXISTS idx_video_segments_video_start ON video_segments (video_id, start_time, id) INCLUDE (end_time);
 CREATE INDEX IF NOT EXISTS idx_transcripts_video ON transcripts (video_id);
+-- 按时间顺序分页列出视频的台词
+CREATE INDEX IF NOT EXISTS idx_transcripts_video_start ON transcripts (video_id, start_time, id);
 """
 
 def init_db():
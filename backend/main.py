@@ -1,11 +1,14 @@
 import os
-from fastapi import FastAPI, Response
+from fastapi import Depends, FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import JSONResponse
 
-from app.api.endpoints import auth, videos, search
+from app.api import deps
+from app.api.endpoints import auth, videos, search, media
+from app.api.profiling import PROFILE_FILE_HEADER, ProfilingMiddleware
 from app.core.config import settings
+from app.core.metrics import render_metrics
 from app.db.session import engine, Base
 from app.services.vector_search import init_vector_search
 
@@ -15,6 +18,9 @@ app = FastAPI(
     openapi_url=f"{settings.API_V1_STR}/openapi.json"
 )
 
+# 超级用户按请求进行性能分析（在CORS之内，分析结果的响应同样带有CORS头）
+app.add_middleware(ProfilingMiddleware)
+
 # 配置CORS
 if settings.BACKEND_CORS_ORIGINS:
     app.add_middleware(
@@ -23,6 +29,7 @@ if settings.BACKEND_CORS_ORIGINS:
         allow_credentials=True,
         allow_methods=["*"],
         allow_headers=["*"],
+        expose_headers=["X-Next-Cursor", "ETag", "Content-Range", "Accept-Ranges", PROFILE_FILE_HEADER],
     )
 
 # 创建必要的目录
@@ -37,6 +44,7 @@ app.mount("/static", StaticFiles(directory=settings.STATIC_DIR), name="static")
 app.include_router(auth.router, prefix=f"{settings.API_V1_STR}/auth", tags=["认证"])
 app.include_router(videos.router, prefix=f"{settings.API_V1_STR}/videos", tags=["视频"])
 app.include_router(search.router, prefix=f"{settings.API_V1_STR}/search", tags=["搜索"])
+app.include_router(media.router, prefix=f"{settings.API_V1_STR}/media", tags=["媒体"])
 
 
 @app.on_event("startup")
@@ -48,6 +56,16 @@ async def startup():
     init_vector_search()
 
 
+@app.get("/metrics", include_in_schema=False, dependencies=[Depends(deps.check_metrics_access)])
+def metrics():
+    """
+    Prometheus格式的指标：搜索和视频处理各阶段的耗时、索引大小和内存占用
+
+    需要 METRICS_TOKEN 或超级用户的访问令牌
+    """
+    return Response(content=render_metrics(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
 @app.get("/")
 def root():
     content = {"message": "欢迎使用视频台词搜索API"}
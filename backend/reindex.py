@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+重建向量索引的脚本：用指定模型重新向量化全部台词，构建新一代索引后原子切换
+
+用法：
+    python reindex.py --model paraphrase-multilingual-MiniLM-L12-v2
+    python reindex.py --background          # 交给Celery的ingest_cpu队列在后台执行
+    python reindex.py --status              # 查看最近一次重建的进度
+    python reindex.py --from-store          # 直接用已保存的向量重建索引，不运行模型
+
+重建期间搜索继续使用旧索引；中断后重新执行同一命令会从中断处继续
+"""
+import os
+import sys
+import json
+import logging
+import argparse
+
+# 配置日志
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="重建向量索引")
+    parser.add_argument("--model", help="使用的向量化模型，默认为配置中的EMBEDDING_MODEL")
+    parser.add_argument("--batch-size", type=int, help="每批读取并向量化的台词数")
+    parser.add_argument("--background", action="store_true", help="通过Celery在后台执行")
+    parser.add_argument("--status", action="store_true", help="只查看最近一次重建的进度")
+    parser.add_argument("--from-store", action="store_true", help="用已保存的向量分片重建，不重新向量化")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from app.services.reindex import get_reindex_progress, rebuild_from_store, reindex_vectors, reindex_vectors_task
+
+    if args.status:
+        progress = get_reindex_progress()
+        print(json.dumps(progress, ensure_ascii=False, indent=2) if progress else "没有重建记录")
+        return 0
+
+    if args.from_store:
+        generation = rebuild_from_store()
+        logger.info(f"当前生效的向量存储: {generation}")
+        return 0
+
+    if args.background:
+        result = reindex_vectors_task.delay(args.model)
+        logger.info(f"重建任务已提交: {result.id}")
+        return 0
+
+    generation = reindex_vectors(args.model, batch_size=args.batch_size)
+    logger.info(f"当前生效的向量存储: {generation}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,137 @@
+"""
+测试公共设置：使用临时目录中的SQLite和向量存储，Celery任务在当前进程中同步执行，
+Redis指向不可用的端口（依赖Redis的缓存和共享指标会退化为只在本进程中工作）
+"""
+import os
+import shutil
+import tempfile
+import uuid
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+# 必须在导入app之前设置
+_TMP_DIR = tempfile.mkdtemp(prefix="videosearch_test_")
+os.environ.update({
+    "DATABASE_URL": f"sqlite:///{os.path.join(_TMP_DIR, 'test.db')}",
+    "VIDEOS_STORAGE_PATH": os.path.join(_TMP_DIR, "videos"),
+    "VECTOR_STORE_PATH": os.path.join(_TMP_DIR, "vectors"),
+    "TRANSCRIPT_CACHE_DIR": os.path.join(_TMP_DIR, "transcripts"),
+    "PROFILE_DIR": os.path.join(_TMP_DIR, "profiles"),
+    "STATIC_DIR": os.path.join(_TMP_DIR, "static"),
+    "REDIS_PORT": "1",
+    "CELERY_TASK_ALWAYS_EAGER": "true",
+})
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+from app.core import security  # noqa: E402
+from app.db.session import Base, SessionLocal, engine  # noqa: E402
+from app.models import User, Video, VideoSegment, Transcript, ProcessingStatus  # noqa: E402
+from app.services import transcript_cache, user_cache, vector_search  # noqa: E402
+from main import app  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def _clean_state():
+    """
+    每个测试使用空的数据库、存储目录和本进程索引
+    """
+    Base.metadata.create_all(bind=engine)
+    vector_search.reset_index()
+    transcript_cache._cache_bytes = None
+    with user_cache._local_lock:
+        user_cache._local_cache.clear()
+    yield
+    Base.metadata.drop_all(bind=engine)
+    for name in ("videos", "vectors", "transcripts", "profiles", "static"):
+        shutil.rmtree(os.path.join(_TMP_DIR, name), ignore_errors=True)
+
+
+@pytest.fixture
+def db():
+    session = SessionLocal()
+    yield session
+    session.close()
+
+
+@pytest.fixture
+def client():
+    return TestClient(app)
+
+
+def make_user(db, superuser: bool = False, active: bool = True) -> User:
+    user_id = str(uuid.uuid4())
+    user = User(
+        id=user_id,
+        email=f"{user_id}@test.local",
+        username=user_id,
+        hashed_password="x",
+        is_active=active,
+        is_superuser=superuser,
+    )
+    db.add(user)
+    db.commit()
+    return user
+
+
+def auth_headers(user: User) -> dict:
+    return {"Authorization": f"Bearer {security.create_access_token(user.id)}"}
+
+
+def make_video(db, owner: User, segments: int = 0, **fields) -> Video:
+    """
+    创建一个已处理完成的视频，视频文件和片段文件写在存储目录中
+    """
+    video_id = str(uuid.uuid4())
+    storage_dir = os.environ["VIDEOS_STORAGE_PATH"]
+    os.makedirs(os.path.join(storage_dir, "segments"), exist_ok=True)
+    file_path = os.path.join(storage_dir, f"{video_id}.mp4")
+    with open(file_path, "wb") as f:
+        f.write(b"\0" * 1024)
+
+    values = {
+        "title": "测试视频",
+        "file_path": file_path,
+        "content_hash": uuid.uuid4().hex,
+        "duration": 60.0,
+        "owner_id": owner.id,
+        "processing_status": ProcessingStatus.COMPLETED,
+        "created_at": datetime.utcnow(),
+    }
+    values.update(fields)
+    video = Video(id=video_id, **values)
+    db.add(video)
+    db.flush()
+
+    for i in range(segments):
+        segment_id = str(uuid.uuid4())
+        segment_path = os.path.join(storage_dir, "segments", f"{segment_id}.mp4")
+        with open(segment_path, "wb") as f:
+            f.write(b"\0" * 128)
+        db.add(VideoSegment(
+            id=segment_id, video_id=video_id, start_time=i * 2.0, end_time=i * 2.0 + 1.5, segment_path=segment_path
+        ))
+        db.add(Transcript(
+            id=str(uuid.uuid4()), video_id=video_id, start_time=i * 2.0, end_time=i * 2.0 + 1.5,
+            text=f"第{i}句", vector_id=segment_id, confidence=0.9, segment_index=i
+        ))
+    db.commit()
+    return video
+
+
+def index_video(db, video: Video) -> np.ndarray:
+    """
+    为视频的台词写入随机的单位向量并记录到向量日志，返回按台词顺序排列的向量
+    """
+    transcripts = (
+        db.query(Transcript).filter(Transcript.video_id == video.id).order_by(Transcript.segment_index).all()
+    )
+    dimension = vector_search.get_generation_meta(vector_search.get_active_generation())["dimension"]
+    vectors = np.random.default_rng(len(transcripts)).standard_normal((len(transcripts), dimension)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    assert vector_search.save_video_vectors(video.id, [t.vector_id for t in transcripts], vectors)
+    assert vector_search.save_video_columns(db, video.id)
+    assert vector_search.publish_video_vectors(video.id)
+    return vectors
@@ -0,0 +1,27 @@
+import csv
+import io
+import json
+from datetime import datetime
+
+from sqlalchemy.dialects.postgresql import psycopg2
+
+from app.db.bulk import _copy_csv
+from app.models import ProcessingStatus, Video
+
+
+def test_copy_csv_serializes_json_and_enum_columns():
+    row = {
+        "id": "v1",
+        "title": '带"引号"的标题',
+        "processing_status": ProcessingStatus.COMPLETED,
+        "video_metadata": {"force_asr": True, "tags": ["a"]},
+        "duration": None,
+        "created_at": datetime(2024, 5, 1, 12, 0),
+    }
+
+    data = _copy_csv(psycopg2.dialect(), Video.__table__, list(row), [row])
+
+    values = next(csv.reader(io.StringIO(data)))
+    assert values[:3] == ["v1", '带"引号"的标题', "COMPLETED"]
+    assert json.loads(values[3]) == {"force_asr": True, "tags": ["a"]}
+    assert values[4:] == ["", "2024-05-01T12:00:00"]
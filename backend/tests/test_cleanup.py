@@ -0,0 +1,98 @@
+import os
+import time
+import hashlib
+from datetime import datetime
+
+from app.api.endpoints import videos
+from app.core.config import settings
+from app.services import storage, uploads, vector_search
+from app.services.cleanup import collect_deleted_videos, sweep_abandoned_uploads
+
+from conftest import auth_headers, index_video, make_user, make_video
+
+
+def _stored_video(db, content: bytes, **fields):
+    content_hash = hashlib.sha256(content).hexdigest()
+    file_path = storage.get_object_path(content_hash, ".mp4")
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    with open(file_path, "wb") as f:
+        f.write(content)
+    return make_video(db, make_user(db), file_path=file_path, content_hash=content_hash, **fields)
+
+
+def _store(db, content: bytes) -> str:
+    tmp_path = os.path.join(storage.get_tmp_dir(), "upload.part")
+    with open(tmp_path, "wb") as f:
+        f.write(content)
+    return storage.store_file(db, tmp_path, hashlib.sha256(content).hexdigest(), ".mp4")
+
+
+def test_store_file_reuses_file_of_live_video(db):
+    video = _stored_video(db, b"video")
+
+    assert _store(db, b"video") == video.file_path
+
+
+def test_store_file_does_not_reuse_file_of_deleted_video(db):
+    deleted = _stored_video(db, b"video", deleted_at=datetime.utcnow())
+
+    file_path = _store(db, b"video")
+    db.commit()
+
+    assert file_path != deleted.file_path
+    assert collect_deleted_videos()["videos"] == 1
+    assert not os.path.exists(deleted.file_path)
+    with open(file_path, "rb") as f:
+        assert f.read() == b"video"
+
+
+def test_deleted_video_is_hidden_until_collected(client, db, monkeypatch):
+    monkeypatch.setattr(videos, "schedule_cleanup", lambda: None)
+    user = make_user(db)
+    headers = auth_headers(user)
+    video = make_video(db, user, segments=2)
+    vectors = index_video(db, video)
+    segment_paths = [segment.segment_path for segment in video.segments]
+    monkeypatch.setattr(vector_search, "vectorize_query", lambda text: vectors[0])
+
+    assert client.delete(f"/api/v1/videos/{video.id}", headers=headers).status_code == 204
+
+    assert client.get("/api/v1/videos/", headers=headers).json() == []
+    assert client.get(f"/api/v1/videos/{video.id}", headers=headers).status_code == 404
+    assert client.get(f"/api/v1/media/videos/{video.id}", headers=headers).status_code == 404
+    assert vector_search.search_transcripts(db, user.id, "查询", min_confidence=0.0) == ([], 0)
+    # 文件等回收任务再删除
+    assert all(os.path.exists(path) for path in [video.file_path, *segment_paths])
+    assert vector_search.get_video_store_files(video.id)
+
+    assert collect_deleted_videos()["videos"] == 1
+    assert not any(os.path.exists(path) for path in [video.file_path, *segment_paths])
+    assert vector_search.get_video_store_files(video.id) == []
+
+
+def test_sweep_removes_only_abandoned_uploads(client, db):
+    user = make_user(db)
+    headers = auth_headers(user)
+    sessions = [
+        client.post("/api/v1/videos/uploads", headers=headers,
+                    json={"title": "分块上传", "file_size": 16, "file_type": "mp4"}).json()["upload_id"]
+        for _ in range(2)
+    ]
+    for upload_id in sessions:
+        assert client.put(f"/api/v1/videos/uploads/{upload_id}/parts/1", headers=headers, content=b"\0" * 16).status_code == 200
+    leftover = os.path.join(storage.get_tmp_dir(), "crashed.part")
+    with open(leftover, "wb") as f:
+        f.write(b"\0" * 8)
+
+    # 第一个会话和遗留的临时文件已超过保留时间
+    expired = time.time() - (settings.UPLOAD_SESSION_TTL_HOURS + 1) * 3600
+    abandoned = os.path.join(uploads.get_uploads_dir(), sessions[0])
+    for path in [leftover, abandoned, *(os.path.join(abandoned, name) for name in os.listdir(abandoned))]:
+        os.utime(path, (expired, expired))
+
+    stats = sweep_abandoned_uploads()
+
+    assert stats["uploads"] == 1
+    assert not os.path.exists(abandoned) and not os.path.exists(leftover)
+    assert client.get(f"/api/v1/videos/uploads/{sessions[0]}", headers=headers).status_code == 404
+    assert client.get(f"/api/v1/videos/uploads/{sessions[1]}", headers=headers).status_code == 200
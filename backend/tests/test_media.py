@@ -0,0 +1,79 @@
+import os
+from urllib.parse import parse_qs, urlsplit
+
+from jose import jwt
+
+from app.core import security
+from app.core.config import settings
+
+from conftest import auth_headers, make_user, make_video
+
+
+def test_stream_video_supports_range(client, db):
+    user = make_user(db)
+    video = make_video(db, user)
+
+    response = client.get(f"/api/v1/media/videos/{video.id}", headers={**auth_headers(user), "Range": "bytes=0-99"})
+
+    assert response.status_code == 206
+    assert len(response.content) == 100
+    assert response.headers["ETag"] == f'"{video.content_hash}"'
+
+
+def test_stream_video_delegates_to_accel_redirect(client, db, monkeypatch):
+    monkeypatch.setattr(settings, "MEDIA_ACCEL_REDIRECT_PREFIX", "/_media/")
+    user = make_user(db)
+    video = make_video(db, user)
+
+    response = client.get(f"/api/v1/media/videos/{video.id}", headers=auth_headers(user))
+
+    assert response.status_code == 200
+    assert response.content == b""
+    assert response.headers["X-Accel-Redirect"] == f"/_media/{os.path.basename(video.file_path)}"
+    assert response.headers["Content-Type"] == "video/mp4"
+
+
+def _media_token(client, user, video) -> str:
+    response = client.post(f"/api/v1/media/videos/{video.id}/token", headers=auth_headers(user))
+    assert response.status_code == 200
+    return response.json()["token"]
+
+
+def test_media_token_only_opens_its_video(client, db):
+    user = make_user(db)
+    video = make_video(db, user, segments=1)
+    other = make_video(db, user)
+    token = _media_token(client, user, video)
+
+    assert client.get(f"/api/v1/media/videos/{video.id}", params={"token": token}).status_code == 200
+    assert client.get(f"/api/v1/media/segments/{video.segments[0].id}", params={"token": token}).status_code == 200
+    assert client.get(f"/api/v1/media/videos/{other.id}", params={"token": token}).status_code == 403
+
+
+def test_tokens_are_not_interchangeable(client, db):
+    user = make_user(db)
+    video = make_video(db, user)
+    media_token = _media_token(client, user, video)
+    access_token = security.create_access_token(user.id)
+
+    # 访问令牌不能放在播放地址中，媒体令牌也不能调用其他接口
+    assert client.get(f"/api/v1/media/videos/{video.id}", params={"token": access_token}).status_code == 403
+    assert client.get("/api/v1/videos/", headers={"Authorization": f"Bearer {media_token}"}).status_code == 403
+
+
+def test_play_transcript_redirects_with_media_token(client, db):
+    user = make_user(db)
+    video = make_video(db, user, segments=1)
+    transcript = video.transcripts[0]
+
+    response = client.get(
+        f"/api/v1/media/transcripts/{transcript.id}", headers=auth_headers(user), follow_redirects=False
+    )
+
+    assert response.status_code == 307
+    location = urlsplit(response.headers["Location"])
+    assert location.path == f"/api/v1/media/videos/{video.id}"
+    assert location.fragment == "t=0.000,1.500"
+    token = parse_qs(location.query)["token"][0]
+    assert jwt.get_unverified_claims(token)["video_id"] == video.id
+    assert client.get(location.path, params={"token": token}).status_code == 200
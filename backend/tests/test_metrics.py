@@ -0,0 +1,16 @@
+from app.core.config import settings
+
+from conftest import auth_headers, make_user
+
+
+def test_metrics_requires_credentials(client, db):
+    assert client.get("/metrics").status_code == 401
+    assert client.get("/metrics", headers=auth_headers(make_user(db))).status_code == 403
+    assert client.get("/metrics", headers=auth_headers(make_user(db, superuser=True))).status_code == 200
+
+
+def test_metrics_accepts_scrape_token(client, monkeypatch):
+    monkeypatch.setattr(settings, "METRICS_TOKEN", "scrape-secret")
+
+    assert client.get("/metrics", headers={"Authorization": "Bearer scrape-secret"}).status_code == 200
+    assert client.get("/metrics", headers={"Authorization": "Bearer wrong"}).status_code == 403
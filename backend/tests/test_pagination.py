@@ -0,0 +1,47 @@
+import pytest
+
+from app.api.pagination import NEXT_CURSOR_HEADER, encode_cursor
+
+from conftest import auth_headers, make_user, make_video
+
+
+def test_video_list_pages_with_cursor(client, db):
+    user = make_user(db)
+    ids = {make_video(db, user).id for _ in range(3)}
+
+    first = client.get("/api/v1/videos/", params={"limit": 2}, headers=auth_headers(user))
+    second = client.get(
+        "/api/v1/videos/", params={"limit": 2, "cursor": first.headers[NEXT_CURSOR_HEADER]}, headers=auth_headers(user)
+    )
+
+    assert len(first.json()) == 2
+    assert NEXT_CURSOR_HEADER not in second.headers
+    assert {video["id"] for video in first.json() + second.json()} == ids
+
+
+@pytest.mark.parametrize("values", [
+    ["2024-01-01T00:00:00", 1],
+    ["2024-01-01T00:00:00", {"id": "x"}],
+    ["not-a-date", "x"],
+    [1.0, "x"],
+    ["2024-01-01T00:00:00"],
+])
+def test_video_list_rejects_malformed_cursor(client, db, values):
+    user = make_user(db)
+
+    response = client.get("/api/v1/videos/", params={"cursor": encode_cursor(values)}, headers=auth_headers(user))
+
+    assert response.status_code == 400
+
+
+@pytest.mark.parametrize("path", ["/api/v1/videos/{id}/segments", "/api/v1/search/video/{id}/transcripts"])
+@pytest.mark.parametrize("values", [[1.0, 2], [1.0, None], [True, "x"], ["1.0", "x"]])
+def test_timeline_rejects_malformed_cursor(client, db, path, values):
+    user = make_user(db)
+    video = make_video(db, user, segments=2)
+
+    response = client.get(
+        path.format(id=video.id), params={"cursor": encode_cursor(values)}, headers=auth_headers(user)
+    )
+
+    assert response.status_code == 400
@@ -0,0 +1,27 @@
+from app.core import security
+
+from conftest import auth_headers, make_user, make_video
+
+
+def test_profiling_requires_active_superuser(client, db):
+    params = {"profile": "return"}
+
+    assert client.get("/api/v1/videos/", params=params).status_code == 401
+    assert client.get("/api/v1/videos/", params=params, headers=auth_headers(make_user(db))).status_code == 403
+    inactive = make_user(db, superuser=True, active=False)
+    assert client.get("/api/v1/videos/", params=params, headers=auth_headers(inactive)).status_code == 400
+
+    response = client.get("/api/v1/videos/", params=params, headers=auth_headers(make_user(db, superuser=True)))
+    assert response.status_code == 200
+    assert response.headers["X-Profile-Status"] == "200"
+
+
+def test_profiling_media_request_with_media_token(client, db):
+    admin = make_user(db, superuser=True)
+    video = make_video(db, admin)
+    token = security.create_media_token(admin.id, video.id)
+
+    response = client.get(f"/api/v1/media/videos/{video.id}", params={"token": token, "profile": "return"})
+
+    assert response.status_code == 200
+    assert response.headers["X-Profile-Status"] == "200"
@@ -0,0 +1,25 @@
+import numpy as np
+import pytest
+
+from app.models import ProcessingStage
+from app.services import reindex, vector_search
+
+from conftest import make_user, make_video
+
+
+def test_catch_up_under_lock_uses_planned_clone_sources(db, monkeypatch):
+    user = make_user(db)
+    video = make_video(db, user, segments=2, processing_stage=ProcessingStage.CUT)
+    meta = vector_search.get_generation_meta("")
+    generation = vector_search.create_generation(meta["model"], meta["dimension"])
+    monkeypatch.setattr(
+        reindex, "encode_texts",
+        lambda texts, model_name=None: np.ones((len(texts), meta["dimension"]), dtype=np.float32),
+    )
+
+    planned = reindex._plan_videos(db, {video.id: video.created_at})
+    # 加锁后不再为已查询过的视频查询复用来源
+    monkeypatch.setattr(reindex, "_find_clone_source", lambda *args: pytest.fail("锁内不应查询复用来源"))
+
+    assert reindex._catch_up(db, generation, meta["model"], planned) == 1
+    assert video.id in vector_search.list_generation_videos(generation)
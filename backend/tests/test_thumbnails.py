@@ -0,0 +1,79 @@
+import io
+import os
+
+import numpy as np
+
+from app.core.config import settings
+from app.services import thumbnails
+
+
+class _FakeFfmpeg:
+    """
+    代替ffmpeg：解码输出第i帧像素值均为i的画面，编码时记录写出的图像
+    """
+
+    def __init__(self, frames: int, frame_size: int):
+        self.data = b"".join(bytes([i]) * frame_size for i in range(frames))
+        self.written = {}
+
+    def input(self, *args, **kwargs):
+        return self
+
+    def filter(self, *args, **kwargs):
+        return self
+
+    def output(self, *args, **kwargs):
+        return self
+
+    def global_args(self, *args):
+        return self
+
+    def run_async(self, **kwargs):
+        return _FakeProcess(self.data)
+
+
+class _FakeProcess:
+    def __init__(self, data: bytes):
+        self.stdout = io.BytesIO(data)
+
+    def wait(self):
+        return 0
+
+    def poll(self):
+        return 0
+
+
+def _tile(image: np.ndarray, tile: dict) -> np.ndarray:
+    return image[tile["y"]:tile["y"] + tile["height"], tile["x"]:tile["x"] + tile["width"]]
+
+
+def test_previews_place_each_segment_keyframe_in_one_decode(monkeypatch):
+    monkeypatch.setattr(settings, "PREVIEW_TILE_WIDTH", 4)
+    monkeypatch.setattr(settings, "PREVIEW_TILE_HEIGHT", 2)
+    monkeypatch.setattr(settings, "SPRITE_COLUMNS", 2)
+    monkeypatch.setattr(settings, "SPRITE_TILES_PER_SHEET", 3)
+    fake = _FakeFfmpeg(frames=4, frame_size=4 * 2 * 3)
+    monkeypatch.setattr(thumbnails, "ffmpeg", fake)
+    monkeypatch.setattr(thumbnails, "_write_jpeg", lambda image, path: fake.written.__setitem__(path, image.copy()))
+
+    # 最后一个片段超出视频末尾，使用最后一帧
+    preview = thumbnails.generate_previews("video.mp4", "v1", [0.5, 2.2, 1.0, 9.0], duration=20.0)
+
+    sprites_dir = os.path.join(settings.STATIC_DIR, "sprites")
+    assert preview["sprite"]["sheets"] == 2
+    assert (fake.written[os.path.join(settings.STATIC_DIR, "thumbnails", "v1.jpg")] == 2).all()
+    for segment_index, frame in enumerate([0, 2, 1, 3]):
+        tile = thumbnails.get_sprite_tile(preview, segment_index)
+        sheet = os.path.join(sprites_dir, os.path.basename(tile["url"]))
+        assert (_tile(fake.written[sheet], tile) == frame).all()
+
+
+def test_sprite_tile_offsets():
+    preview = {"sprite": {"video_id": "v1", "sheets": 2, "tile_width": 256, "tile_height": 144,
+                          "columns": 10, "tiles_per_sheet": 100}}
+
+    assert thumbnails.get_sprite_tile(preview, 123) == {
+        "url": "/static/sprites/v1-1.jpg", "x": 3 * 256, "y": 2 * 144, "width": 256, "height": 144,
+    }
+    assert thumbnails.get_sprite_tile(preview, 200) is None
+    assert thumbnails.get_sprite_tile(None, 0) is None
@@ -0,0 +1,74 @@
+from types import SimpleNamespace
+
+import fakeredis
+import pytest
+
+from app.db.session import SessionLocal
+from app.models import User
+from app.services import user_cache
+
+from conftest import make_user
+
+
+@pytest.fixture(autouse=True)
+def fake_redis(monkeypatch):
+    client = fakeredis.FakeRedis()
+    monkeypatch.setattr(user_cache, "_redis_client", client)
+    return client
+
+
+def _deactivate(user_id: str, bulk: bool = False):
+    session = SessionLocal()
+    try:
+        if bulk:
+            session.query(User).filter(User.id == user_id).update({"is_active": False})
+        else:
+            session.query(User).filter(User.id == user_id).first().is_active = False
+        session.commit()
+    finally:
+        session.close()
+
+
+def _principal(user_id: str) -> User:
+    session = SessionLocal()
+    try:
+        return user_cache.get_user_principal(session, user_id)
+    finally:
+        session.close()
+
+
+def test_principal_is_cached_and_invalidated_on_commit(db, fake_redis):
+    user = make_user(db)
+    assert _principal(user.id).is_active
+    assert fake_redis.get(f"user:principal:{user.id}") is not None
+
+    _deactivate(user.id)
+
+    assert fake_redis.get(f"user:principal:{user.id}") is None
+    assert not _principal(user.id).is_active
+
+
+def test_bulk_update_invalidates_principal(db):
+    user = make_user(db)
+    assert _principal(user.id).is_active
+
+    _deactivate(user.id, bulk=True)
+
+    assert not _principal(user.id).is_active
+
+
+def test_read_racing_an_update_is_not_cached(db, fake_redis, monkeypatch):
+    user = make_user(db)
+    stale = db.query(User).filter(User.id == user.id).first()
+
+    def racing_query(*entities):
+        # 读到旧数据之后、写入缓存之前，其他请求修改了用户并清除了缓存
+        _deactivate(user.id)
+        return SimpleNamespace(filter=lambda *criteria: SimpleNamespace(first=lambda: stale))
+
+    with monkeypatch.context() as patch:
+        patch.setattr(db, "query", racing_query)
+        assert user_cache.get_user_principal(db, user.id).is_active
+
+    assert fake_redis.get(f"user:principal:{user.id}") is None
+    assert not _principal(user.id).is_active
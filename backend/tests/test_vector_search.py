@@ -0,0 +1,135 @@
+import json
+from datetime import datetime
+
+import numpy as np
+
+from app.models import Transcript
+from app.services import vector_search
+from app.services.cleanup import collect_deleted_videos
+
+from conftest import index_video, make_user, make_video
+
+
+def _search(db, monkeypatch, user, query_vector, **kwargs):
+    monkeypatch.setattr(vector_search, "vectorize_query", lambda text: query_vector)
+    results, _ = vector_search.search_transcripts(db, user.id, "查询", min_confidence=0.0, **kwargs)
+    return results
+
+
+def test_search_returns_indexed_video(db, monkeypatch):
+    user = make_user(db)
+    video = make_video(db, user, segments=3)
+    vectors = index_video(db, video)
+
+    results = _search(db, monkeypatch, user, vectors[1])
+    assert results[0]["video"]["id"] == video.id
+    assert results[0]["text"] == "第1句"
+
+
+def test_removed_video_stays_removed_after_late_publish(db, monkeypatch):
+    user = make_user(db)
+    video = make_video(db, user, segments=3)
+    vectors = index_video(db, video)
+    assert _search(db, monkeypatch, user, vectors[0])
+
+    # 删除后仍在处理的任务又发布了视频信息和向量
+    vector_search.publish_video_removal(video.id)
+    vector_search.publish_video_info(video)
+    vector_search.publish_video_vectors(video.id)
+    assert _search(db, monkeypatch, user, vectors[0]) == []
+
+    # 其他进程从头重放日志
+    vector_search.reset_index()
+    assert _search(db, monkeypatch, user, vectors[0]) == []
+
+
+def test_add_logged_after_remove_is_not_searchable(db, monkeypatch):
+    user = make_user(db)
+    video = make_video(db, user, segments=2)
+    vector_search.publish_video_removal(video.id)
+    vectors = index_video(db, video)
+
+    assert _search(db, monkeypatch, user, vectors[0]) == []
+    assert video.id not in vector_search.list_generation_videos(vector_search.get_active_generation())
+
+
+def test_cleanup_republishes_removal_to_every_generation(db):
+    user = make_user(db)
+    video = make_video(db, user, segments=2)
+    index_video(db, video)
+
+    meta = vector_search.get_generation_meta("")
+    generation = vector_search.create_generation(meta["model"], meta["dimension"])
+    assert vector_search.copy_video_vectors(video.id, "", generation)
+    assert vector_search.publish_video_vectors(video.id, generation)
+
+    # 删除时只记录到当时生效的一代
+    video.deleted_at = datetime.utcnow()
+    db.commit()
+    vector_search.publish_video_removal(video.id)
+
+    assert collect_deleted_videos()["videos"] == 1
+    assert vector_search.list_generation_videos(generation) == []
+    assert vector_search.get_video_store_files(video.id) == []
+
+
+def test_upload_date_filter_backfills_created_at_of_old_column_files(db, monkeypatch):
+    user = make_user(db)
+    video = make_video(db, user, segments=2, created_at=datetime(2024, 5, 1))
+    vectors = index_video(db, video)
+    # 旧版本写入的视频信息没有上传时间
+    info_path = vector_search._get_column_paths(video.id, vector_search.get_active_generation())[2]
+    with open(info_path) as f:
+        info = json.load(f)
+    del info["created_at"]
+    with open(info_path, "w") as f:
+        json.dump(info, f)
+    vector_search.reset_index()
+
+    assert _search(db, monkeypatch, user, vectors[0], uploaded_after=datetime(2024, 4, 1))[0]["video"]["id"] == video.id
+    assert _search(db, monkeypatch, user, vectors[0], uploaded_after=datetime(2024, 6, 1)) == []
+    assert not vector_search._column_store.missing_created_at
+
+
+def test_scoped_search_by_video_and_time_window(db, monkeypatch):
+    user = make_user(db)
+    video = make_video(db, user, segments=3)
+    other = make_video(db, user, segments=3)
+    vectors = index_video(db, video)
+    index_video(db, other)
+
+    results = _search(db, monkeypatch, user, vectors[0], video_ids=[video.id], start_time=1.8)
+
+    assert {result["video"]["id"] for result in results} == {video.id}
+    assert sorted(result["text"] for result in results) == ["第1句", "第2句"]
+
+
+def _publish(db, video, vectors, columns: bool = True):
+    vector_ids = [
+        vector_id for (vector_id,) in
+        db.query(Transcript.vector_id).filter(Transcript.video_id == video.id).order_by(Transcript.segment_index)
+    ]
+    assert vector_search.save_video_vectors(video.id, vector_ids, vectors)
+    if columns:
+        assert vector_search.save_video_columns(db, video.id)
+    assert vector_search.publish_video_vectors(video.id)
+
+
+def test_search_keeps_growing_when_legacy_hits_are_filtered_out(db, monkeypatch):
+    dimension = vector_search.get_generation_meta(vector_search.get_active_generation())["dimension"]
+    query = np.zeros(dimension, dtype=np.float32)
+    query[0] = 1.0
+    # 其他用户的旧向量（没有列数据）与查询最接近，从数据库过滤后全部被排除
+    other = make_video(db, make_user(db), segments=5)
+    near = np.tile(query, (5, 1))
+    near[:, 1] = 0.1
+    _publish(db, other, near / np.linalg.norm(near, axis=1, keepdims=True), columns=False)
+    user = make_user(db)
+    video = make_video(db, user, segments=1)
+    far = np.zeros((1, dimension), dtype=np.float32)
+    far[0, :2] = [0.6, 0.8]
+    _publish(db, video, far)
+
+    results = _search(db, monkeypatch, user, query, limit=1)
+
+    assert [result["video"]["id"] for result in results] == [video.id]
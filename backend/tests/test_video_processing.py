@@ -0,0 +1,147 @@
+import os
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from app.core.config import settings
+from app.models import ProcessingStatus, Video
+from app.services import transcript_cache, video_processing
+
+from conftest import make_user, make_video
+
+
+def test_run_stage_refreshes_updated_at_while_processing(db):
+    stale = datetime.utcnow() - timedelta(hours=1)
+    video = make_video(db, make_user(db), processing_status=ProcessingStatus.PROCESSING, updated_at=stale)
+
+    def noop_stage(stage_db, stage_video):
+        pass
+
+    video_processing.run_stage(video.id, noop_stage)
+
+    db.expire_all()
+    assert db.query(Video.updated_at).filter(Video.id == video.id).scalar() > stale
+
+
+def _fake_asr(monkeypatch):
+    """
+    用固定的音频和识别结果代替ffmpeg和Whisper
+    """
+    audio = np.zeros(video_processing.AUDIO_SAMPLE_RATE, dtype=np.float32)
+    calls = []
+    monkeypatch.setattr(video_processing, "extract_audio_array", lambda path: audio)
+    monkeypatch.setattr(video_processing, "stream_audio_chunks", lambda path, seconds: iter([audio]))
+
+    def transcribe(audio_or_chunks, model_name=None):
+        calls.append(model_name)
+        if not isinstance(audio_or_chunks, np.ndarray):
+            list(audio_or_chunks)  # 流式识别时消费全部音频块
+        return [{"start": 0.0, "end": 1.0, "text": "你好", "confidence": -0.1, "words": []}]
+
+    monkeypatch.setattr(video_processing, "transcribe_audio", transcribe)
+    monkeypatch.setattr(video_processing, "transcribe_audio_stream", transcribe)
+    return calls
+
+
+@pytest.mark.parametrize("chunk_seconds", [0, 30])
+@pytest.mark.parametrize("keep", [False, True])
+def test_pcm_is_written_only_when_keeping_artifacts(db, monkeypatch, chunk_seconds, keep):
+    monkeypatch.setattr(settings, "AUDIO_STREAM_CHUNK_SECONDS", chunk_seconds)
+    monkeypatch.setattr(settings, "KEEP_PROCESSING_ARTIFACTS", keep)
+    _fake_asr(monkeypatch)
+    video = make_video(db, make_user(db))
+    work_dir = video_processing.get_work_dir(video.id)
+
+    segments, cache_key = video_processing.transcribe_video(db, video, work_dir)
+
+    assert segments[0]["text"] == "你好"
+    assert cache_key
+    assert os.path.exists(os.path.join(work_dir, "audio.pcm")) == keep
+
+
+def test_transcript_cache_is_shared_between_audio_modes(db, monkeypatch):
+    calls = _fake_asr(monkeypatch)
+    user = make_user(db)
+    first = make_video(db, user, content_hash="a" * 64)
+    second = make_video(db, user, content_hash="a" * 64)
+
+    _, first_key = video_processing.transcribe_video(db, first, video_processing.get_work_dir(first.id))
+    # 命中缓存时不再提取音频
+    monkeypatch.setattr(settings, "AUDIO_IN_MEMORY", not settings.AUDIO_IN_MEMORY)
+    monkeypatch.setattr(video_processing, "extract_audio", lambda *args: pytest.fail("不应提取音频"))
+    monkeypatch.setattr(video_processing, "extract_audio_array", lambda *args: pytest.fail("不应提取音频"))
+    segments, second_key = video_processing.transcribe_video(db, second, video_processing.get_work_dir(second.id))
+
+    assert second_key == first_key
+    assert segments[0]["text"] == "你好"
+    assert len(calls) == 1
+
+
+def test_transcript_cache_tracks_size_without_rescanning(monkeypatch):
+    scans = []
+    scan_cache = transcript_cache._scan_cache
+    monkeypatch.setattr(transcript_cache, "_scan_cache", lambda: scans.append(1) or scan_cache())
+    segments = [{"start": 0.0, "end": 1.0, "text": "台词" * 100, "confidence": -0.1, "words": []}]
+
+    for i in range(3):
+        transcript_cache.put_cached_transcript(f"{i:064x}", segments)
+    assert len(scans) == 1
+
+    monkeypatch.setattr(settings, "TRANSCRIPT_CACHE_MAX_BYTES", transcript_cache._cache_bytes)
+    transcript_cache.put_cached_transcript(f"{3:064x}", segments)
+
+    assert len(scans) == 2
+    assert transcript_cache.get_cached_transcript(f"{0:064x}") is None
+    assert transcript_cache.get_cached_transcript(f"{3:064x}") is not None
+
+
+class _FakeWhisper:
+    """
+    每秒识别出一个词的假模型，用于检查分块重叠处的去重
+    """
+
+    def transcribe(self, audio, **kwargs):
+        seconds = len(audio) // video_processing.AUDIO_SAMPLE_RATE
+        words = [SimpleNamespace(word=f" w{i}", start=i + 0.1, end=i + 0.6) for i in range(seconds)]
+        segment = SimpleNamespace(
+            start=0.0, end=float(seconds), text="".join(word.word for word in words), avg_logprob=-0.1, words=words
+        )
+        return iter([segment]), None
+
+
+@pytest.mark.parametrize("overlap", [0, 2.0])
+def test_stream_transcription_deduplicates_overlapping_chunks(monkeypatch, overlap):
+    monkeypatch.setattr(settings, "AUDIO_STREAM_OVERLAP_SECONDS", overlap)
+    monkeypatch.setattr(video_processing, "get_whisper_model", lambda model_name=None: _FakeWhisper())
+    chunks = (np.zeros(10 * video_processing.AUDIO_SAMPLE_RATE, dtype=np.float32) for _ in range(3))
+
+    segments = video_processing.transcribe_audio_stream(chunks)
+
+    starts = [word["start"] for segment in segments for word in segment["words"]]
+    assert starts == pytest.approx([i + 0.1 for i in range(30)])
+    assert all(segment["text"] == "".join(word["word"] for word in segment["words"]) for segment in segments)
+
+
+def test_prefetch_propagates_errors_and_stops_reading_on_close():
+    def failing():
+        yield np.zeros(1)
+        raise RuntimeError("ffmpeg已退出")
+
+    with pytest.raises(RuntimeError):
+        list(video_processing._prefetch(failing(), 2))
+
+    closed = []
+
+    def endless():
+        try:
+            while True:
+                yield np.zeros(1)
+        finally:
+            closed.append(True)
+
+    prefetched = video_processing._prefetch(endless(), 2)
+    next(prefetched)
+    prefetched.close()
+    assert closed == [True]
@@ -0,0 +1,177 @@
+import os
+import hashlib
+
+import pytest
+
+from app.api.endpoints import videos
+from app.models import ProcessingStage, ProcessingStatus, Video
+from app.services import storage, vector_search
+from app.services.subtitles import pick_subtitle_stream
+from app.services.thumbnails import preview_files
+
+from conftest import auth_headers, index_video, make_user, make_video
+
+
+def test_get_video_returns_segment_summary_and_etag(client, db):
+    user = make_user(db)
+    video = make_video(db, user, segments=3)
+
+    response = client.get(f"/api/v1/videos/{video.id}", headers=auth_headers(user))
+
+    assert response.status_code == 200
+    body = response.json()
+    assert body["id"] == video.id
+    assert body["segment_summary"] == {"count": 3, "total_duration": 4.5}
+    assert response.headers["ETag"].startswith('W/"')
+
+
+def test_get_video_not_modified(client, db):
+    user = make_user(db)
+    video = make_video(db, user, segments=1)
+    headers = auth_headers(user)
+    etag = client.get(f"/api/v1/videos/{video.id}", headers=headers).headers["ETag"]
+
+    response = client.get(f"/api/v1/videos/{video.id}", headers={**headers, "If-None-Match": etag})
+
+    assert response.status_code == 304
+    assert response.headers["ETag"] == etag
+
+
+def test_get_video_of_other_user_is_forbidden(client, db):
+    owner = make_user(db)
+    video = make_video(db, owner)
+
+    response = client.get(f"/api/v1/videos/{video.id}", headers=auth_headers(make_user(db)))
+
+    assert response.status_code == 403
+
+
+def _upload(client, user, content: bytes):
+    return client.post(
+        "/api/v1/videos/",
+        headers=auth_headers(user),
+        data={"title": "重复上传"},
+        files={"video_file": ("clip.mp4", content, "video/mp4")},
+    )
+
+
+def _write_preview(video_id: str) -> dict:
+    static_dir = os.environ["STATIC_DIR"]
+    os.makedirs(os.path.join(static_dir, "thumbnails"), exist_ok=True)
+    os.makedirs(os.path.join(static_dir, "sprites"), exist_ok=True)
+    with open(os.path.join(static_dir, "thumbnails", f"{video_id}.jpg"), "wb") as f:
+        f.write(b"thumbnail")
+    with open(os.path.join(static_dir, "sprites", f"{video_id}-0.jpg"), "wb") as f:
+        f.write(b"sprite")
+    return {
+        "thumbnail": f"/static/thumbnails/{video_id}.jpg",
+        "sprite": {"video_id": video_id, "sheets": 1, "tile_width": 256, "tile_height": 144,
+                   "columns": 10, "tiles_per_sheet": 100},
+    }
+
+
+def test_duplicate_upload_reuses_vectors_with_own_preview(client, db):
+    content = b"\0" * 1024
+    source = make_video(db, make_user(db), segments=2, content_hash=hashlib.sha256(content).hexdigest())
+    source.video_metadata = {"preview": _write_preview(source.id)}
+    db.commit()
+    index_video(db, source)
+
+    response = _upload(client, make_user(db), content)
+
+    assert response.status_code == 200
+    clone_id = response.json()["id"]
+    assert response.json()["processing_status"] == "completed"
+    preview = db.query(Video).filter(Video.id == clone_id).first().video_metadata["preview"]
+    assert preview["thumbnail"] == f"/static/thumbnails/{clone_id}.jpg"
+    assert preview["sprite"]["video_id"] == clone_id
+    assert all(os.path.exists(path) for path in preview_files(preview))
+    assert clone_id in vector_search.list_generation_videos(vector_search.get_active_generation())
+
+
+def test_duplicate_upload_reembeds_when_vectors_missing(client, db, monkeypatch):
+    content = b"\0" * 1024
+    make_video(db, make_user(db), segments=2, content_hash=hashlib.sha256(content).hexdigest())
+    enqueued = []
+    monkeypatch.setattr(videos, "enqueue_video_processing", lambda *args: enqueued.append(args))
+
+    response = _upload(client, make_user(db), content)
+
+    assert response.status_code == 200
+    assert response.json()["processing_status"] == "pending"
+    assert enqueued == [(response.json()["id"], ProcessingStage.TRANSCRIBED)]
+
+
+def test_retry_requeues_failed_video_from_last_stage(client, db, monkeypatch):
+    user = make_user(db)
+    video = make_video(db, user, processing_status=ProcessingStatus.FAILED, processing_stage=ProcessingStage.TRANSCRIBED)
+    enqueued = []
+    monkeypatch.setattr(videos, "enqueue_video_processing", lambda *args: enqueued.append(args))
+
+    response = client.post(f"/api/v1/videos/{video.id}/retry", headers=auth_headers(user))
+
+    assert response.status_code == 200
+    assert response.json()["processing_status"] == "pending"
+    assert enqueued == [(video.id, ProcessingStage.TRANSCRIBED)]
+    assert client.post(f"/api/v1/videos/{video.id}/retry", headers=auth_headers(user)).status_code == 409
+
+
+def test_chunked_upload_keeps_sidecar_subtitle(client, db, monkeypatch):
+    user = make_user(db)
+    headers = auth_headers(user)
+    monkeypatch.setattr(videos, "enqueue_video_processing", lambda *args: None)
+    content = b"\0" * 1024
+    session = client.post(
+        "/api/v1/videos/uploads", headers=headers,
+        json={"title": "分块上传", "file_size": len(content), "file_type": "mp4"},
+    ).json()
+    upload_id = session["upload_id"]
+
+    assert client.put(f"/api/v1/videos/uploads/{upload_id}/parts/1", headers=headers, content=content).status_code == 200
+    response = client.put(
+        f"/api/v1/videos/uploads/{upload_id}/subtitle", headers=headers,
+        files={"subtitle_file": ("clip.srt", "1\n00:00:00,000 --> 00:00:01,000\n你好\n".encode(), "text/plain")},
+    )
+    assert response.status_code == 204
+    response = client.post(
+        "/api/v1/videos/uploads/complete", headers=headers,
+        json={"upload_id": upload_id, "video_id": session["video_id"], "parts": []},
+    )
+
+    assert response.status_code == 200
+    subtitle_path = db.query(Video).filter(Video.id == session["video_id"]).first().video_metadata["sidecar_subtitle"]
+    assert subtitle_path.endswith(f"{session['video_id']}.srt")
+    assert os.path.exists(subtitle_path)
+
+
+def test_failed_upload_removes_sidecar_subtitle(client, db, monkeypatch):
+    def fail(*args):
+        raise OSError("磁盘已满")
+
+    monkeypatch.setattr(storage, "store_file", fail)
+
+    with pytest.raises(OSError):
+        client.post(
+            "/api/v1/videos/",
+            headers=auth_headers(make_user(db)),
+            data={"title": "带字幕"},
+            files={"video_file": ("clip.mp4", b"\0" * 1024, "video/mp4"),
+                   "subtitle_file": ("clip.srt", b"", "text/plain")},
+        )
+
+    assert os.listdir(os.path.join(os.environ["VIDEOS_STORAGE_PATH"], "subtitles")) == []
+
+
+def test_subtitle_stream_in_other_language_is_not_picked():
+    streams = [{"index": 2, "codec": "subrip", "language": "eng"}, {"index": 3, "codec": "subrip", "language": "chi"}]
+
+    assert pick_subtitle_stream(streams, "zh")["index"] == 3
+    assert pick_subtitle_stream(streams[:1], "zh") is None
+
+
+def test_upload_survives_stage_failure_in_eager_mode(client, db):
+    # 测试环境中没有ffmpeg，同步执行的处理阶段会失败
+    response = _upload(client, make_user(db), b"\1" * 1024)
+
+    assert response.status_code == 200
+    assert response.json()["processing_status"] == "failed"